@@ -0,0 +1,60 @@
+"""Async entry point for the tool endpoints.
+
+Runs the anonymous tools (chat, image, translate, TTS, STT and file
+downloads) on aiohttp so one worker can hold hundreds of in-flight
+upstream calls:
+
+    gunicorn aio_app:app --bind 0.0.0.0:$PORT --worker-class aiohttp.GunicornWebWorker
+
+It is not a replacement for app.py and is not in the Procfile: there is
+no sign-in, so no quotas or per-user chat sessions, and the writer,
+resume, auth, admin and job routes are only served by app.py. Each tool
+route charges the same per-client rate limit buckets as app.py.
+
+Upstream calls go through the same per-model circuit breakers and
+bulkheads as app.py (shared with its workers via HF_BULKHEAD_DIR), but
+not its fair scheduler: when a model's bulkhead is full the call is
+refused with a 503 instead of queueing for a slot.
+"""
+from aiohttp import web
+import os
+import asyncio
+import logging
+
+from api.routes_async import async_routes, hf_client
+from utils.rate_limit import hit_client_route_limit
+from utils.hf_client import MAX_AUDIO_BYTES
+
+# Path -> rate limit bucket (utils.rate_limit.ROUTE_LIMITS)
+ROUTE_BUCKETS = {
+    '/api/chat': 'chat',
+    '/api/image': 'image',
+    '/api/translate': 'translate',
+    '/api/tts': 'tts',
+    '/api/stt': 'stt'
+}
+
+@web.middleware
+async def rate_limit(request, handler):
+    route = ROUTE_BUCKETS.get(request.path)
+    # The limiter's storage may be Redis or a file, so hit it off the event loop
+    if route and not await asyncio.to_thread(hit_client_route_limit, route, request.remote or '127.0.0.1'):
+        return web.json_response({"error": "Rate limit exceeded"}, status=429)
+    return await handler(request)
+
+async def close_hf_client(app):
+    await hf_client.close()
+
+def create_aio_app():
+    # Caps bodies read whole (JSON); STT streams its upload and enforces MAX_AUDIO_BYTES itself
+    app = web.Application(client_max_size=MAX_AUDIO_BYTES + 1024 * 1024, middlewares=[rate_limit])
+    app.add_routes(async_routes)
+    app.on_cleanup.append(close_hf_client)
+    return app
+
+app = create_aio_app()
+
+if __name__ == '__main__':
+    logging.basicConfig(level=logging.INFO)
+    os.makedirs('temp', exist_ok=True)
+    web.run_app(app, host='0.0.0.0', port=int(os.environ.get('PORT', '5001')))
@@ -1,4 +1,4 @@
-from flask import Blueprint, request, jsonify
+from flask import Blueprint, request, jsonify, Response
 import os
 
 admin_bp = Blueprint('admin', __name__)
@@ -6,10 +6,13 @@ admin_bp = Blueprint('admin', __name__)
 # Simple admin authentication
 ADMIN_SECRET = os.environ.get('ADMIN_SECRET', 'admin-secret-change-me')
 
+def is_admin_request() -> bool:
+    secret = request.headers.get('X-Admin-Secret') or request.args.get('admin_secret')
+    return secret == ADMIN_SECRET
+
 def require_admin_secret(func):
     def wrapper(*args, **kwargs):
-        secret = request.headers.get('X-Admin-Secret') or request.args.get('admin_secret')
-        if secret != ADMIN_SECRET:
+        if not is_admin_request():
             return jsonify({"error": "Admin access denied"}), 403
         return func(*args, **kwargs)
     wrapper.__name__ = func.__name__
@@ -19,15 +22,45 @@ def require_admin_secret(func):
 @require_admin_secret
 def get_stats():
     try:
-        # Import users_db from auth module
-        from api.routes_auth import users_db
+        # Import user_store from auth module
+        from api.routes_auth import user_store
+        from utils.hf_client import (translation_cache, image_cache, singleflight, model_guards, latency_tracker, hedger,
+                                     model_warmer, upstream_scheduler)
+        from utils.jobs import job_queue
+        from utils.chat_sessions import chat_sessions
+        from api.routes_writer import long_form_writer
+        from utils.capture import request_capture
+        from utils.file_store import file_store
+        from utils.usage import usage_meter
         
-        # Basic stats
+        # Basic stats, read from counters maintained on write; usage is
+        # flushed every few seconds, so the newest calls may not show yet
+        user_stats = user_store.stats()
         stats = {
-            "total_users": len(users_db),
-            "total_requests": sum(user.get('usage_count', 0) for user in users_db.values()),
+            "total_users": user_stats.get("total_users", 0),
+            "total_requests": user_stats.get("total_requests", 0),
+            "total_cost": user_stats.get("total_cost", 0),
+            "usage": usage_meter.stats(),
             "active_tools": ["chat", "image", "translator", "tts", "writer"],
-            "system_status": "healthy"
+            "system_status": "healthy",
+            "translation_cache": translation_cache.stats(),
+            "image_cache": image_cache.stats(),
+            "singleflight": singleflight.stats(),
+            "chat_sessions": chat_sessions.stats(),
+            "writer_sections": long_form_writer.stats(),
+            # Bulkhead and breaker state as seen by the worker serving this request
+            "models": {
+                "pid": os.getpid(),
+                # Warm/loading/cold state is shared by all workers
+                "warmup": model_warmer.stats(),
+                "guards": model_guards.stats(),
+                "latency": latency_tracker.stats(),
+                "hedging": hedger.stats(),
+                "scheduler": upstream_scheduler.stats()
+            },
+            "jobs": job_queue.stats(),
+            "storage": file_store.stats(),
+            "capture": request_capture.stats()
         }
         
         return jsonify(stats)
@@ -35,6 +68,17 @@ def get_stats():
     except Exception as e:
         return jsonify({"error": str(e)}), 500  # FIXED: Removed extra quote
 
+@admin_bp.route('/admin/metrics')
+@require_admin_secret
+def get_metrics():
+    try:
+        from utils.metrics import registry
+        
+        return Response(registry.render(), mimetype='text/plain; version=0.0.4')
+        
+    except Exception as e:
+        return jsonify({"error": str(e)}), 500
+
 @admin_bp.route('/admin/tools/<tool_name>', methods=['POST'])
 @require_admin_secret
 def toggle_tool(tool_name):
@@ -0,0 +1,202 @@
+from aiohttp import web
+import asyncio
+import mimetypes
+from utils.hf_client_async import AsyncHFClient
+from utils.file_store import file_store, content_hash
+from utils.hf_client import CHAT_ERROR_REPLY, CHAT_EMPTY_REPLY, MAX_AUDIO_BYTES, UPLOAD_CHUNK_SIZE, UploadTooLarge
+from utils.chat_sessions import chat_sessions, session_key
+from utils.circuit_breaker import ModelUnavailable
+
+# Async versions of the /api/* tool handlers, served by aio_app.py
+async_routes = web.RouteTableDef()
+hf_client = AsyncHFClient()
+
+def json_error(message: str, status: int) -> web.Response:
+    return web.json_response({"error": message}, status=status)
+
+def unavailable(e: ModelUnavailable) -> web.Response:
+    return web.json_response({"error": str(e)}, status=503, headers={"Retry-After": str(e.retry_after)})
+
+async def read_json(request: web.Request) -> dict:
+    try:
+        data = await request.json()
+    except ValueError:
+        data = None
+    return data if isinstance(data, dict) else {}
+
+async def multipart_field(request: web.Request, name: str):
+    """The named part of a multipart body, positioned at its start; None if absent"""
+    if not request.content_type.startswith('multipart/'):
+        return None
+    reader = await request.multipart()
+    async for part in reader:
+        if getattr(part, 'name', None) == name:
+            return part
+        await part.release()
+    return None
+
+async def iter_part(part):
+    """Yield a multipart part's body in chunks as it arrives"""
+    while True:
+        chunk = await part.read_chunk(UPLOAD_CHUNK_SIZE)
+        if not chunk:
+            return
+        yield chunk
+
+@async_routes.get('/api/health')
+async def health(request):
+    return web.json_response({"status": "healthy", "service": "Ethio GPT Tools Backend"})
+
+@async_routes.post('/api/chat')
+async def chat(request):
+    try:
+        data = await read_json(request)
+        user_input = data.get('input', '').strip()
+        session_id = data.get('session_id', 'default')
+        
+        if not user_input:
+            return json_error("Input is required", 400)
+        
+        if len(user_input) > 1000:
+            return json_error("Input too long. Maximum 1000 characters.", 400)
+        
+        # No sign-in on the async app yet, so every client is anonymous here
+        key, session_id = session_key(None, session_id)
+        history = await asyncio.to_thread(chat_sessions.history, key, reserve=len(user_input)) if key else []
+        response = await hf_client.chat_completion(user_input, history)
+        if key and response not in (CHAT_ERROR_REPLY, CHAT_EMPTY_REPLY):
+            await asyncio.to_thread(chat_sessions.append, key, user_input, response)
+        
+        return web.json_response({
+            "reply": response,
+            "meta": {"model": "microsoft/DialoGPT-medium", "session_id": session_id}
+        })
+        
+    except ModelUnavailable as e:
+        return unavailable(e)
+    except Exception as e:
+        return json_error(str(e), 500)
+
+@async_routes.post('/api/image')
+async def generate_image(request):
+    try:
+        data = await read_json(request)
+        prompt = data.get('prompt', '').strip()
+        preset = data.get('preset', 'realistic')
+        
+        if not prompt:
+            return json_error("Prompt is required", 400)
+        
+        if len(prompt) > 500:
+            return json_error("Prompt too long. Maximum 500 characters.", 400)
+        
+        filename = await hf_client.generate_image(prompt, preset)
+        
+        return web.json_response({
+            "url": f"/api/files/{filename}",
+            "filename": filename
+        })
+        
+    except ModelUnavailable as e:
+        return unavailable(e)
+    except Exception as e:
+        return json_error(str(e), 500)
+
+@async_routes.post('/api/translate')
+async def translate_text(request):
+    try:
+        data = await read_json(request)
+        text = data.get('text', '').strip()
+        target_lang = data.get('target_lang', 'en')
+        source_lang = data.get('source_lang', 'en')
+        
+        if not text:
+            return json_error("Text is required", 400)
+        
+        if len(text) > 2000:
+            return json_error("Text too long. Maximum 2000 characters.", 400)
+        
+        translated = await hf_client.translate_text(text, target_lang, source_lang)
+        
+        return web.json_response({
+            "translated_text": translated,
+            "original_text": text,
+            "source_lang": source_lang,
+            "target_lang": target_lang
+        })
+        
+    except ModelUnavailable as e:
+        return unavailable(e)
+    except Exception as e:
+        return json_error(str(e), 500)
+
+@async_routes.post('/api/tts')
+async def text_to_speech(request):
+    try:
+        data = await read_json(request)
+        text = data.get('text', '').strip()
+        
+        if not text:
+            return json_error("Text is required", 400)
+        
+        if len(text) > 1000:
+            return json_error("Text too long. Maximum 1000 characters.", 400)
+        
+        filename = await hf_client.text_to_speech(text)
+        
+        return web.json_response({
+            "url": f"/api/files/{filename}",
+            "filename": filename
+        })
+        
+    except ModelUnavailable as e:
+        return unavailable(e)
+    except Exception as e:
+        return json_error(str(e), 500)
+
+@async_routes.post('/api/stt')
+async def speech_to_text(request):
+    try:
+        # Raw audio bodies and multipart 'audio' parts are relayed
+        # upstream as they arrive, never held whole in memory
+        if request.content_type.startswith('audio/') or request.content_type == 'application/octet-stream':
+            if request.content_length and request.content_length > MAX_AUDIO_BYTES:
+                return json_error("Audio file too large", 413)
+            chunks = request.content.iter_chunked(UPLOAD_CHUNK_SIZE)
+        else:
+            audio_part = await multipart_field(request, 'audio')
+            if audio_part is None or audio_part.filename is None:
+                return json_error("Audio file is required", 400)
+            
+            if audio_part.filename == '':
+                return json_error("No audio file selected", 400)
+            chunks = iter_part(audio_part)
+        
+        try:
+            text = await hf_client.speech_to_text(chunks)
+        except UploadTooLarge:
+            return json_error("Audio file too large", 413)
+        
+        return web.json_response({"text": text})
+        
+    except ModelUnavailable as e:
+        return unavailable(e)
+    except Exception as e:
+        return json_error(str(e), 500)
+
+@async_routes.get('/api/files/{filename}')
+async def serve_file(request):
+    filename = request.match_info['filename']
+    if not file_store.valid_name(filename):
+        return json_error("Invalid filename", 400)
+    
+    filepath = file_store.path(filename)
+    if not filepath:
+        return json_error("File not found", 404)
+    file_store.touch(filepath)
+    
+    # FileResponse handles Range, If-Modified-Since and sendfile itself
+    headers = {"Content-Type": mimetypes.guess_type(filename)[0] or 'application/octet-stream'}
+    if content_hash(filename):
+        headers["Cache-Control"] = "public, max-age=31536000, immutable"
+    return web.FileResponse(filepath, headers=headers)
@@ -1,10 +1,9 @@
 from flask import Blueprint, request, jsonify
 from flask_jwt_extended import create_access_token, jwt_required, get_jwt_identity
-import uuid
-import time
+from utils.user_store import user_store
+from utils.usage import USAGE_DAILY_QUOTA, usage_day
 
-# Simple in-memory user store (replace with database in production)
-users_db = {}
+# user_store is indexed and shared across workers when backed by SQLite
 auth_bp = Blueprint('auth', __name__)
 
 @auth_bp.route('/register', methods=['POST'])
@@ -20,18 +19,11 @@ def register():
         if len(username) < 3:
             return jsonify({"error": "Username must be at least 3 characters"}), 400
         
-        if username in users_db:
-            return jsonify({"error": "Username already exists"}), 400
-        
         # Create new user
-        user_id = str(uuid.uuid4())
-        users_db[username] = {
-            'id': user_id,
-            'username': username,
-            'display_name': display_name or username,
-            'created_at': time.time(),
-            'usage_count': 0
-        }
+        user = user_store.create(username, display_name)
+        if not user:
+            return jsonify({"error": "Username already exists"}), 400
+        user_id = user['id']
         
         # Create access token
         access_token = create_access_token(identity=user_id)
@@ -57,7 +49,7 @@ def login():
         if not username:
             return jsonify({"error": "Username is required"}), 400
         
-        user = users_db.get(username)
+        user = user_store.get_by_username(username)
         if not user:
             # Auto-register if user doesn't exist
             return register()
@@ -84,7 +76,7 @@ def get_current_user():
         user_id = get_jwt_identity()
         
         # Find user by ID
-        user = next((u for u in users_db.values() if u['id'] == user_id), None)
+        user = user_store.get_by_id(user_id)
         
         if not user:
             return jsonify({"error": "User not found"}), 404
@@ -94,7 +86,10 @@ def get_current_user():
                 "id": user['id'],
                 "username": user['username'],
                 "display_name": user['display_name'],
-                "usage_count": user['usage_count']
+                "usage_count": user['usage_count'],
+                # Cost units used today, as of the last flush
+                "usage_today": user_store.daily_usage(user_id, usage_day()),
+                "daily_quota": USAGE_DAILY_QUOTA
             }
         })
         
@@ -1,21 +1,20 @@
-from flask import Blueprint, request, jsonify
-from flask_limiter import Limiter
-from flask_limiter.util import get_remote_address
-from utils.hf_client import HFClient
+from flask import Blueprint, request, jsonify, Response, stream_with_context
+from utils.hf_client import get_hf_client, model_guards, CHAT_MODEL, CHAT_ERROR_REPLY, CHAT_EMPTY_REPLY
+from utils.chat_sessions import chat_sessions, session_key
+from utils.circuit_breaker import ModelUnavailable
+from utils.sse import sse_stream
+from utils.rate_limit import route_limit_error, client_user_id
 
 chat_bp = Blueprint('chat', __name__)
-hf_client = HFClient()
-
-# We'll initialize limiter in app.py and use it via current_app
+hf_client = get_hf_client()
 
 @chat_bp.route('/chat', methods=['POST'])
 def chat():
     try:
-        from flask import current_app
-        # Apply rate limit manually
-        with current_app.app_context():
-            if not current_app.limiter.test_limit(chat_bp.name + "chat"):
-                return jsonify({"error": "Rate limit exceeded"}), 429
+        # Charge this client's shared per-route bucket
+        limited = route_limit_error('chat')
+        if limited:
+            return limited
 
         data = request.get_json()
         user_input = data.get('input', '').strip()
@@ -27,13 +26,61 @@ def chat():
         if len(user_input) > 1000:
             return jsonify({"error": "Input too long. Maximum 1000 characters."}), 400
         
+        # Earlier turns of this session, trimmed to fit the model's context
+        key, session_id = session_key(client_user_id(), session_id)
+        history = chat_sessions.history(key, reserve=len(user_input)) if key else []
+        
         # Generate response
-        response = hf_client.chat_completion(user_input)
+        response = hf_client.chat_completion(user_input, history)
+        if key and response not in (CHAT_ERROR_REPLY, CHAT_EMPTY_REPLY):
+            chat_sessions.append(key, user_input, response)
         
         return jsonify({
             "reply": response,
             "meta": {"model": "microsoft/DialoGPT-medium", "session_id": session_id}
         })
         
+    except ModelUnavailable as e:
+        return jsonify({"error": str(e)}), 503, {"Retry-After": str(e.retry_after)}
+    except Exception as e:
+        return jsonify({"error": str(e)}), 500
+
+@chat_bp.route('/chat/stream', methods=['POST'])
+def chat_stream():
+    try:
+        # Charge this client's shared per-route bucket
+        limited = route_limit_error('chat')
+        if limited:
+            return limited
+
+        data = request.get_json()
+        user_input = data.get('input', '').strip()
+        session_id = data.get('session_id', 'default')
+        
+        if not user_input:
+            return jsonify({"error": "Input is required"}), 400
+        
+        if len(user_input) > 1000:
+            return jsonify({"error": "Input too long. Maximum 1000 characters."}), 400
+        
+        # Refuse up front rather than opening a stream that can only fail
+        model_guards.check(CHAT_MODEL)
+        
+        # The reply is added to the session once the stream completes
+        key, session_id = session_key(client_user_id(), session_id)
+        history = chat_sessions.history(key, reserve=len(user_input)) if key else []
+        chunks = hf_client.stream_chat_completion(user_input, history)
+        if key:
+            chunks = chat_sessions.record_stream(key, user_input, chunks)
+        events = sse_stream(
+            chunks,
+            {"model": CHAT_MODEL, "session_id": session_id},
+            CHAT_ERROR_REPLY
+        )
+        return Response(stream_with_context(events), mimetype='text/event-stream',
+                        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"})
+        
+    except ModelUnavailable as e:
+        return jsonify({"error": str(e)}), 503, {"Retry-After": str(e.retry_after)}
     except Exception as e:
         return jsonify({"error": str(e)}), 500
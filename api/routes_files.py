@@ -0,0 +1,42 @@
+from flask import Blueprint, jsonify, send_file
+import mimetypes
+from utils.file_store import file_store, content_hash
+
+files_bp = Blueprint('files', __name__)
+
+# Generated files are never rewritten under the same name
+IMMUTABLE_MAX_AGE = 365 * 24 * 3600
+DEFAULT_MAX_AGE = 24 * 3600
+
+mimetypes.add_type('audio/wav', '.wav')
+
+@files_bp.route('/files/<filename>')
+def serve_file(filename):
+    try:
+        if not file_store.valid_name(filename):
+            return jsonify({"error": "Invalid filename"}), 400
+        
+        filepath = file_store.path(filename)
+        if not filepath:
+            return jsonify({"error": "File not found"}), 404
+        file_store.touch(filepath)
+        
+        # conditional=True answers If-None-Match / If-Modified-Since with 304
+        # and Range with 206; full responses go out via wsgi.file_wrapper
+        digest = content_hash(filename)
+        mimetype = mimetypes.guess_type(filename)[0] or 'application/octet-stream'
+        response = send_file(
+            filepath,
+            mimetype=mimetype,
+            conditional=True,
+            etag=digest or True,
+            max_age=IMMUTABLE_MAX_AGE if digest else DEFAULT_MAX_AGE
+        )
+        response.headers['Accept-Ranges'] = 'bytes'
+        response.cache_control.public = True
+        if digest:
+            response.cache_control.immutable = True
+        return response
+        
+    except Exception as e:
+        return jsonify({"error": str(e)}), 500
@@ -1,18 +1,29 @@
-from flask import Blueprint, request, jsonify, send_file
-import os
-from utils.hf_client import HFClient
+from flask import Blueprint, request, jsonify
+from utils.hf_client import get_hf_client
+from utils.circuit_breaker import ModelUnavailable
+from utils.jobs import job_queue, QueueFull, webhook_allowed
+from utils.rate_limit import route_limit_error
+from utils.scheduler import acting_as, current_client
 
 image_bp = Blueprint('image', __name__)
-hf_client = HFClient()
+hf_client = get_hf_client()
+
+def run_image_job(payload):
+    """Background job handler for image generation"""
+    # Jobs share upstream capacity as the client that submitted them
+    with acting_as(payload.get('client')):
+        filename = hf_client.generate_image(payload['prompt'], payload['preset'])
+    return {"url": f"/api/files/{filename}", "filename": filename}
+
+job_queue.register('image', run_image_job)
 
 @image_bp.route('/image', methods=['POST'])
 def generate_image():
     try:
-        from flask import current_app
-        # Apply rate limit manually
-        with current_app.app_context():
-            if not current_app.limiter.test_limit(image_bp.name + "image"):
-                return jsonify({"error": "Rate limit exceeded"}), 429
+        # Charge this client's shared per-route bucket
+        limited = route_limit_error('image')
+        if limited:
+            return limited
 
         data = request.get_json()
         prompt = data.get('prompt', '').strip()
@@ -24,6 +35,22 @@ def generate_image():
         if len(prompt) > 500:
             return jsonify({"error": "Prompt too long. Maximum 500 characters."}), 400
         
+        # Job mode: return at once and let the client poll /api/jobs/<id>
+        if request.args.get('async') in ('1', 'true'):
+            webhook_url = data.get('webhook_url')
+            if webhook_url and not webhook_allowed(webhook_url):
+                return jsonify({"error": "Webhook URL not allowed"}), 400
+            try:
+                job_id = job_queue.submit('image', {"prompt": prompt, "preset": preset, "client": current_client()},
+                                          webhook_url)
+            except QueueFull:
+                return jsonify({"error": "Image queue is full. Please try again later."}), 503, {"Retry-After": "30"}
+            return jsonify({
+                "job_id": job_id,
+                "status": "queued",
+                "status_url": f"/api/jobs/{job_id}"
+            }), 202
+        
         # Generate image
         filename = hf_client.generate_image(prompt, preset)
         
@@ -32,21 +59,7 @@ def generate_image():
             "filename": filename
         })
         
-    except Exception as e:
-        return jsonify({"error": str(e)}), 500
-
-@image_bp.route('/files/<filename>')
-def get_image(filename):
-    try:
-        # Security: Validate filename to prevent directory traversal
-        if '..' in filename or '/' in filename:
-            return jsonify({"error": "Invalid filename"}), 400
-            
-        filepath = os.path.join('temp', filename)
-        if not os.path.exists(filepath):
-            return jsonify({"error": "Image not found"}), 404
-            
-        return send_file(filepath, mimetype='image/png')
-        
+    except ModelUnavailable as e:
+        return jsonify({"error": str(e)}), 503, {"Retry-After": str(e.retry_after)}
     except Exception as e:
         return jsonify({"error": str(e)}), 500
@@ -0,0 +1,16 @@
+from flask import Blueprint, jsonify
+from utils.jobs import job_queue
+
+jobs_bp = Blueprint('jobs', __name__)
+
+@jobs_bp.route('/jobs/<job_id>')
+def get_job(job_id):
+    try:
+        job = job_queue.get(job_id)
+        if not job:
+            return jsonify({"error": "Job not found"}), 404
+        
+        return jsonify(job)
+        
+    except Exception as e:
+        return jsonify({"error": str(e)}), 500
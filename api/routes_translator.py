@@ -1,17 +1,22 @@
 from flask import Blueprint, request, jsonify
-from utils.hf_client import HFClient
+import os
+from utils.hf_client import get_hf_client
+from utils.circuit_breaker import ModelUnavailable
+from utils.rate_limit import route_limit_error
 
 translator_bp = Blueprint('translator', __name__)
-hf_client = HFClient()
+hf_client = get_hf_client()
+
+# Maximum number of texts accepted by /translate/batch
+MAX_BATCH_SIZE = int(os.environ.get('TRANSLATE_BATCH_MAX', '50'))
 
 @translator_bp.route('/translate', methods=['POST'])
 def translate_text():
     try:
-        from flask import current_app
-        # Apply rate limit manually
-        with current_app.app_context():
-            if not current_app.limiter.test_limit(translator_bp.name + "translate"):
-                return jsonify({"error": "Rate limit exceeded"}), 429
+        # Charge this client's shared per-route bucket
+        limited = route_limit_error('translate')
+        if limited:
+            return limited
 
         data = request.get_json()
         text = data.get('text', '').strip()
@@ -34,5 +39,66 @@ def translate_text():
             "target_lang": target_lang
         })
         
+    except ModelUnavailable as e:
+        return jsonify({"error": str(e)}), 503, {"Retry-After": str(e.retry_after)}
+    except Exception as e:
+        return jsonify({"error": str(e)}), 500
+
+@translator_bp.route('/translate/batch', methods=['POST'])
+def translate_batch():
+    try:
+        # One rate limit charge for the whole batch; the quota pays per text translated upstream
+        limited = route_limit_error('translate')
+        if limited:
+            return limited
+
+        data = request.get_json()
+        items = data.get('items')
+        default_target = data.get('target_lang', 'en')
+        default_source = data.get('source_lang', 'en')
+        
+        # Plain list of strings sharing the top-level language pair
+        if items is None and isinstance(data.get('texts'), list):
+            items = [{"text": text} for text in data['texts']]
+        
+        if not isinstance(items, list) or not items:
+            return jsonify({"error": "Items are required"}), 400
+        
+        if len(items) > MAX_BATCH_SIZE:
+            return jsonify({"error": f"Too many items. Maximum {MAX_BATCH_SIZE} per batch."}), 400
+        
+        results = [None] * len(items)
+        valid = []
+        for index, item in enumerate(items):
+            if not isinstance(item, dict):
+                item = {"text": item}
+            text = item.get('text')
+            text = text.strip() if isinstance(text, str) else ''
+            entry = {
+                "original_text": text,
+                "source_lang": item.get('source_lang', default_source),
+                "target_lang": item.get('target_lang', default_target)
+            }
+            if not text:
+                results[index] = dict(entry, error="Text is required")
+            elif len(text) > 2000:
+                results[index] = dict(entry, error="Text too long. Maximum 2000 characters.")
+            else:
+                results[index] = entry
+                valid.append(index)
+        
+        translations = hf_client.translate_batch([
+            {"text": results[i]["original_text"], "source_lang": results[i]["source_lang"],
+             "target_lang": results[i]["target_lang"]}
+            for i in valid
+        ])
+        for index, translation in zip(valid, translations):
+            results[index].update(translation)
+        
+        return jsonify({
+            "results": results,
+            "count": len(results)
+        })
+        
     except Exception as e:
         return jsonify({"error": str(e)}), 500
@@ -1,18 +1,18 @@
 from flask import Blueprint, request, jsonify
-import os
-from utils.hf_client import HFClient
+from utils.hf_client import get_hf_client, UploadTooLarge, MAX_AUDIO_BYTES
+from utils.circuit_breaker import ModelUnavailable
+from utils.rate_limit import route_limit_error
 
 tts_bp = Blueprint('tts', __name__)
-hf_client = HFClient()
+hf_client = get_hf_client()
 
 @tts_bp.route('/tts', methods=['POST'])
 def text_to_speech():
     try:
-        from flask import current_app
-        # Apply rate limit manually
-        with current_app.app_context():
-            if not current_app.limiter.test_limit(tts_bp.name + "tts"):
-                return jsonify({"error": "Rate limit exceeded"}), 429
+        # Charge this client's shared per-route bucket
+        limited = route_limit_error('tts')
+        if limited:
+            return limited
 
         data = request.get_json()
         text = data.get('text', '').strip()
@@ -31,45 +31,43 @@ def text_to_speech():
             "filename": filename
         })
         
+    except ModelUnavailable as e:
+        return jsonify({"error": str(e)}), 503, {"Retry-After": str(e.retry_after)}
     except Exception as e:
         return jsonify({"error": str(e)}), 500
 
 @tts_bp.route('/stt', methods=['POST'])
 def speech_to_text():
     try:
-        from flask import current_app
-        # Apply rate limit manually
-        with current_app.app_context():
-            if not current_app.limiter.test_limit(tts_bp.name + "stt"):
-                return jsonify({"error": "Rate limit exceeded"}), 429
+        # Charge this client's shared per-route bucket
+        limited = route_limit_error('stt')
+        if limited:
+            return limited
 
-        if 'audio' not in request.files:
-            return jsonify({"error": "Audio file is required"}), 400
-        
-        audio_file = request.files['audio']
-        if audio_file.filename == '':
-            return jsonify({"error": "No audio file selected"}), 400
+        # Raw audio bodies are relayed straight from the socket; multipart
+        # uploads come from werkzeug's spooled file (on disk past 500 KB)
+        if request.mimetype.startswith('audio/') or request.mimetype == 'application/octet-stream':
+            if request.content_length and request.content_length > MAX_AUDIO_BYTES:
+                return jsonify({"error": "Audio file too large"}), 413
+            audio_stream = request.stream
+        else:
+            if 'audio' not in request.files:
+                return jsonify({"error": "Audio file is required"}), 400
+            
+            audio_file = request.files['audio']
+            if audio_file.filename == '':
+                return jsonify({"error": "No audio file selected"}), 400
+            audio_stream = audio_file.stream
         
         # Convert speech to text
-        audio_data = audio_file.read()
-        text = hf_client.speech_to_text(audio_data)
+        try:
+            text = hf_client.speech_to_text(audio_stream)
+        except UploadTooLarge:
+            return jsonify({"error": "Audio file too large"}), 413
         
         return jsonify({"text": text})
         
-    except Exception as e:
-        return jsonify({"error": str(e)}), 500
-
-@tts_bp.route('/files/<filename>')
-def get_tts(filename):
-    try:
-        if '..' in filename or '/' in filename:
-            return jsonify({"error": "Invalid filename"}), 400
-            
-        filepath = os.path.join('temp', filename)
-        if not os.path.exists(filepath):
-            return jsonify({"error": "Audio file not found"}), 404
-            
-        return send_file(filepath, mimetype='audio/wav')
-        
+    except ModelUnavailable as e:
+        return jsonify({"error": str(e)}), 503, {"Retry-After": str(e.retry_after)}
     except Exception as e:
         return jsonify({"error": str(e)}), 500
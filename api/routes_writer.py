@@ -1,19 +1,51 @@
-from flask import Blueprint, request, jsonify
-from utils.hf_client import HFClient
-import uuid
+from flask import Blueprint, request, jsonify, Response, stream_with_context
+from utils.hf_client import get_hf_client, model_guards, CHAT_MODEL, CHAT_ERROR_REPLY, CHAT_EMPTY_REPLY
+from utils.circuit_breaker import ModelUnavailable
+from utils.cache import LRUCache
+from utils.longform import (
+    LongFormWriter, assemble, parse_regenerate,
+    WRITER_CACHE_ENTRIES, WRITER_CACHE_BYTES, WRITER_CACHE_TTL
+)
+from utils.sse import sse_stream, sse_sections
+from utils.rate_limit import route_limit_error
+from utils.resume import render_resume, resume_filename, stream_resume_zip, iter_ndjson
+from utils.timing import phase
 import os
 
 writer_bp = Blueprint('writer', __name__)
-hf_client = HFClient()
+hf_client = get_hf_client()
+
+# Maximum number of resumes in one /generate_resume/batch export
+MAX_RESUME_BATCH = int(os.environ.get('RESUME_BATCH_MAX', '1000'))
+
+# length=long (or mode=sections) writes an outline, then its sections in parallel
+long_form_writer = LongFormWriter(
+    hf_client.chat_completion,
+    lambda reply: reply in (CHAT_ERROR_REPLY, CHAT_EMPTY_REPLY),
+    LRUCache(WRITER_CACHE_ENTRIES, WRITER_CACHE_BYTES, WRITER_CACHE_TTL)
+)
+
+def is_long_form(data, length):
+    return length == 'long' or data.get('mode') == 'sections'
+
+def build_content_prompt(content_type, topic, length, tone):
+    """Create enhanced prompt based on type"""
+    prompts = {
+        'blog': f"Write a {tone} blog post about: {topic}. Length: {length}",
+        'resume': f"Write a {tone} professional resume summary for: {topic}",
+        'cover_letter': f"Write a {tone} cover letter for: {topic}",
+        'social': f"Write a {tone} social media post about: {topic}. Length: {length}"
+    }
+    
+    return prompts.get(content_type, f"Write about: {topic}")
 
 @writer_bp.route('/write', methods=['POST'])
 def generate_content():
     try:
-        from flask import current_app
-        # Apply rate limit manually
-        with current_app.app_context():
-            if not current_app.limiter.test_limit(writer_bp.name + "write"):
-                return jsonify({"error": "Rate limit exceeded"}), 429
+        # Charge this client's shared per-route bucket
+        limited = route_limit_error('write')
+        if limited:
+            return limited
 
         data = request.get_json()
         content_type = data.get('type', 'blog')
@@ -27,15 +59,25 @@ def generate_content():
         if len(topic) > 500:
             return jsonify({"error": "Topic too long. Maximum 500 characters."}), 400
         
-        # Create enhanced prompt based on type
-        prompts = {
-            'blog': f"Write a {tone} blog post about: {topic}. Length: {length}",
-            'resume': f"Write a {tone} professional resume summary for: {topic}",
-            'cover_letter': f"Write a {tone} cover letter for: {topic}",
-            'social': f"Write a {tone} social media post about: {topic}. Length: {length}"
-        }
-        
-        prompt = prompts.get(content_type, f"Write about: {topic}")
+        if is_long_form(data, length):
+            outline = long_form_writer.outline(content_type, topic, tone)
+            regenerate = parse_regenerate(data.get('regenerate'), len(outline))
+            if regenerate is None:
+                return jsonify({"error": "regenerate must be a list of section indexes"}), 400
+            
+            # Section calls run on the writer's pool, where phases are not recorded
+            with phase('upstream', 'sections'):
+                sections = list(long_form_writer.sections(content_type, topic, tone, outline, regenerate))
+            return jsonify({
+                "content": assemble(sections),
+                "sections": sections,
+                "type": content_type,
+                "topic": topic,
+                "length": length,
+                "tone": tone
+            })
+        
+        prompt = build_content_prompt(content_type, topic, length, tone)
         
         # Generate content
         content = hf_client.chat_completion(prompt)
@@ -48,17 +90,64 @@ def generate_content():
             "tone": tone
         })
         
+    except ModelUnavailable as e:
+        return jsonify({"error": str(e)}), 503, {"Retry-After": str(e.retry_after)}
+    except Exception as e:
+        return jsonify({"error": str(e)}), 500
+
+@writer_bp.route('/write/stream', methods=['POST'])
+def generate_content_stream():
+    try:
+        # Charge this client's shared per-route bucket
+        limited = route_limit_error('write')
+        if limited:
+            return limited
+
+        data = request.get_json()
+        content_type = data.get('type', 'blog')
+        topic = data.get('topic', '').strip()
+        length = data.get('length', 'medium')
+        tone = data.get('tone', 'professional')
+        
+        if not topic:
+            return jsonify({"error": "Topic is required"}), 400
+        
+        if len(topic) > 500:
+            return jsonify({"error": "Topic too long. Maximum 500 characters."}), 400
+        
+        # Refuse up front rather than opening a stream that can only fail
+        model_guards.check(CHAT_MODEL)
+        meta = {"model": CHAT_MODEL, "type": content_type, "topic": topic, "length": length, "tone": tone}
+        
+        if is_long_form(data, length):
+            # Sections arrive in order, each as soon as it and those before it are done
+            outline = long_form_writer.outline(content_type, topic, tone)
+            regenerate = parse_regenerate(data.get('regenerate'), len(outline))
+            if regenerate is None:
+                return jsonify({"error": "regenerate must be a list of section indexes"}), 400
+            events = sse_sections(
+                long_form_writer.sections(content_type, topic, tone, outline, regenerate),
+                dict(meta, outline=outline),
+                CHAT_ERROR_REPLY
+            )
+        else:
+            prompt = build_content_prompt(content_type, topic, length, tone)
+            events = sse_stream(hf_client.stream_chat_completion(prompt), meta, CHAT_ERROR_REPLY)
+        return Response(stream_with_context(events), mimetype='text/event-stream',
+                        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"})
+        
+    except ModelUnavailable as e:
+        return jsonify({"error": str(e)}), 503, {"Retry-After": str(e.retry_after)}
     except Exception as e:
         return jsonify({"error": str(e)}), 500
 
 @writer_bp.route('/generate_resume', methods=['POST'])
 def generate_resume():
     try:
-        from flask import current_app
-        # Apply rate limit manually
-        with current_app.app_context():
-            if not current_app.limiter.test_limit(writer_bp.name + "generate_resume"):
-                return jsonify({"error": "Rate limit exceeded"}), 429
+        # Charge this client's shared per-route bucket
+        limited = route_limit_error('generate_resume', quota=False)
+        if limited:
+            return limited
 
         data = request.get_json()
         
@@ -66,11 +155,9 @@ def generate_resume():
         if not data.get('name') or not data.get('email'):
             return jsonify({"error": "Name and email are required fields"}), 400
         
-        # Create simple HTML resume (no external CSS, no complex styling)
-        html_content = create_simple_html_resume(data)
-        
-        # Generate a unique filename
-        filename = f"resume_{data.get('name', 'unknown').replace(' ', '_')}.html"
+        # Self-contained HTML from the precompiled, escaping template
+        html_content = render_resume(data)
+        filename = resume_filename(data)
         
         return jsonify({
             "success": True,
@@ -83,100 +170,31 @@ def generate_resume():
     except Exception as e:
         return jsonify({"error": f"Resume generation failed: {str(e)}"}), 500
 
-def create_simple_html_resume(data):
-    """Create a simple HTML resume without external dependencies"""
-    
-    name = data.get('name', 'Your Name')
-    email = data.get('email', '')
-    phone = data.get('phone', '')
-    location = data.get('location', '')
-    summary = data.get('summary', '')
-    experience = data.get('experience', '')
-    education = data.get('education', '')
-    skills = data.get('skills', '')
-    
-    # Simple HTML template
-    html = f"""
-    <!DOCTYPE html>
-    <html>
-    <head>
-        <meta charset="UTF-8">
-        <title>Resume - {name}</title>
-        <style>
-            body {{
-                font-family: Arial, sans-serif;
-                margin: 40px;
-                line-height: 1.6;
-                color: #333;
-            }}
-            .header {{
-                text-align: center;
-                border-bottom: 2px solid #078C03;
-                padding-bottom: 20px;
-                margin-bottom: 30px;
-            }}
-            .name {{
-                font-size: 28px;
-                font-weight: bold;
-                color: #1a202c;
-                margin-bottom: 10px;
-            }}
-            .contact {{
-                color: #666;
-                margin-bottom: 5px;
-            }}
-            .section {{
-                margin-top: 25px;
-            }}
-            .section-title {{
-                font-size: 18px;
-                font-weight: bold;
-                color: #078C03;
-                border-bottom: 1px solid #ccc;
-                padding-bottom: 5px;
-                margin-bottom: 10px;
-            }}
-            .skills {{
-                margin-top: 5px;
-            }}
-            .skill {{
-                display: inline-block;
-                background: #078C03;
-                color: white;
-                padding: 4px 12px;
-                border-radius: 20px;
-                font-size: 13px;
-                margin-right: 8px;
-                margin-bottom: 8px;
-            }}
-            @media print {{
-                body {{
-                    margin: 20px;
-                }}
-            }}
-        </style>
-    </head>
-    <body>
-        <div class="header">
-            <div class="name">{name}</div>
-            <div class="contact">{email}</div>
-            <div class="contact">{phone}</div>
-            <div class="contact">{location}</div>
-        </div>
-        
-        {f'<div class="section"><div class="section-title">Professional Summary</div><div>{summary}</div></div>' if summary else ''}
-        
-        {f'<div class="section"><div class="section-title">Work Experience</div><div>{experience.replace(chr(10), "<br>")}</div></div>' if experience else ''}
-        
-        {f'<div class="section"><div class="section-title">Education</div><div>{education.replace(chr(10), "<br>")}</div></div>' if education else ''}
-        
-        {f'<div class="section"><div class="section-title">Skills</div><div class="skills">{"".join([f"<span class=\"skill\">{skill.strip()}</span>" for skill in skills.split(",") if skill.strip()])}</div></div>' if skills else ''}
-        
-        <div style="margin-top: 40px; text-align: center; color: #666; font-size: 12px;">
-            Generated with Ethio GPT Tools
-        </div>
-    </body>
-    </html>
-    """
-    
-    return html
+@writer_bp.route('/generate_resume/batch', methods=['POST'])
+def generate_resume_batch():
+    try:
+        # The whole batch is one charge against its own bucket
+        limited = route_limit_error('generate_resume_batch', quota=False)
+        if limited:
+            return limited
+
+        # NDJSON bodies (one resume per line) are read as they arrive;
+        # a JSON body carries the list under "resumes"
+        if request.mimetype == 'application/x-ndjson':
+            resumes = iter_ndjson(request.stream)
+        else:
+            data = request.get_json()
+            resumes = data.get('resumes') if isinstance(data, dict) else None
+            if not isinstance(resumes, list) or not resumes:
+                return jsonify({"error": "resumes must be a non-empty list"}), 400
+            if len(resumes) > MAX_RESUME_BATCH:
+                return jsonify({"error": f"Too many resumes. Maximum {MAX_RESUME_BATCH}."}), 400
+        
+        return Response(
+            stream_with_context(stream_resume_zip(resumes, MAX_RESUME_BATCH)),
+            mimetype='application/zip',
+            headers={"Content-Disposition": 'attachment; filename="resumes.zip"', "X-Accel-Buffering": "no"}
+        )
+        
+    except Exception as e:
+        return jsonify({"error": f"Resume generation failed: {str(e)}"}), 500
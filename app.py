@@ -1,4 +1,4 @@
-from flask import Flask, request, jsonify, send_file
+from flask import Flask, request, jsonify, g
 from flask_cors import CORS
 from flask_jwt_extended import JWTManager
 from flask_limiter import Limiter
@@ -6,7 +6,8 @@ from flask_limiter.util import get_remote_address
 import os
 import logging
 from datetime import timedelta
-import json
+from contextlib import ExitStack
+import time
 
 # Import route blueprints
 from api.routes_chat import chat_bp
@@ -15,15 +16,34 @@ from api.routes_tts import tts_bp
 from api.routes_translator import translator_bp
 from api.routes_writer import writer_bp
 from api.routes_auth import auth_bp
-from api.routes_admin import admin_bp
+from api.routes_admin import admin_bp, is_admin_request
+from api.routes_jobs import jobs_bp, get_job
+from api.routes_files import files_bp
+from utils.hf_client import MAX_AUDIO_BYTES, start_model_warmer
+from utils.deadline import REQUEST_DEADLINE, deadline
+from utils.metrics import HTTP_REQUESTS, HTTP_LATENCY, HTTP_IN_FLIGHT
+from utils.jobs import job_queue
+from utils.file_store import file_store
+from utils.rate_limit import RATE_LIMIT_STORAGE_URI, RATE_LIMIT_ENABLED
+from utils.capture import request_capture
+from utils.timing import TimedRequest, TimedJSONProvider, start_timing, add_timing_header
+from utils.profiler import try_start_profile, profile_response
 
 def create_app():
     app = Flask(__name__)
+    # Count JSON decoding and jsonify in the Server-Timing breakdown
+    app.request_class = TimedRequest
+    app.json = TimedJSONProvider(app)
     
     # Configuration
     app.config['SECRET_KEY'] = os.environ.get('SECRET_KEY', 'dev-secret-key-change-in-production')
     app.config['JWT_SECRET_KEY'] = os.environ.get('JWT_SECRET_KEY', app.config['SECRET_KEY'])
     app.config['JWT_ACCESS_TOKEN_EXPIRES'] = timedelta(hours=24)
+    # Multipart parsing stops once a body passes the largest allowed upload
+    app.config['MAX_CONTENT_LENGTH'] = MAX_AUDIO_BYTES + 1024 * 1024
+    # Let a fronting nginx/Apache send generated files itself
+    app.config['USE_X_SENDFILE'] = os.environ.get('USE_X_SENDFILE', '').lower() in ('1', 'true')
+    app.config['RATELIMIT_ENABLED'] = RATE_LIMIT_ENABLED
     
     # Initialize extensions
     CORS(app, origins=[
@@ -33,17 +53,21 @@ def create_app():
     
     jwt = JWTManager(app)
     
-    # Rate limiting - CORRECT initialization
+    # Rate limiting - counters live in shared memory so every worker
+    # on the host charges the same buckets
     limiter = Limiter(
         get_remote_address,
         app=app,
         default_limits=["200 per day", "50 per hour"],
-        storage_uri="memory://",
+        storage_uri=RATE_LIMIT_STORAGE_URI,
     )
     
     # Store limiter in app context for manual rate limiting
     app.limiter = limiter
     
+    # Clients poll job status; the default limits are shared by every route and worker
+    limiter.exempt(get_job)
+    
     # Register blueprints
     app.register_blueprint(chat_bp, url_prefix='/api')
     app.register_blueprint(image_bp, url_prefix='/api')
@@ -52,21 +76,86 @@ def create_app():
     app.register_blueprint(writer_bp, url_prefix='/api')
     app.register_blueprint(auth_bp, url_prefix='/api')
     app.register_blueprint(admin_bp, url_prefix='/api')
+    app.register_blueprint(jobs_bp, url_prefix='/api')
+    app.register_blueprint(files_bp, url_prefix='/api')
+    
+    # Pick up background jobs interrupted by a restart
+    try:
+        job_queue.recover()
+    except Exception as e:
+        logging.getLogger(__name__).error(f"Job recovery failed: {e}")
+    
+    # Server-Timing phases (SERVER_TIMING=1). An admin can profile one
+    # request with ?profile=1 or an X-Profile header; the response is then
+    # the request's collapsed stacks instead of its body.
+    @app.before_request
+    def start_request_timing():
+        profiler = None
+        if (request.args.get('profile') or request.headers.get('X-Profile')) and is_admin_request():
+            profiler = try_start_profile()
+        g.profiler = profiler
+        start_timing(force=profiler is not None)
+    
+    @app.after_request
+    def finish_request_timing(response):
+        profiler = g.pop('profiler', None)
+        if profiler is not None:
+            return profile_response(profiler, response)
+        return add_timing_header(response)
+    
+    # Per-route latency, status and in-flight metrics
+    @app.before_request
+    def start_request_metrics():
+        g.metrics_route = request.url_rule.rule if request.url_rule else 'unmatched'
+        g.metrics_start = time.perf_counter()
+        HTTP_IN_FLIGHT.inc(route=g.metrics_route)
+    
+    @app.after_request
+    def record_request_metrics(response):
+        if 'metrics_start' in g:
+            HTTP_LATENCY.observe(time.perf_counter() - g.metrics_start, route=g.metrics_route, method=request.method)
+            HTTP_REQUESTS.inc(route=g.metrics_route, method=request.method, status=response.status_code)
+        return response
+    
+    @app.teardown_request
+    def finish_request_metrics(error=None):
+        if 'metrics_start' in g:
+            HTTP_IN_FLIGHT.dec(route=g.metrics_route)
+    
+    # One deadline for all the upstream work a request does
+    @app.before_request
+    def start_request_deadline():
+        g.request_deadline = ExitStack()
+        g.request_deadline.enter_context(deadline(REQUEST_DEADLINE))
+    
+    @app.teardown_request
+    def end_request_deadline(error=None):
+        stack = g.pop('request_deadline', None)
+        if stack is not None:
+            stack.close()
+    
+    # Sampled, redacted request records for offline replay (CAPTURE_SAMPLE_RATE)
+    @app.before_request
+    def start_request_capture():
+        request_capture.start()
+    
+    @app.after_request
+    def finish_request_capture(response):
+        return request_capture.finish(response)
     
     # Health check endpoint
     @app.route('/api/health')
     def health():
         return jsonify({"status": "healthy", "service": "Ethio GPT Tools Backend"})
     
-    # Serve uploaded files
-    @app.route('/api/files/<filename>')
-    def serve_file(filename):
-        try:
-            return send_file(f'temp/{filename}')
-        except Exception as e:
-            return jsonify({"error": "File not found"}), 404
+    # Expire and cap generated files in the background
+    file_store.start_sweeper()
     
     # Error handlers
+    @app.errorhandler(413)
+    def too_large_handler(e):
+        return jsonify({"error": "Request too large"}), 413
+    
     @app.errorhandler(429)
     def ratelimit_handler(e):
         return jsonify({"error": "Rate limit exceeded", "message": "Too many requests"}), 429
@@ -82,4 +171,5 @@ app = create_app()
 if __name__ == '__main__':
     # Create necessary directories
     os.makedirs('temp', exist_ok=True)
+    start_model_warmer()
     app.run(debug=True, host='0.0.0.0', port=5000)
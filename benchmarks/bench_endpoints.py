@@ -0,0 +1,356 @@
+"""Throughput and latency percentiles for every /api endpoint.
+
+Starts the stub inference API, runs the real ``create_app()`` under
+gunicorn for each worker setup, and drives each endpoint with a fixed
+number of concurrent requests. Results (requests/s and p50/p95/p99 per
+endpoint) are written as JSON, one file per commit, so two commits can
+be compared without spending HF quota.
+
+    python -m benchmarks.bench_endpoints --workers sync:2,gthread:2x8 --requests 200 --concurrency 16
+    python -m benchmarks.bench_endpoints --latency 0.2 --latency-dist lognormal --error-rate 0.01
+    python -m benchmarks.bench_endpoints --compare benchmarks/results/abc123.json benchmarks/results/def456.json
+
+A worker spec is ``class:workers`` or ``class:workersxthreads``. Classes
+whose library is not installed (gevent, eventlet) are skipped.
+"""
+import argparse
+import asyncio
+import importlib.util
+import io
+import json
+import os
+import platform
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+import urllib.request
+import wave
+from datetime import datetime, timezone
+
+import aiohttp
+
+from benchmarks.load_async import free_port, wait_until_up
+from benchmarks.stub_server import add_stub_arguments, stub_options
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+RESULTS_DIR = os.path.join(ROOT, 'benchmarks', 'results')
+ADMIN_SECRET = 'bench-admin-secret'
+
+# The library each gunicorn worker class needs besides gunicorn itself
+WORKER_MODULES = {'sync': None, 'gthread': None, 'gevent': 'gevent', 'eventlet': 'eventlet'}
+
+
+def silent_wav(seconds: float = 1.0, rate: int = 16000) -> bytes:
+    buffer = io.BytesIO()
+    with wave.open(buffer, 'wb') as w:
+        w.setnchannels(1)
+        w.setsampwidth(2)
+        w.setframerate(rate)
+        w.writeframes(b'\x00\x00' * int(seconds * rate))
+    return buffer.getvalue()
+
+
+WAV = silent_wav()
+
+
+def resume(i: int) -> dict:
+    return {"name": f"Bench User {i}", "email": f"user{i}@example.com", "phone": "+251 900 000 000",
+            "location": "Addis Ababa", "summary": "Engineer.", "experience": "Company A\nCompany B",
+            "education": "BSc", "skills": "python, flask, sql"}
+
+
+# name -> (method, path, request builder); a builder takes (i, context) and
+# returns aiohttp request keyword arguments. ``i`` is unique per request
+# unless --repeat is set, so cached paths are only hit on purpose.
+ENDPOINTS = {
+    'health': ('GET', '/api/health', lambda i, ctx: {}),
+    'chat': ('POST', '/api/chat', lambda i, ctx: {"json": {"input": f"hello {i}"}}),
+    'chat_stream': ('POST', '/api/chat/stream', lambda i, ctx: {"json": {"input": f"hello {i}"}}),
+    'image': ('POST', '/api/image', lambda i, ctx: {"json": {"prompt": f"a lion {i}", "preset": "realistic"}}),
+    'image_async': ('POST', '/api/image?async=1', lambda i, ctx: {"json": {"prompt": f"a lion {i}"}}),
+    'tts': ('POST', '/api/tts', lambda i, ctx: {"json": {"text": f"selam {i}"}}),
+    'stt': ('POST', '/api/stt', lambda i, ctx: {"data": WAV, "headers": {"Content-Type": "audio/wav"}}),
+    'translate': ('POST', '/api/translate',
+                  lambda i, ctx: {"json": {"text": f"good morning {i}", "target_lang": "fr"}}),
+    'translate_batch': ('POST', '/api/translate/batch',
+                        lambda i, ctx: {"json": {"texts": [f"line {i} {n}" for n in range(10)],
+                                                 "target_lang": "fr"}}),
+    'write': ('POST', '/api/write', lambda i, ctx: {"json": {"type": "blog", "topic": f"coffee {i}"}}),
+    'write_stream': ('POST', '/api/write/stream', lambda i, ctx: {"json": {"type": "blog", "topic": f"coffee {i}"}}),
+    'write_long': ('POST', '/api/write',
+                   lambda i, ctx: {"json": {"type": "blog", "topic": f"coffee {i}", "length": "long"}}),
+    'generate_resume': ('POST', '/api/generate_resume', lambda i, ctx: {"json": resume(i)}),
+    'generate_resume_batch': ('POST', '/api/generate_resume/batch',
+                              lambda i, ctx: {"json": {"resumes": [resume(i * 50 + n) for n in range(50)]}}),
+    'login': ('POST', '/api/login', lambda i, ctx: {"json": {"username": f"bench{i}"}}),
+    'me': ('GET', '/api/me', lambda i, ctx: {"headers": {"Authorization": f"Bearer {ctx['token']}"}}),
+    'jobs': ('GET', '/api/jobs/{job_id}', lambda i, ctx: {}),
+    'files': ('GET', '/api/files/{filename}', lambda i, ctx: {}),
+    'admin_stats': ('GET', '/api/admin/stats', lambda i, ctx: {"headers": {"X-Admin-Secret": ADMIN_SECRET}}),
+    'admin_metrics': ('GET', '/api/admin/metrics', lambda i, ctx: {"headers": {"X-Admin-Secret": ADMIN_SECRET}})
+}
+
+
+def parse_worker_specs(value: str) -> list:
+    """'sync:2,gthread:2x8' -> [('sync', 2, 1), ('gthread', 2, 8)]"""
+    specs = []
+    for spec in filter(None, (part.strip() for part in value.split(','))):
+        worker_class, _, count = spec.partition(':')
+        workers, _, threads = (count or '1').partition('x')
+        specs.append((worker_class, int(workers), int(threads or 1)))
+    return specs
+
+
+def worker_available(worker_class: str) -> bool:
+    if worker_class not in WORKER_MODULES:
+        return False
+    module = WORKER_MODULES[worker_class]
+    return module is None or importlib.util.find_spec(module) is not None
+
+
+def percentile(ordered: list, q: float) -> float:
+    if not ordered:
+        return None
+    return ordered[min(len(ordered) - 1, int(len(ordered) * q / 100))]
+
+
+def git_commit() -> str:
+    try:
+        commit = subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], cwd=ROOT, capture_output=True,
+                                text=True, check=True).stdout.strip()
+        dirty = subprocess.run(['git', 'status', '--porcelain', '--untracked-files=no'], cwd=ROOT,
+                               capture_output=True, text=True).stdout.strip()
+        return f"{commit}-dirty" if dirty else commit
+    except (OSError, subprocess.CalledProcessError):
+        return 'unknown'
+
+
+def stub_stats(stub_url: str) -> dict:
+    with urllib.request.urlopen(f"{stub_url}/stats", timeout=5) as resp:
+        return json.load(resp)
+
+
+def app_env(stub_url: str, state_dir: str) -> dict:
+    """Point the app at the stub and keep every file it writes in state_dir"""
+    return dict(
+        os.environ,
+        HF_API_BASE_URL=f"{stub_url}/models",
+        HF_API_KEY='stub',
+        ADMIN_SECRET=ADMIN_SECRET,
+        # Measure the endpoints, not the limiter or quotas turning the load away
+        RATE_LIMIT_ENABLED='0',
+        USAGE_DAILY_QUOTA='0',
+        HF_WARMUP_INTERVAL='0',
+        CAPTURE_SAMPLE_RATE='0',
+        RATE_LIMIT_STORAGE_URI=f"sharedmem://{os.path.join(state_dir, 'ratelimit')}",
+        TEMP_DIR=os.path.join(state_dir, 'files'),
+        METRICS_DIR=os.path.join(state_dir, 'metrics'),
+        SINGLEFLIGHT_DIR=os.path.join(state_dir, 'singleflight'),
+        HF_BULKHEAD_DIR=os.path.join(state_dir, 'bulkheads'),
+        USER_STORE_PATH=os.path.join(state_dir, 'users.sqlite'),
+        JOBS_DB_PATH=os.path.join(state_dir, 'jobs.sqlite'),
+        WARMUP_STATE_PATH=os.path.join(state_dir, 'models.json')
+    )
+
+
+def start_stub(args) -> tuple:
+    port = free_port()
+    command = [sys.executable, '-m', 'benchmarks.stub_server', '--port', str(port)]
+    for name, value in stub_options(args).items():
+        if value is not None:
+            command += [f"--{name.replace('_', '-')}", str(value)]
+    stub = subprocess.Popen(command, cwd=ROOT, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    stub_url = f"http://127.0.0.1:{port}"
+    wait_until_up(f"{stub_url}/stats")
+    return stub, stub_url
+
+
+def start_app(worker_class: str, workers: int, threads: int, env: dict) -> tuple:
+    port = free_port()
+    command = [sys.executable, '-m', 'gunicorn', 'app:app', '--worker-class', worker_class,
+               '--workers', str(workers), '--bind', f"127.0.0.1:{port}", '--timeout', '120']
+    if threads > 1:
+        command += ['--threads', str(threads)]
+    server = subprocess.Popen(command, cwd=ROOT, env=env, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    app_url = f"http://127.0.0.1:{port}"
+    wait_until_up(f"{app_url}/api/health", timeout=60)
+    return server, app_url
+
+
+async def prepare(session: aiohttp.ClientSession, app_url: str) -> dict:
+    """Create the token, job and file the read-only endpoints look up"""
+    context = {}
+    async with session.post(f"{app_url}/api/login", json={"username": "bench"}) as resp:
+        context['token'] = (await resp.json())['access_token']
+    async with session.post(f"{app_url}/api/image?async=1", json={"prompt": "bench"}) as resp:
+        context['job_id'] = (await resp.json())['job_id']
+    async with session.post(f"{app_url}/api/tts", json={"text": "bench"}) as resp:
+        context['filename'] = (await resp.json())['filename']
+    return context
+
+
+async def drive(session: aiohttp.ClientSession, app_url: str, name: str, context: dict,
+                requests: int, concurrency: int, repeat: bool, offset: int = 0) -> dict:
+    """Send ``requests`` calls to one endpoint, ``concurrency`` at a time"""
+    method, path, build = ENDPOINTS[name]
+    url = app_url + path.format(**context)
+    latencies, statuses, errors = [], {}, 0
+    counter = iter(range(requests))
+
+    async def client():
+        nonlocal errors
+        for n in counter:
+            i = 0 if repeat else offset + n
+            start = time.perf_counter()
+            try:
+                async with session.request(method, url, **build(i, context)) as resp:
+                    # Streams count until their last byte arrives
+                    async for _ in resp.content.iter_chunked(65536):
+                        pass
+                    status = resp.status
+            except aiohttp.ClientError:
+                status = 'error'
+            latencies.append(time.perf_counter() - start)
+            statuses[str(status)] = statuses.get(str(status), 0) + 1
+            if status == 'error' or status >= 400:
+                errors += 1
+
+    start = time.perf_counter()
+    await asyncio.gather(*(client() for _ in range(concurrency)))
+    elapsed = time.perf_counter() - start
+    latencies.sort()
+    return {
+        "requests": requests,
+        "errors": errors,
+        "statuses": statuses,
+        "rps": round(requests / elapsed, 1),
+        "mean": round(sum(latencies) / len(latencies), 4),
+        "p50": round(percentile(latencies, 50), 4),
+        "p95": round(percentile(latencies, 95), 4),
+        "p99": round(percentile(latencies, 99), 4)
+    }
+
+
+async def run_endpoints(app_url: str, stub_url: str, names: list, args) -> dict:
+    connector = aiohttp.TCPConnector(limit=0)
+    timeout = aiohttp.ClientTimeout(total=180)
+    results = {}
+    async with aiohttp.ClientSession(connector=connector, timeout=timeout) as session:
+        context = await prepare(session, app_url)
+        for name in names:
+            if args.warmup:
+                await drive(session, app_url, name, context, args.warmup, min(args.concurrency, args.warmup),
+                            args.repeat, offset=10 ** 6)
+            before = stub_stats(stub_url)['requests']
+            results[name] = await drive(session, app_url, name, context, args.requests,
+                                        args.concurrency, args.repeat)
+            results[name]["upstream_calls"] = stub_stats(stub_url)['requests'] - before
+            print(f"  {name:<22} {results[name]['rps']:>8} req/s  p50 {results[name]['p50']:.4f}s  "
+                  f"p95 {results[name]['p95']:.4f}s  p99 {results[name]['p99']:.4f}s  "
+                  f"errors {results[name]['errors']}", file=sys.stderr)
+    return results
+
+
+def run(args) -> dict:
+    names = [name.strip() for name in args.endpoints.split(',')] if args.endpoints else list(ENDPOINTS)
+    unknown = [name for name in names if name not in ENDPOINTS]
+    if unknown:
+        raise SystemExit(f"unknown endpoints: {', '.join(unknown)}")
+
+    report = {
+        "meta": {
+            "commit": git_commit(),
+            "timestamp": datetime.now(timezone.utc).isoformat(timespec='seconds'),
+            "python": platform.python_version(),
+            "requests": args.requests,
+            "warmup": args.warmup,
+            "concurrency": args.concurrency,
+            "repeat": args.repeat,
+            "stub": stub_options(args)
+        },
+        "runs": [],
+        "skipped": []
+    }
+    for worker_class, workers, threads in parse_worker_specs(args.workers):
+        if not worker_available(worker_class):
+            print(f"skipping {worker_class}: not installed", file=sys.stderr)
+            report["skipped"].append(worker_class)
+            continue
+        print(f"{worker_class} workers={workers} threads={threads}", file=sys.stderr)
+        # A fresh stub per run so every run sees the same cold starts
+        state_dir = tempfile.mkdtemp(prefix='ethio-bench-')
+        stub, stub_url = start_stub(args)
+        server = None
+        try:
+            server, app_url = start_app(worker_class, workers, threads, app_env(stub_url, state_dir))
+            endpoints = asyncio.run(run_endpoints(app_url, stub_url, names, args))
+        finally:
+            if server:
+                server.terminate()
+                server.wait()
+            stub.terminate()
+            stub.wait()
+            shutil.rmtree(state_dir, ignore_errors=True)
+        report["runs"].append({"worker_class": worker_class, "workers": workers, "threads": threads,
+                               "endpoints": endpoints})
+    return report
+
+
+def compare(base_path: str, new_path: str, threshold: float) -> int:
+    """Print per-endpoint changes; 1 if any p95 or throughput regressed past threshold"""
+    with open(base_path) as f:
+        base = json.load(f)
+    with open(new_path) as f:
+        new = json.load(f)
+    base_runs = {(r["worker_class"], r["workers"], r["threads"]): r["endpoints"] for r in base["runs"]}
+    print(f"{base['meta']['commit']} -> {new['meta']['commit']} (threshold {threshold:.0%})")
+    regressions = 0
+    for run in new["runs"]:
+        key = (run["worker_class"], run["workers"], run["threads"])
+        if key not in base_runs:
+            continue
+        print(f"{key[0]} workers={key[1]} threads={key[2]}")
+        for name, result in run["endpoints"].items():
+            before = base_runs[key].get(name)
+            if not before:
+                continue
+            p95_change = result["p95"] / before["p95"] - 1 if before["p95"] else 0.0
+            rps_change = result["rps"] / before["rps"] - 1 if before["rps"] else 0.0
+            regressed = p95_change > threshold or rps_change < -threshold
+            regressions += regressed
+            print(f"  {name:<22} p95 {before['p95']:.4f}s -> {result['p95']:.4f}s ({p95_change:+.0%})  "
+                  f"req/s {before['rps']} -> {result['rps']} ({rps_change:+.0%})"
+                  f"{'  REGRESSION' if regressed else ''}")
+    return 1 if regressions else 0
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--workers', default='sync:2,gthread:2x8,gevent:2,eventlet:2',
+                        help="comma-separated class:workers[xthreads] specs")
+    parser.add_argument('--endpoints', help="comma-separated subset of: " + ', '.join(ENDPOINTS))
+    parser.add_argument('--requests', type=int, default=200, help="measured requests per endpoint")
+    parser.add_argument('--warmup', type=int, default=10, help="unmeasured requests per endpoint first")
+    parser.add_argument('--concurrency', type=int, default=16)
+    parser.add_argument('--repeat', action='store_true', help="send identical inputs to exercise caches")
+    parser.add_argument('--output', help="JSON report path (default benchmarks/results/<commit>.json)")
+    parser.add_argument('--compare', nargs=2, metavar=('BASE', 'NEW'), help="compare two reports and exit")
+    parser.add_argument('--threshold', type=float, default=0.1, help="relative change counted as a regression")
+    add_stub_arguments(parser)
+    args = parser.parse_args()
+
+    if args.compare:
+        sys.exit(compare(*args.compare, args.threshold))
+
+    report = run(args)
+    output = args.output or os.path.join(RESULTS_DIR, f"{report['meta']['commit']}.json")
+    os.makedirs(os.path.dirname(output) or '.', exist_ok=True)
+    with open(output, 'w') as f:
+        json.dump(report, f, indent=2)
+    print(f"wrote {output}", file=sys.stderr)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,53 @@
+"""Per-call overhead of bare ``requests.post`` vs the pooled HFClient session.
+
+    python -m benchmarks.bench_http_pool --calls 500
+"""
+import argparse
+import os
+import statistics
+import time
+
+import requests
+
+from benchmarks.stub_server import start_stub_server
+
+
+def time_calls(post, url: str, calls: int) -> list:
+    samples = []
+    for _ in range(calls):
+        start = time.perf_counter()
+        response = post(url, json={"inputs": "hello"}, timeout=10)
+        response.content
+        samples.append((time.perf_counter() - start) * 1000)
+    return samples
+
+
+def report(label: str, samples: list):
+    samples = sorted(samples)
+    p50 = statistics.median(samples)
+    p99 = samples[int(len(samples) * 0.99) - 1]
+    print(f"{label:<22} mean={statistics.mean(samples):7.3f}ms  p50={p50:7.3f}ms  p99={p99:7.3f}ms")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--calls', type=int, default=500)
+    args = parser.parse_args()
+
+    server, base_url = start_stub_server()
+    os.environ['HF_API_BASE_URL'] = base_url
+    from utils.hf_client import build_session
+
+    url = f"{base_url}/microsoft/DialoGPT-medium"
+    session = build_session()
+    # Warm both paths so imports and the first connect are not measured
+    time_calls(requests.post, url, 5)
+    time_calls(session.post, url, 5)
+
+    report("requests.post", time_calls(requests.post, url, args.calls))
+    report("pooled session", time_calls(session.post, url, args.calls))
+    server.shutdown()
+
+
+if __name__ == '__main__':
+    main()
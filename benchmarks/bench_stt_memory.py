@@ -0,0 +1,65 @@
+"""Peak RSS of speech_to_text as the audio upload grows.
+
+Each size runs in a fresh process so ``ru_maxrss`` is a clean peak. The
+"buffered" mode reads the whole upload into bytes first (the old route
+behaviour); "streamed" passes the open file and lets HFClient send it as a
+chunked body.
+
+    python -m benchmarks.bench_stt_memory --sizes 1,8,32,128
+"""
+import argparse
+import os
+import resource
+import subprocess
+import sys
+import tempfile
+
+
+def measure(mode: str, path: str):
+    from utils.hf_client import get_hf_client
+    client = get_hf_client()
+    with open(path, 'rb') as f:
+        if mode == 'buffered':
+            client.speech_to_text(f.read())
+        else:
+            client.speech_to_text(f)
+    print(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--sizes', default='1,8,32,128', help="upload sizes in MB")
+    args = parser.parse_args()
+
+    # The stub reads bodies into its own memory, so keep it out of process
+    stub = subprocess.Popen([sys.executable, '-m', 'benchmarks.stub_server', '--port', '8931'],
+                            stdout=subprocess.PIPE)
+    stub.stdout.readline()
+    env = dict(os.environ, HF_API_BASE_URL='http://127.0.0.1:8931/models', HF_API_KEY='stub',
+               MAX_AUDIO_BYTES=str(1024 * 1024 * 1024))
+    try:
+        print(f"{'size MB':>8} {'buffered RSS MB':>16} {'streamed RSS MB':>16}")
+        for size in (int(s) for s in args.sizes.split(',')):
+            with tempfile.NamedTemporaryFile(suffix='.wav') as audio:
+                # Write in 1 MB pieces: a forked child inherits the parent's
+                # peak RSS, so the parent must stay small too
+                for _ in range(size):
+                    audio.write(os.urandom(1024 * 1024))
+                audio.flush()
+                peaks = []
+                for mode in ('buffered', 'streamed'):
+                    out = subprocess.check_output(
+                        [sys.executable, '-m', 'benchmarks.bench_stt_memory', '--measure', mode, audio.name],
+                        env=env
+                    )
+                    peaks.append(int(out.split()[-1]) / 1024)
+            print(f"{size:>8} {peaks[0]:>16.1f} {peaks[1]:>16.1f}")
+    finally:
+        stub.terminate()
+
+
+if __name__ == '__main__':
+    if len(sys.argv) == 4 and sys.argv[1] == '--measure':
+        measure(sys.argv[2], sys.argv[3])
+    else:
+        main()
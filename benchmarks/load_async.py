@@ -0,0 +1,106 @@
+"""Concurrency and memory per in-flight request for the async worker.
+
+Starts the stub inference API with a fixed latency, runs ``aio_app`` in a
+single subprocess, fires N concurrent ``/api/translate`` calls and reports
+the peak number of upstream calls the one worker held open, plus the
+worker's RSS growth divided by the number of in-flight requests.
+
+    python -m benchmarks.load_async --concurrency 500 --latency 2
+"""
+import argparse
+import asyncio
+import json
+import os
+import socket
+import subprocess
+import sys
+import time
+import urllib.request
+
+import aiohttp
+
+from benchmarks.stub_server import start_stub_server
+
+
+def free_port() -> int:
+    with socket.socket() as s:
+        s.bind(('127.0.0.1', 0))
+        return s.getsockname()[1]
+
+
+def rss_kb(pid: int) -> int:
+    with open(f'/proc/{pid}/status') as f:
+        for line in f:
+            if line.startswith('VmRSS:'):
+                return int(line.split()[1])
+    return 0
+
+
+def wait_until_up(url: str, timeout: float = 10.0):
+    deadline = time.time() + timeout
+    while time.time() < deadline:
+        try:
+            urllib.request.urlopen(url, timeout=1)
+            return
+        except OSError:
+            time.sleep(0.1)
+    raise RuntimeError(f"server did not start: {url}")
+
+
+async def fire(app_url: str, concurrency: int, worker_pid: int, stub_url: str, latency: float):
+    connector = aiohttp.TCPConnector(limit=0)
+    async with aiohttp.ClientSession(connector=connector) as session:
+        async def one(i):
+            async with session.post(f"{app_url}/api/translate",
+                                    json={"text": f"hello {i}", "target_lang": "fr"}) as resp:
+                await resp.read()
+                return resp.status
+
+        baseline = rss_kb(worker_pid)
+        start = time.perf_counter()
+        tasks = [asyncio.create_task(one(i)) for i in range(concurrency)]
+        # Sample RSS while every request is parked on the upstream
+        await asyncio.sleep(latency * 0.75)
+        loaded = rss_kb(worker_pid)
+        statuses = await asyncio.gather(*tasks)
+        elapsed = time.perf_counter() - start
+
+    with urllib.request.urlopen(stub_url.rsplit('/models', 1)[0] + '/stats') as resp:
+        stub_stats = json.load(resp)
+    return {
+        "concurrency": concurrency,
+        "ok": statuses.count(200),
+        "elapsed_s": round(elapsed, 3),
+        "peak_upstream_in_flight": stub_stats["peak_in_flight"],
+        "worker_rss_baseline_kb": baseline,
+        "worker_rss_loaded_kb": loaded,
+        "kb_per_in_flight_request": round((loaded - baseline) / max(stub_stats["peak_in_flight"], 1), 2)
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--concurrency', type=int, default=500)
+    parser.add_argument('--latency', type=float, default=2.0)
+    args = parser.parse_args()
+
+    stub, stub_url = start_stub_server(latency=args.latency)
+    port = free_port()
+    env = dict(os.environ, HF_API_BASE_URL=stub_url, HF_API_KEY='stub', PORT=str(port),
+               HF_ASYNC_POOL_SIZE=str(args.concurrency), RATE_LIMIT_ENABLED='0')
+    root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    worker = subprocess.Popen([sys.executable, 'aio_app.py'], cwd=root, env=env,
+                              stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    try:
+        app_url = f"http://127.0.0.1:{port}"
+        wait_until_up(f"{app_url}/api/health")
+        result = asyncio.run(fire(app_url, args.concurrency, worker.pid, stub_url, args.latency))
+        print(json.dumps(result, indent=2))
+    finally:
+        worker.terminate()
+        worker.wait()
+        stub.shutdown()
+
+
+if __name__ == '__main__':
+    main()
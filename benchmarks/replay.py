@@ -0,0 +1,198 @@
+"""Replay captured production traffic against the app offline.
+
+Reads the JSONL written by request capture (``CAPTURE_SAMPLE_RATE``) and
+replays each record against the app at its original time offset, divided
+by ``--speed``. HF is replaced by the stub inference API. Redacted
+strings are rebuilt with their original length, and text that repeated in
+the capture repeats in the replay, so cache hit rates carry over. Reports
+latency per route next to the latency recorded at capture time (measured
+inside the app, so it excludes the network and the gunicorn queue).
+
+    CAPTURE_SAMPLE_RATE=0.1 gunicorn app:app ...      # then copy temp/capture/requests.jsonl*
+    python -m benchmarks.replay requests.jsonl.1 requests.jsonl --speed 2 --workers gthread:2x8
+    python -m benchmarks.replay requests.jsonl --speed 0 --concurrency 32 --latency 0.3
+
+``--speed 0`` sends every record as fast as ``--concurrency`` allows.
+``--app-url`` targets an already running app instead of starting one.
+"""
+import argparse
+import asyncio
+import json
+import os
+import random
+import re
+import shutil
+import tempfile
+import time
+
+import aiohttp
+
+from benchmarks.bench_endpoints import (ADMIN_SECRET, app_env, parse_worker_specs, percentile, prepare,
+                                        silent_wav, start_app, start_stub)
+from benchmarks.stub_server import add_stub_arguments
+from utils.capture import read_capture
+
+WORDS = ('selam', 'coffee', 'market', 'river', 'school', 'bread', 'music', 'city', 'garden', 'light',
+         'morning', 'family', 'travel', 'story', 'mountain', 'friend', 'work', 'book', 'rain', 'road')
+
+
+def rebuild(value, salt: str = ''):
+    """Inverse of utils.capture.redact, with made-up text of the same length"""
+    if isinstance(value, dict):
+        if '$s' in value:
+            # Seeded by the hash, so equal originals give equal text
+            rng = random.Random(f"{value.get('$h', '')}{salt}")
+            text = ''
+            while len(text) < value['$s']:
+                text += rng.choice(WORDS) + ' '
+            return text[:value['$s']]
+        if '$n' in value:
+            item = value.get('$i')
+            return [rebuild(item, f"{salt}.{index}" if index else salt) for index in range(value['$n'])]
+        return {key: rebuild(item, salt) for key, item in value.items()}
+    return value
+
+
+def build_request(record: dict, context: dict) -> tuple:
+    """(method, path, aiohttp kwargs) for a captured record"""
+    path = re.sub(r'<(?:\w+:)?(\w+)>', lambda m: str(context.get(m.group(1), 'replay')), record['route'])
+    kwargs = {"params": rebuild(record.get('query') or {}), "headers": {}}
+    content_type = record.get('content_type') or ''
+    size = record.get('request_bytes') or 0
+    if record.get('body') is not None:
+        kwargs["json"] = rebuild(record['body'])
+    elif content_type.startswith('audio/') or content_type == 'application/octet-stream':
+        kwargs["data"] = silent_wav(max(size - 44, 0) / 32000)
+        kwargs["headers"]["Content-Type"] = content_type
+    elif content_type == 'multipart/form-data':
+        form = aiohttp.FormData()
+        form.add_field('audio', silent_wav(max(size - 300, 0) / 32000), filename='replay.wav',
+                       content_type='audio/wav')
+        kwargs["data"] = form
+    elif content_type == 'application/x-ndjson':
+        # Only the size was captured; a rendered-resume line is ~250 bytes
+        lines = [json.dumps(rebuild({"name": {"$s": 12, "$h": str(i)}, "email": {"$s": 18, "$h": str(i)}}))
+                 for i in range(max(1, size // 250))]
+        kwargs["data"] = ('\n'.join(lines) + '\n').encode()
+        kwargs["headers"]["Content-Type"] = content_type
+    if record.get('auth'):
+        kwargs["headers"]["Authorization"] = f"Bearer {context['token']}"
+    if record['route'].startswith('/api/admin/'):
+        kwargs["headers"]["X-Admin-Secret"] = context['admin_secret']
+    return record.get('method', 'GET'), path, kwargs
+
+
+async def replay(app_url: str, records: list, speed: float, concurrency: int, admin_secret: str) -> dict:
+    connector = aiohttp.TCPConnector(limit=0)
+    timeout = aiohttp.ClientTimeout(total=180)
+    gate = asyncio.Semaphore(concurrency)
+    results = {}
+    lags = []
+
+    async with aiohttp.ClientSession(connector=connector, timeout=timeout) as session:
+        context = dict(await prepare(session, app_url), admin_secret=admin_secret)
+
+        async def send(record: dict, scheduled: float):
+            async with gate:
+                lags.append(max(0.0, time.perf_counter() - scheduled))
+                method, path, kwargs = build_request(record, context)
+                start = time.perf_counter()
+                try:
+                    async with session.request(method, app_url + path, **kwargs) as resp:
+                        async for _ in resp.content.iter_chunked(65536):
+                            pass
+                        status = str(resp.status)
+                except aiohttp.ClientError:
+                    status = 'error'
+                entry = results.setdefault(f"{method} {record['route']}",
+                                           {"latencies": [], "captured": [], "statuses": {}})
+                entry["latencies"].append(time.perf_counter() - start)
+                if record.get('duration_ms') is not None:
+                    entry["captured"].append(record['duration_ms'] / 1000)
+                entry["statuses"][status] = entry["statuses"].get(status, 0) + 1
+
+        origin = records[0].get('ts', 0)
+        start = time.perf_counter()
+        tasks = []
+        for record in records:
+            scheduled = start + ((record.get('ts', origin) - origin) / speed if speed > 0 else 0.0)
+            delay = scheduled - time.perf_counter()
+            if delay > 0:
+                await asyncio.sleep(delay)
+            tasks.append(asyncio.create_task(send(record, scheduled)))
+        await asyncio.gather(*tasks)
+        elapsed = time.perf_counter() - start
+
+    routes = {}
+    for name, entry in sorted(results.items()):
+        latencies, captured = sorted(entry["latencies"]), sorted(entry["captured"])
+        routes[name] = {
+            "requests": len(latencies),
+            "statuses": entry["statuses"],
+            "p50": round(percentile(latencies, 50), 4),
+            "p95": round(percentile(latencies, 95), 4),
+            "p99": round(percentile(latencies, 99), 4),
+            "captured_p50": round(percentile(captured, 50), 4) if captured else None,
+            "captured_p95": round(percentile(captured, 95), 4) if captured else None
+        }
+    lags.sort()
+    return {
+        "records": len(records),
+        "elapsed_s": round(elapsed, 3),
+        "rps": round(len(records) / elapsed, 1) if elapsed else None,
+        # How far behind schedule requests were sent; high values mean the
+        # client or --concurrency, not the app, set the pace
+        "lag_p99_s": round(percentile(lags, 99), 4) if lags else None,
+        "routes": routes
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('captures', nargs='+', help="capture files, rotations included")
+    parser.add_argument('--speed', type=float, default=1.0, help="time scale; 2 is twice as fast, 0 as fast as possible")
+    parser.add_argument('--concurrency', type=int, default=256, help="most requests in flight at once")
+    parser.add_argument('--limit', type=int, help="replay only the first N records")
+    parser.add_argument('--workers', default='gthread:2x8', help="one class:workers[xthreads] spec")
+    parser.add_argument('--app-url', help="replay against this running app instead of starting one")
+    parser.add_argument('--admin-secret', default=ADMIN_SECRET, help="with --app-url, for /api/admin records")
+    parser.add_argument('--output', help="write the JSON report here as well as to stdout")
+    add_stub_arguments(parser)
+    # Same stub behaviour on every replay of a capture
+    parser.set_defaults(seed=0)
+    args = parser.parse_args()
+
+    records = read_capture(args.captures)[:args.limit]
+    if not records:
+        raise SystemExit("no records in capture")
+
+    if args.app_url:
+        report = asyncio.run(replay(args.app_url, records, args.speed, args.concurrency, args.admin_secret))
+    else:
+        worker_class, workers, threads = parse_worker_specs(args.workers)[0]
+        state_dir = tempfile.mkdtemp(prefix='ethio-replay-')
+        stub, stub_url = start_stub(args)
+        server = None
+        try:
+            server, app_url = start_app(worker_class, workers, threads, app_env(stub_url, state_dir))
+            report = asyncio.run(replay(app_url, records, args.speed, args.concurrency, ADMIN_SECRET))
+        finally:
+            if server:
+                server.terminate()
+                server.wait()
+            stub.terminate()
+            stub.wait()
+            shutil.rmtree(state_dir, ignore_errors=True)
+        report["workers"] = {"worker_class": worker_class, "workers": workers, "threads": threads}
+
+    report["speed"] = args.speed
+    output = json.dumps(report, indent=2)
+    if args.output:
+        os.makedirs(os.path.dirname(args.output) or '.', exist_ok=True)
+        with open(args.output, 'w') as f:
+            f.write(output)
+    print(output)
+
+
+if __name__ == '__main__':
+    main()
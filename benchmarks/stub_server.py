@@ -0,0 +1,267 @@
+"""Local stand-in for the Hugging Face inference API.
+
+Answers ``POST /models/<model>`` with canned payloads shaped like the real
+API so benchmarks can run without network access or HF quota. Latency can
+follow a distribution, a share of calls can fail, and models can answer
+HF's "currently loading" 503 for a while after their first call.
+
+    python -m benchmarks.stub_server --port 8900
+    python -m benchmarks.stub_server --latency 0.3 --latency-dist lognormal --error-rate 0.02 --cold-start 5
+    HF_API_BASE_URL=http://127.0.0.1:8900/models HF_API_KEY=stub gunicorn app:app
+"""
+import argparse
+import json
+import math
+import random
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+
+LATENCY_DISTRIBUTIONS = ('fixed', 'uniform', 'exponential', 'lognormal')
+
+
+class StubConfig:
+    """How the stub behaves; every field has a CLI flag of the same name.
+
+    ``latency`` is the mean delay in seconds. ``uniform`` spreads it over
+    [0, 2 x latency], ``exponential`` has a long tail, and ``lognormal``
+    uses ``latency_sigma`` for its spread. ``cold_start`` seconds after a
+    model's first call it answers with a loading 503 carrying
+    ``estimated_time``, like HF does while it loads the weights.
+    """
+
+    def __init__(self, latency: float = 0.0, latency_dist: str = 'fixed', latency_sigma: float = 0.5,
+                 error_rate: float = 0.0, error_status: int = 500, cold_start: float = 0.0,
+                 image_bytes: int = 8192, audio_bytes: int = 4096, reply_words: int = 2,
+                 seed: int = None):
+        if latency_dist not in LATENCY_DISTRIBUTIONS:
+            raise ValueError(f"latency_dist must be one of {', '.join(LATENCY_DISTRIBUTIONS)}")
+        self.latency = latency
+        self.latency_dist = latency_dist
+        self.latency_sigma = latency_sigma
+        self.error_rate = error_rate
+        self.error_status = error_status
+        self.cold_start = cold_start
+        self.image_bytes = image_bytes
+        self.audio_bytes = audio_bytes
+        self.reply_words = reply_words
+        self.seed = seed
+        self._random = random.Random(seed)
+
+    def delay(self) -> float:
+        if self.latency <= 0:
+            return 0.0
+        if self.latency_dist == 'uniform':
+            return self._random.uniform(0, 2 * self.latency)
+        if self.latency_dist == 'exponential':
+            return self._random.expovariate(1 / self.latency)
+        if self.latency_dist == 'lognormal':
+            # Median chosen so the mean stays at ``latency``
+            return self._random.lognormvariate(math.log(self.latency) - self.latency_sigma ** 2 / 2,
+                                               self.latency_sigma)
+        return self.latency
+
+    def fails(self) -> bool:
+        return self.error_rate > 0 and self._random.random() < self.error_rate
+
+    def as_dict(self) -> dict:
+        return {name: value for name, value in vars(self).items() if not name.startswith('_')}
+
+
+def fake_payload(model: str, body: dict, config: StubConfig = None) -> tuple:
+    """Return (content_type, body_bytes) for a model request"""
+    config = config or StubConfig()
+    inputs = body.get('inputs', '')
+    if model.startswith('Helsinki-NLP/'):
+        texts = inputs if isinstance(inputs, list) else [inputs]
+        result = [{"translation_text": f"[{model.rsplit('-', 1)[-1]}] {t}"} for t in texts]
+        return 'application/json', json.dumps(result).encode()
+    if 'wav2vec2' in model:
+        return 'application/json', json.dumps({"text": "stub transcription"}).encode()
+    if 'tts' in model:
+        return 'audio/wav', b'RIFF' + b'\x00' * max(0, config.audio_bytes - 4)
+    if 'diffusion' in model or 'animagine' in model or 'vintage' in model:
+        return 'image/png', b'\x89PNG\r\n\x1a\n' + b'\x00' * max(0, config.image_bytes - 8)
+    reply = ' '.join(['stub', 'reply'] + ['word'] * max(0, config.reply_words - 2))
+    return 'application/json', json.dumps([{"generated_text": f"{inputs} {reply}"}]).encode()
+
+
+def stream_payload(payload: bytes, inputs: str) -> tuple:
+    """Re-encode a text-generation reply as text-generation-inference SSE tokens"""
+    result = json.loads(payload)
+    text = result[0].get('generated_text', '') if isinstance(result, list) and result else ''
+    # Like TGI, only the newly generated tokens are streamed
+    words = text[len(inputs):].split()
+    events = [
+        f"data: {json.dumps({'token': {'text': (' ' if i else '') + word, 'special': False}})}\n\n"
+        for i, word in enumerate(words)
+    ]
+    return 'text/event-stream', ''.join(events).encode()
+
+
+class StubStats:
+    """Request counters shared by every handler thread"""
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.requests = 0
+        self.in_flight = 0
+        self.peak_in_flight = 0
+        self.errors = 0
+        self.loading = 0
+        self.first_seen = {}
+
+    def enter(self):
+        with self.lock:
+            self.requests += 1
+            self.in_flight += 1
+            self.peak_in_flight = max(self.peak_in_flight, self.in_flight)
+
+    def leave(self):
+        with self.lock:
+            self.in_flight -= 1
+
+    def loading_for(self, model: str, cold_start: float) -> float:
+        """Seconds until a model finishes its simulated load; 0 once it is warm"""
+        with self.lock:
+            first = self.first_seen.setdefault(model, time.monotonic())
+        return max(0.0, first + cold_start - time.monotonic())
+
+    def count(self, field: str):
+        with self.lock:
+            setattr(self, field, getattr(self, field) + 1)
+
+    def snapshot(self) -> dict:
+        with self.lock:
+            return {"requests": self.requests, "in_flight": self.in_flight,
+                    "peak_in_flight": self.peak_in_flight, "errors": self.errors,
+                    "loading": self.loading}
+
+
+class StubHandler(BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'
+    disable_nagle_algorithm = True
+    config = StubConfig()
+    stats = None
+
+    def do_GET(self):
+        if self.path.startswith('/status/'):
+            # Like HF's status endpoint: a model is loaded once its cold start has passed
+            model = self.path[len('/status/'):]
+            loaded = not self.config.cold_start or (model in self.stats.first_seen and
+                                                    self.stats.loading_for(model, self.config.cold_start) == 0)
+            payload = json.dumps({"loaded": loaded, "state": "Loaded" if loaded else "Loadable"}).encode()
+        else:
+            payload = json.dumps(self.stats.snapshot()).encode()
+        self._send(200, 'application/json', payload)
+
+    def do_POST(self):
+        self.stats.enter()
+        try:
+            length = int(self.headers.get('Content-Length') or 0)
+            raw = self.rfile.read(length) if length else self._read_chunked()
+            try:
+                body = json.loads(raw or b'{}')
+            except ValueError:
+                body = None
+            if not isinstance(body, dict):
+                body = {}
+            model = self.path.split('/models/', 1)[-1]
+            config = self.config
+            if config.cold_start:
+                remaining = self.stats.loading_for(model, config.cold_start)
+                if remaining > 0:
+                    self.stats.count('loading')
+                    payload = {"error": f"Model {model} is currently loading", "estimated_time": remaining}
+                    self._send(503, 'application/json', json.dumps(payload).encode())
+                    return
+            delay = config.delay()
+            if delay:
+                time.sleep(delay)
+            if config.fails():
+                self.stats.count('errors')
+                payload = json.dumps({"error": "stub failure"}).encode()
+                self._send(config.error_status, 'application/json', payload)
+                return
+            content_type, payload = fake_payload(model, body, config)
+            if body.get('stream') and content_type == 'application/json':
+                content_type, payload = stream_payload(payload, body.get('inputs', ''))
+            self._send(200, content_type, payload)
+        finally:
+            self.stats.leave()
+
+    def _send(self, status: int, content_type: str, payload: bytes):
+        self.send_response(status)
+        self.send_header('Content-Type', content_type)
+        self.send_header('Content-Length', str(len(payload)))
+        self.end_headers()
+        self.wfile.write(payload)
+
+    def _read_chunked(self) -> bytes:
+        if self.headers.get('Transfer-Encoding', '').lower() != 'chunked':
+            return b''
+        data = bytearray()
+        while True:
+            size = int(self.rfile.readline().strip() or b'0', 16)
+            if size == 0:
+                self.rfile.readline()
+                return bytes(data)
+            data += self.rfile.read(size)
+            self.rfile.readline()
+
+    def log_message(self, format, *args):
+        pass
+
+
+class StubServer(ThreadingHTTPServer):
+    daemon_threads = True
+    # Load tests open hundreds of connections at once
+    request_queue_size = 1024
+
+
+def start_stub_server(port: int = 0, latency: float = 0.0, **options):
+    """Start the stub in a daemon thread and return (server, base_url)
+
+    ``options`` are the other ``StubConfig`` fields. ``GET /stats`` on
+    the stub reports request, in-flight, error and loading counters.
+    """
+    config = StubConfig(latency=latency, **options)
+    handler = type('ConfiguredStubHandler', (StubHandler,), {'config': config, 'stats': StubStats()})
+    server = StubServer(('127.0.0.1', port), handler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server, f"http://127.0.0.1:{server.server_address[1]}/models"
+
+
+def add_stub_arguments(parser: argparse.ArgumentParser):
+    """The StubConfig flags, shared with the benchmark harness"""
+    parser.add_argument('--latency', type=float, default=0.0, help="mean seconds added to every response")
+    parser.add_argument('--latency-dist', choices=LATENCY_DISTRIBUTIONS, default='fixed')
+    parser.add_argument('--latency-sigma', type=float, default=0.5, help="spread of the lognormal distribution")
+    parser.add_argument('--error-rate', type=float, default=0.0, help="share of calls that fail (0-1)")
+    parser.add_argument('--error-status', type=int, default=500)
+    parser.add_argument('--cold-start', type=float, default=0.0,
+                        help="seconds each model answers \"loading\" 503s after its first call")
+    parser.add_argument('--image-bytes', type=int, default=8192)
+    parser.add_argument('--audio-bytes', type=int, default=4096)
+    parser.add_argument('--reply-words', type=int, default=2, help="words in each text-generation reply")
+    parser.add_argument('--seed', type=int, default=None)
+
+
+def stub_options(args: argparse.Namespace) -> dict:
+    return {name: getattr(args, name) for name in (
+        'latency', 'latency_dist', 'latency_sigma', 'error_rate', 'error_status', 'cold_start',
+        'image_bytes', 'audio_bytes', 'reply_words', 'seed')}
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--port', type=int, default=8900)
+    add_stub_arguments(parser)
+    args = parser.parse_args()
+    server, url = start_stub_server(args.port, **stub_options(args))
+    print(f"stub inference API listening on {url}")
+    try:
+        threading.Event().wait()
+    except KeyboardInterrupt:
+        server.shutdown()
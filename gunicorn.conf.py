@@ -0,0 +1,14 @@
+"""gunicorn settings and server hooks; gunicorn loads this file from the working directory."""
+
+
+def on_starting(server):
+    # Snapshots from the previous run's workers must not be merged into this one's
+    from utils.metrics import registry
+    registry.clear()
+
+
+def post_worker_init(worker):
+    # Importing the app (benchmarks, replay, scripts) must not send upstream calls;
+    # every worker starts the warmer and the one holding its lock does the checks
+    from utils.hf_client import start_model_warmer
+    start_model_warmer()
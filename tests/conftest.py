@@ -0,0 +1,5 @@
+import os
+
+# Keep test runs off the shared on-disk state the app uses by default
+os.environ.setdefault('USER_STORE_PATH', '')
+os.environ.setdefault('METRICS_DIR', '')
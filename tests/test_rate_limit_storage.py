@@ -0,0 +1,118 @@
+import multiprocessing
+
+import pytest
+from limits import parse
+from limits.storage import storage_from_string
+from limits.strategies import FixedWindowRateLimiter
+
+from utils import rate_limit
+from utils.rate_limit import SharedMemoryStorage
+
+class FakeClock:
+    """Stands in for the time module inside utils.rate_limit"""
+
+    def __init__(self, now: float = 1000.0):
+        self.now = now
+
+    def time(self) -> float:
+        return self.now
+
+@pytest.fixture
+def clock(monkeypatch):
+    clock = FakeClock()
+    monkeypatch.setattr(rate_limit, 'time', clock)
+    return clock
+
+@pytest.fixture
+def path(tmp_path):
+    return str(tmp_path / 'counters')
+
+def storage(path: str, **options) -> SharedMemoryStorage:
+    return SharedMemoryStorage(f"sharedmem://{path}", **options)
+
+def test_counts_per_key(path, clock):
+    store = storage(path)
+    assert store.incr('a', 60) == 1
+    assert store.incr('a', 60) == 2
+    assert store.incr('a', 60, amount=3) == 5
+    assert store.incr('b', 60) == 1
+    assert store.get('a') == 5
+    assert store.get('b') == 1
+    assert store.get('missing') == 0
+
+def test_window_expires(path, clock):
+    store = storage(path)
+    store.incr('a', 10)
+    store.incr('a', 10)
+    assert store.get_expiry('a') == 1010.0
+
+    clock.now = 1009.9
+    assert store.get('a') == 2
+    clock.now = 1010.0
+    assert store.get('a') == 0
+    # The next hit starts a new window
+    assert store.incr('a', 10) == 1
+    assert store.get_expiry('a') == 1020.0
+
+def test_elastic_expiry_extends_window(path, clock):
+    store = storage(path)
+    store.incr('a', 10)
+    clock.now = 1005.0
+    store.incr('a', 10, elastic_expiry=True)
+    assert store.get_expiry('a') == 1015.0
+    assert store.get('a') == 2
+
+def test_clear_and_reset(path, clock):
+    store = storage(path)
+    store.incr('a', 60)
+    store.incr('b', 60)
+    store.clear('a')
+    assert store.get('a') == 0
+    assert store.get('b') == 1
+    store.reset()
+    assert store.get('b') == 0
+
+def test_colliding_keys_keep_separate_counts(path, clock):
+    # One home slot: every key lands in the same probe window
+    store = storage(path, slots=1)
+    keys = [f"key-{i}" for i in range(SharedMemoryStorage.PROBE)]
+    for count, key in enumerate(keys, 1):
+        for _ in range(count):
+            store.incr(key, 60)
+    assert [store.get(key) for key in keys] == list(range(1, len(keys) + 1))
+
+def test_expired_slots_are_reused(path, clock):
+    store = storage(path, slots=1)
+    for i in range(SharedMemoryStorage.PROBE):
+        store.incr(f"old-{i}", 10)
+    clock.now += 10
+    store.incr('new', 10)
+    assert store.get('new') == 1
+    assert all(store.get(f"old-{i}") == 0 for i in range(SharedMemoryStorage.PROBE))
+
+def test_instances_share_the_table(path, clock):
+    first, second = storage(path), storage(path)
+    first.incr('a', 60)
+    second.incr('a', 60)
+    assert first.get('a') == 2
+
+def _hammer(path: str, key: str, hits: int):
+    store = storage(path)
+    for _ in range(hits):
+        store.incr(key, 600)
+
+def test_processes_share_counters(path):
+    context = multiprocessing.get_context('fork')
+    workers = [context.Process(target=_hammer, args=(path, 'shared', 200)) for _ in range(4)]
+    for worker in workers:
+        worker.start()
+    for worker in workers:
+        worker.join(10)
+        assert worker.exitcode == 0
+    assert storage(path).get('shared') == 800
+
+def test_limits_strategy_over_uri(path):
+    limiter = FixedWindowRateLimiter(storage_from_string(f"sharedmem://{path}"))
+    item = parse('3 per minute')
+    assert [limiter.hit(item, 'chat', '10.0.0.1') for _ in range(4)] == [True, True, True, False]
+    assert limiter.hit(item, 'chat', '10.0.0.2')
@@ -0,0 +1,186 @@
+import time
+import threading
+
+import pytest
+
+from utils.circuit_breaker import ModelUnavailable
+from utils.deadline import deadline
+from utils.scheduler import FairScheduler, HEAVY, INTERACTIVE
+
+CLASSES = {
+    INTERACTIVE: {"limit": 1, "weight": 4},
+    HEAVY: {"limit": 1, "weight": 1}
+}
+
+def wait_for(condition, timeout: float = 5.0):
+    give_up = time.monotonic() + timeout
+    while not condition():
+        assert time.monotonic() < give_up, "timed out"
+        time.sleep(0.005)
+
+def queued(scheduler: FairScheduler, tool_class: str) -> int:
+    return scheduler.stats()["classes"][tool_class]["queued"]
+
+class Recorder:
+    """Queues calls one at a time and records the order they are admitted in"""
+
+    def __init__(self, scheduler: FairScheduler):
+        self.scheduler = scheduler
+        self.order = []
+        self.threads = []
+        self._lock = threading.Lock()
+
+    def queue(self, tool_class: str, client: str, label: str = None):
+        expected = queued(self.scheduler, tool_class) + 1
+
+        def run():
+            slot = self.scheduler.acquire(tool_class, 'model', client)
+            with self._lock:
+                self.order.append(label or tool_class)
+            slot.release()
+
+        thread = threading.Thread(target=run, daemon=True)
+        thread.start()
+        self.threads.append(thread)
+        # Start the next call only once this one is queued, so FIFO order is known
+        wait_for(lambda: queued(self.scheduler, tool_class) == expected)
+
+    def join(self):
+        for thread in self.threads:
+            thread.join(5)
+
+def test_free_capacity_is_taken_without_queueing():
+    scheduler = FairScheduler(limit=2, classes=CLASSES)
+    interactive = scheduler.acquire(INTERACTIVE, 'model', 'a')
+    heavy = scheduler.acquire(HEAVY, 'model', 'a')
+    assert scheduler.stats()["in_flight"] == 2
+    interactive.release()
+    heavy.release()
+    # A second release is a no-op
+    heavy.release()
+    assert scheduler.stats()["in_flight"] == 0
+
+def test_classes_share_contended_slots_by_weight():
+    scheduler = FairScheduler(limit=1, classes=CLASSES, max_wait=10)
+    held = scheduler.acquire(HEAVY, 'model', 'holder')
+    recorder = Recorder(scheduler)
+    for _ in range(10):
+        recorder.queue(INTERACTIVE, 'a')
+        recorder.queue(HEAVY, 'a')
+    held.release()
+    recorder.join()
+
+    assert len(recorder.order) == 20
+    # Weight 4:1, so the first ten admissions are eight interactive and two heavy
+    assert recorder.order[:10].count(INTERACTIVE) == 8
+    assert recorder.order[:10].count(HEAVY) == 2
+
+def test_one_clients_backlog_does_not_starve_another():
+    scheduler = FairScheduler(limit=1, classes=CLASSES, max_wait=10)
+    held = scheduler.acquire(INTERACTIVE, 'model', 'holder')
+    recorder = Recorder(scheduler)
+    for i in range(6):
+        recorder.queue(INTERACTIVE, 'busy', f"busy-{i}")
+    recorder.queue(INTERACTIVE, 'quiet', 'quiet-0')
+    recorder.queue(INTERACTIVE, 'quiet', 'quiet-1')
+    held.release()
+    recorder.join()
+
+    assert recorder.order[:4] == ['busy-0', 'quiet-0', 'busy-1', 'quiet-1']
+    # Each client's own calls keep their order
+    assert [label for label in recorder.order if label.startswith('busy')] == [f"busy-{i}" for i in range(6)]
+
+def test_idle_class_banks_no_credit():
+    scheduler = FairScheduler(limit=1, classes=CLASSES, max_wait=10)
+    # Many uncontended heavy calls advance its pass; interactive stays idle
+    for _ in range(20):
+        scheduler.acquire(HEAVY, 'model', 'a').release()
+    held = scheduler.acquire(INTERACTIVE, 'model', 'holder')
+    recorder = Recorder(scheduler)
+    for _ in range(5):
+        recorder.queue(HEAVY, 'a')
+        recorder.queue(INTERACTIVE, 'a')
+    held.release()
+    recorder.join()
+
+    # Heavy still gets its share as soon as both classes are waiting
+    assert HEAVY in recorder.order[:5]
+
+def test_wait_times_out():
+    scheduler = FairScheduler(limit=1, classes=CLASSES, max_wait=0.1)
+    held = scheduler.acquire(INTERACTIVE, 'model', 'a')
+    started = time.monotonic()
+    with pytest.raises(ModelUnavailable, match='queue wait too long'):
+        scheduler.acquire(INTERACTIVE, 'model', 'b')
+    assert 0.1 <= time.monotonic() - started < 1.0
+
+    stats = scheduler.stats()["classes"][INTERACTIVE]
+    assert stats["queued"] == 0
+    assert stats["waiting_clients"] == 0
+    assert stats["rejected"] == 1
+    held.release()
+    # The abandoned call took no slot
+    assert scheduler.stats()["in_flight"] == 0
+
+def test_wait_ends_at_the_callers_deadline():
+    scheduler = FairScheduler(limit=1, classes=CLASSES, max_wait=30)
+    held = scheduler.acquire(INTERACTIVE, 'model', 'a')
+    started = time.monotonic()
+    with deadline(0.1), pytest.raises(ModelUnavailable):
+        scheduler.acquire(INTERACTIVE, 'model', 'b')
+    assert time.monotonic() - started < 1.0
+    held.release()
+
+def test_full_queue_rejects_immediately():
+    scheduler = FairScheduler(limit=1, classes=CLASSES, max_wait=10, max_queue=1)
+    held = scheduler.acquire(INTERACTIVE, 'model', 'a')
+    recorder = Recorder(scheduler)
+    recorder.queue(INTERACTIVE, 'b')
+    started = time.monotonic()
+    with pytest.raises(ModelUnavailable, match='too many queued'):
+        scheduler.acquire(INTERACTIVE, 'model', 'c')
+    assert time.monotonic() - started < 0.5
+    held.release()
+    recorder.join()
+    assert recorder.order == [INTERACTIVE]
+
+class FakeModelSlots:
+    """Model bulkhead stand-in whose permits can be freed from outside the scheduler"""
+
+    class Permit:
+        def __init__(self, slots):
+            self.slots = slots
+
+        def release(self, failed: bool = False):
+            with self.slots.lock:
+                self.slots.free += 1
+
+    def __init__(self, free: int):
+        self.free = free
+        self.lock = threading.Lock()
+
+    def try_acquire(self, model: str):
+        with self.lock:
+            if self.free <= 0:
+                return None
+            self.free -= 1
+            return self.Permit(self)
+
+def test_waits_for_model_permits_freed_elsewhere():
+    slots = FakeModelSlots(free=0)
+    scheduler = FairScheduler(limit=4, classes=CLASSES, model_slots=slots, max_wait=5, poll_interval=0.01)
+    admitted = []
+    thread = threading.Thread(target=lambda: admitted.append(scheduler.acquire(HEAVY, 'model', 'a')))
+    thread.start()
+    wait_for(lambda: queued(scheduler, HEAVY) == 1)
+    # Another worker releases its permit; no local release wakes the waiter
+    with slots.lock:
+        slots.free = 1
+    thread.join(5)
+
+    assert len(admitted) == 1
+    slot = admitted[0]
+    assert isinstance(slot.permit, FakeModelSlots.Permit)
+    slot.permit.release()
+    slot.release()
+    assert slots.free == 1
@@ -0,0 +1,203 @@
+import os
+import hmac
+import json
+import time
+import fcntl
+import random
+import hashlib
+import logging
+import threading
+from collections import deque
+from typing import Any, Dict, List, Optional
+
+from flask import current_app, g, has_request_context, request
+
+logger = logging.getLogger(__name__)
+
+# Share of requests recorded for offline replay (0-1); 0 turns capture off
+CAPTURE_SAMPLE_RATE = float(os.environ.get('CAPTURE_SAMPLE_RATE', '0'))
+# Every worker appends here; rotated to .1, .2, ... past CAPTURE_MAX_BYTES
+CAPTURE_PATH = os.environ.get('CAPTURE_PATH', os.path.join('temp', 'capture', 'requests.jsonl'))
+CAPTURE_MAX_BYTES = int(os.environ.get('CAPTURE_MAX_BYTES', str(64 * 1024 * 1024)))
+CAPTURE_BACKUPS = int(os.environ.get('CAPTURE_BACKUPS', '5'))
+# Records waiting for the writer thread; more than this and new ones are dropped
+CAPTURE_BUFFER = int(os.environ.get('CAPTURE_BUFFER', '10000'))
+CAPTURE_FLUSH_INTERVAL = float(os.environ.get('CAPTURE_FLUSH_INTERVAL', '1'))
+# Enum-like fields whose values are kept; every other string is reduced to
+# its length and a keyed hash, so replay sees the same sizes and repeats
+CAPTURE_KEEP_FIELDS = frozenset(filter(None, os.environ.get(
+    'CAPTURE_KEEP_FIELDS', 'type,tone,length,mode,preset,target_lang,source_lang,async,stream').split(',')))
+
+def redact(value: Any, key: bytes, field: Optional[str] = None) -> Any:
+    """The shape of a JSON value with user text removed.
+
+    Strings become ``{"$s": length, "$h": hash}``, except short values of
+    CAPTURE_KEEP_FIELDS. Lists become ``{"$n": length, "$i": first item}``.
+    Numbers, booleans and null are kept.
+    """
+    if isinstance(value, dict):
+        return {k: redact(v, key, k) for k, v in value.items()}
+    if isinstance(value, list):
+        return {"$n": len(value), "$i": redact(value[0], key) if value else None}
+    if isinstance(value, str):
+        if field in CAPTURE_KEEP_FIELDS and len(value) <= 40:
+            return value
+        digest = hmac.new(key, value.encode('utf-8', 'replace'), hashlib.sha256).hexdigest()[:8]
+        return {"$s": len(value), "$h": digest}
+    return value
+
+class RequestCapture:
+    """Sampled, redacted request records appended to a rotating JSONL log.
+
+    Each record holds the route, query and body shape, request and
+    response sizes, status, duration and the upstream models called
+    from the request. Client addresses are only kept as a keyed hash, and
+    headers are never kept. Requests hand records to an in-memory buffer;
+    one thread per worker writes them out in batches. Writers take an
+    ``flock`` so workers can share the file and its rotation.
+    """
+
+    def __init__(self, path: str = CAPTURE_PATH, sample_rate: float = CAPTURE_SAMPLE_RATE,
+                 max_bytes: int = CAPTURE_MAX_BYTES, backups: int = CAPTURE_BACKUPS,
+                 buffer_size: int = CAPTURE_BUFFER, flush_interval: float = CAPTURE_FLUSH_INTERVAL):
+        self.path = path
+        self.sample_rate = sample_rate
+        self.max_bytes = max_bytes
+        self.backups = backups
+        self.flush_interval = flush_interval
+        self.captured = 0
+        self.dropped = 0
+        self._buffer = deque(maxlen=buffer_size)
+        self._lock = threading.Lock()
+        self._writer_pid = None
+
+    @property
+    def enabled(self) -> bool:
+        return self.sample_rate > 0 and bool(self.path)
+
+    def start(self):
+        """Decide whether this request is sampled (before_request)"""
+        if self.enabled and random.random() < self.sample_rate:
+            g.capture = {"ts": time.time(), "start": time.perf_counter(), "models": []}
+
+    def note_model(self, model: str):
+        """Record an upstream call made while handling a sampled request"""
+        if has_request_context():
+            capture = g.get('capture')
+            if capture is not None and model not in capture["models"]:
+                capture["models"].append(model)
+
+    def finish(self, response):
+        """Build the record (after_request); streamed responses are timed until they close"""
+        capture = g.get('capture')
+        if capture is None:
+            return response
+        record = self._record(capture, response)
+        if response.is_streamed:
+            response.call_on_close(lambda: self._add(record, capture))
+        else:
+            self._add(record, capture)
+        return response
+
+    def _record(self, capture: dict, response) -> dict:
+        key = current_app.config['SECRET_KEY'].encode()
+        body = None
+        if request.is_json and (request.content_length or 0) <= 1024 * 1024:
+            body = redact(request.get_json(silent=True), key)
+        return {
+            "ts": round(capture["ts"], 3),
+            "method": request.method,
+            "route": request.url_rule.rule if request.url_rule else 'unmatched',
+            "query": redact(request.args.to_dict(), key),
+            "content_type": request.mimetype or None,
+            "request_bytes": request.content_length,
+            "body": body,
+            "auth": 'Authorization' in request.headers,
+            "client": hmac.new(key, (request.remote_addr or '').encode(), hashlib.sha256).hexdigest()[:12],
+            "status": response.status_code,
+            "response_bytes": response.content_length,
+            "stream": response.is_streamed
+        }
+
+    def _add(self, record: dict, capture: dict):
+        record["duration_ms"] = round((time.perf_counter() - capture["start"]) * 1000, 2)
+        # Read at the end, so calls made while a stream was generated count
+        record["models"] = list(capture["models"])
+        with self._lock:
+            if len(self._buffer) == self._buffer.maxlen:
+                self.dropped += 1
+                return
+            self._buffer.append(record)
+            self.captured += 1
+        self._ensure_writer()
+
+    def _ensure_writer(self):
+        """Start one writer thread per process, after any fork"""
+        if self._writer_pid == os.getpid():
+            return
+        with self._lock:
+            if self._writer_pid == os.getpid():
+                return
+            self._writer_pid = os.getpid()
+        threading.Thread(target=self._write_loop, name='capture-writer', daemon=True).start()
+
+    def _write_loop(self):
+        while True:
+            time.sleep(self.flush_interval)
+            try:
+                self.flush()
+            except Exception as e:
+                logger.warning(f"Request capture flush failed: {e}")
+
+    def flush(self):
+        with self._lock:
+            records = list(self._buffer)
+            self._buffer.clear()
+        if not records:
+            return
+        data = ''.join(json.dumps(r, separators=(',', ':')) + '\n' for r in records).encode()
+        os.makedirs(os.path.dirname(self.path) or '.', exist_ok=True)
+        with open(f"{self.path}.lock", 'a') as lock_file:
+            fcntl.flock(lock_file, fcntl.LOCK_EX)
+            try:
+                self._rotate(len(data))
+                with open(self.path, 'ab') as f:
+                    f.write(data)
+            finally:
+                fcntl.flock(lock_file, fcntl.LOCK_UN)
+
+    def _rotate(self, incoming: int):
+        try:
+            size = os.path.getsize(self.path)
+        except OSError:
+            return
+        if size == 0 or size + incoming <= self.max_bytes:
+            return
+        if self.backups <= 0:
+            os.remove(self.path)
+            return
+        for index in range(self.backups - 1, 0, -1):
+            if os.path.exists(f"{self.path}.{index}"):
+                os.replace(f"{self.path}.{index}", f"{self.path}.{index + 1}")
+        os.replace(self.path, f"{self.path}.1")
+
+    def stats(self) -> dict:
+        with self._lock:
+            buffered = len(self._buffer)
+        return {"enabled": self.enabled, "sample_rate": self.sample_rate, "path": self.path,
+                "captured": self.captured, "dropped": self.dropped, "buffered": buffered}
+
+def read_capture(paths: List[str]) -> List[Dict[str, Any]]:
+    """Records from one or more capture files (oldest rotation first), in time order"""
+    records = []
+    for path in paths:
+        with open(path) as f:
+            for line in f:
+                try:
+                    records.append(json.loads(line))
+                except ValueError:
+                    continue
+    records.sort(key=lambda r: r.get("ts", 0))
+    return records
+
+request_capture = RequestCapture()
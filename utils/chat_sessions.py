@@ -0,0 +1,141 @@
+import os
+import hmac
+import json
+import hashlib
+import secrets
+import threading
+from typing import Iterator, List, Optional, Tuple
+
+from utils.cache import LRUCache, SQLiteCache, TieredCache
+
+# Per-session ring buffer of turns, trimmed to a character budget
+CHAT_HISTORY_TURNS = int(os.environ.get('CHAT_HISTORY_TURNS', '10'))
+# DialoGPT's max_length (500 tokens) covers prompt and reply; ~4 chars per token
+CHAT_CONTEXT_CHARS = int(os.environ.get('CHAT_CONTEXT_CHARS', '1200'))
+# Idle sessions are evicted least-recently-used first once either cap is hit
+CHAT_SESSIONS_MAX = int(os.environ.get('CHAT_SESSIONS_MAX', '10000'))
+CHAT_SESSIONS_MAX_BYTES = int(os.environ.get('CHAT_SESSIONS_MAX_BYTES', str(32 * 1024 * 1024)))
+CHAT_SESSION_TTL = float(os.environ.get('CHAT_SESSION_TTL', '3600'))
+# Set to keep sessions in SQLite, shared by workers and kept across restarts
+CHAT_SESSION_PATH = os.environ.get('CHAT_SESSION_PATH')
+# Signs the session ids issued to anonymous clients
+CHAT_SESSION_SECRET = (os.environ.get('CHAT_SESSION_SECRET')
+                       or os.environ.get('SECRET_KEY', 'dev-secret-key-change-in-production'))
+
+Turn = Tuple[str, str]  # (user message, bot reply)
+# "User: ...\nBot: ...\n" framing added around each turn in the prompt
+TURN_OVERHEAD = len("User: \nBot: \n")
+
+class ChatSessionStore:
+    """Recent chat turns per session, bounded per session and in total.
+
+    A session is a JSON list of (message, reply) pairs holding at most
+    ``max_turns`` pairs and ``max_chars`` characters. Older pairs are
+    dropped as new ones arrive. Sessions live in an LRU tier capped by
+    count and bytes or, when the cache has a SQLite tier, only in SQLite:
+    another worker may have added turns since this one last cached the
+    session, so reads skip the memory tier and appends read, extend and
+    write the session in one SQLite transaction.
+    """
+
+    def __init__(self, cache: TieredCache, max_turns: int = CHAT_HISTORY_TURNS,
+                 max_chars: int = CHAT_CONTEXT_CHARS):
+        self.cache = cache
+        self.shared = cache.disk
+        self.max_turns = max_turns
+        self.max_chars = max_chars
+        self._lock = threading.Lock()
+
+    def turns(self, session_key: str) -> List[Turn]:
+        return self._parse(self.shared.get(session_key) if self.shared else self.cache.get(session_key))
+
+    @staticmethod
+    def _parse(raw: Optional[str]) -> List[Turn]:
+        if not raw:
+            return []
+        try:
+            return [tuple(turn) for turn in json.loads(raw)]
+        except (TypeError, ValueError):
+            return []
+
+    def history(self, session_key: str, reserve: int = 0) -> List[Turn]:
+        """The newest turns that fit in max_chars minus reserve (the new message)"""
+        budget = self.max_chars - reserve - TURN_OVERHEAD
+        selected = []
+        for message, reply in reversed(self.turns(session_key)):
+            budget -= len(message) + len(reply) + TURN_OVERHEAD
+            if budget < 0:
+                break
+            selected.append((message, reply))
+        selected.reverse()
+        return selected
+
+    def append(self, session_key: str, message: str, reply: str):
+        if self.shared is not None:
+            self.shared.update(session_key, lambda raw: self._appended(raw, message, reply))
+            return
+        with self._lock:
+            self.cache.set(session_key, self._appended(self.cache.get(session_key), message, reply))
+
+    def _appended(self, raw: Optional[str], message: str, reply: str) -> str:
+        """The stored session with one more turn, trimmed to the caps"""
+        turns = self._parse(raw)
+        turns.append((message, reply))
+        turns = turns[-self.max_turns:]
+        total = sum(len(m) + len(r) + TURN_OVERHEAD for m, r in turns)
+        while len(turns) > 1 and total > self.max_chars:
+            dropped = turns.pop(0)
+            total -= len(dropped[0]) + len(dropped[1]) + TURN_OVERHEAD
+        return json.dumps(turns, separators=(',', ':'))
+
+    def record_stream(self, session_key: str, message: str, chunks: Iterator[str]) -> Iterator[str]:
+        """Pass chunks through and store the full reply once the stream completes"""
+        parts = []
+        try:
+            for chunk in chunks:
+                parts.append(chunk)
+                yield chunk
+        finally:
+            close = getattr(chunks, 'close', None)
+            if close:
+                close()
+        if parts:
+            self.append(session_key, message, ''.join(parts))
+
+    def stats(self) -> dict:
+        return dict(self.cache.stats(), max_turns=self.max_turns, max_chars=self.max_chars)
+
+def _sign(token: str) -> str:
+    return hmac.new(CHAT_SESSION_SECRET.encode('utf-8'), token.encode('utf-8'), hashlib.sha256).hexdigest()[:16]
+
+def issue_session_id() -> str:
+    """A random, signed session id for an anonymous client"""
+    token = secrets.token_urlsafe(18)
+    return f"{token}.{_sign(token)}"
+
+def issued_session_id(session_id: str) -> bool:
+    token, _, signature = session_id.rpartition('.')
+    return bool(token) and hmac.compare_digest(signature, _sign(token))
+
+def session_key(user_id: Optional[str], session_id: Optional[str]) -> Tuple[Optional[str], Optional[str]]:
+    """(store key, session id to send back) for a chat request.
+
+    A signed-in user's sessions are scoped to the user, so any id they pick
+    is private to them. An anonymous client shares its address with
+    everyone behind the same NAT or router, so it only gets memory under a
+    server-issued id: anything else is replaced by a fresh one. The shared
+    "default" id has no memory.
+    """
+    if not session_id or session_id == 'default':
+        return None, session_id or 'default'
+    session_id = str(session_id)
+    if user_id:
+        return f"user:{user_id}:{session_id}", session_id
+    if not issued_session_id(session_id):
+        session_id = issue_session_id()
+    return f"anon:{session_id}", session_id
+
+chat_sessions = ChatSessionStore(TieredCache(
+    LRUCache(CHAT_SESSIONS_MAX, CHAT_SESSIONS_MAX_BYTES, CHAT_SESSION_TTL),
+    SQLiteCache(CHAT_SESSION_PATH, CHAT_SESSION_TTL) if CHAT_SESSION_PATH else None
+))
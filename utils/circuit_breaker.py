@@ -0,0 +1,243 @@
+import os
+import math
+import time
+import hashlib
+import threading
+from collections import deque
+from typing import Dict, Optional
+
+from utils.metrics import registry
+from utils.locks import HostSemaphore, LocalSemaphore, private_dir
+
+UPSTREAM_REJECTIONS = registry.counter('ethio_upstream_rejections_total',
+                                       'Upstream calls refused before being sent', ['model', 'reason'])
+BREAKER_OPEN = registry.gauge('ethio_upstream_breaker_open', 'Workers whose breaker for a model is open', ['model'])
+
+class ModelUnavailable(Exception):
+    """Raised instead of calling a model whose breaker is open or bulkhead is full"""
+
+    def __init__(self, model: str, retry_after: float, reason: str):
+        self.model = model
+        self.retry_after = max(1, math.ceil(retry_after))
+        self.reason = reason
+        super().__init__(f"Model {model} is temporarily unavailable ({reason}). "
+                         f"Please retry in {self.retry_after} seconds.")
+
+    def __reduce__(self):
+        return ModelUnavailable, (self.model, self.retry_after, self.reason)
+
+class CircuitBreaker:
+    """Closed/open/half-open breaker over a rolling window of call outcomes.
+
+    The breaker opens when, over the last ``window`` seconds and at least
+    ``min_calls`` calls, the share of failed calls reaches ``failure_rate``
+    or the share of calls slower than ``slow_call_seconds`` reaches
+    ``slow_rate``. After ``open_seconds`` it lets ``half_open_calls`` probes
+    through; they all have to succeed to close it again.
+    """
+
+    CLOSED = 'closed'
+    OPEN = 'open'
+    HALF_OPEN = 'half_open'
+
+    def __init__(self, window: float = 60, min_calls: int = 10, failure_rate: float = 0.5,
+                 slow_call_seconds: float = 30, slow_rate: float = 0.8,
+                 open_seconds: float = 30, half_open_calls: int = 2):
+        self.window = window
+        self.min_calls = min_calls
+        self.failure_rate = failure_rate
+        self.slow_call_seconds = slow_call_seconds
+        self.slow_rate = slow_rate
+        self.open_seconds = open_seconds
+        self.half_open_calls = half_open_calls
+        self.state = self.CLOSED
+        self.opened_at = 0.0
+        self.opens = 0
+        self._outcomes = deque()  # (finished_at, failed, slow)
+        self._failures = 0
+        self._slow = 0
+        self._probes = 0
+        self._probe_successes = 0
+        self._lock = threading.Lock()
+
+    def retry_after(self) -> float:
+        return max(0.0, self.opened_at + self.open_seconds - time.monotonic())
+
+    def allow(self) -> bool:
+        """Whether a call may go upstream now; a True in half-open takes a probe slot"""
+        with self._lock:
+            if self.state == self.OPEN:
+                if self.retry_after() > 0:
+                    return False
+                self.state = self.HALF_OPEN
+                self._probes = 0
+                self._probe_successes = 0
+            if self.state == self.HALF_OPEN:
+                if self._probes >= self.half_open_calls:
+                    return False
+                self._probes += 1
+            return True
+
+    def record(self, failed: bool, latency: float):
+        with self._lock:
+            slow = latency >= self.slow_call_seconds
+            if self.state == self.HALF_OPEN:
+                if failed or slow:
+                    self._open()
+                else:
+                    self._probe_successes += 1
+                    if self._probe_successes >= self.half_open_calls:
+                        self.state = self.CLOSED
+                        self._reset_window()
+                return
+            if self.state == self.OPEN:
+                # A call let through before the breaker opened
+                return
+
+            now = time.monotonic()
+            self._outcomes.append((now, failed, slow))
+            self._failures += failed
+            self._slow += slow
+            while self._outcomes and self._outcomes[0][0] < now - self.window:
+                _, old_failed, old_slow = self._outcomes.popleft()
+                self._failures -= old_failed
+                self._slow -= old_slow
+            calls = len(self._outcomes)
+            if calls >= self.min_calls and (self._failures / calls >= self.failure_rate or
+                                            self._slow / calls >= self.slow_rate):
+                self._open()
+
+    def _open(self):
+        self.state = self.OPEN
+        self.opened_at = time.monotonic()
+        self.opens += 1
+        self._reset_window()
+
+    def _reset_window(self):
+        self._outcomes.clear()
+        self._failures = 0
+        self._slow = 0
+
+    def stats(self) -> dict:
+        with self._lock:
+            calls = len(self._outcomes)
+            return {
+                "state": self.state,
+                "calls": calls,
+                "failure_rate": round(self._failures / calls, 3) if calls else 0.0,
+                "slow_rate": round(self._slow / calls, 3) if calls else 0.0,
+                "opens": self.opens,
+                "retry_after": round(self.retry_after(), 1) if self.state == self.OPEN else 0
+            }
+
+class _Permit:
+    """One admitted call; ``release`` must be called exactly once"""
+
+    def __init__(self, guard: '_ModelGuard', slot: int):
+        self.guard = guard
+        self.slot = slot
+        self.start = time.monotonic()
+
+    def release(self, failed: bool):
+        guard = self.guard
+        guard.breaker.record(failed, time.monotonic() - self.start)
+        guard.slots.release(self.slot)
+        with guard.lock:
+            guard.in_flight -= 1
+        guard.sync_gauge()
+
+class _ModelGuard:
+    def __init__(self, model: str, limit: int, breaker: CircuitBreaker, slots_dir: Optional[str] = None):
+        self.model = model
+        self.limit = limit
+        self.breaker = breaker
+        if slots_dir:
+            name = hashlib.sha256(model.encode('utf-8')).hexdigest()[:32]
+            self.slots = HostSemaphore(os.path.join(slots_dir, f"{name}.slots"), limit)
+        else:
+            self.slots = LocalSemaphore(limit)
+        self.lock = threading.Lock()
+        self.in_flight = 0
+        self.rejected = 0
+        self.gauge_open = False
+
+    def sync_gauge(self):
+        is_open = self.breaker.state == CircuitBreaker.OPEN
+        if is_open != self.gauge_open:
+            self.gauge_open = is_open
+            BREAKER_OPEN.inc(1 if is_open else -1, model=self.model)
+
+class ModelGuards:
+    """Per-model bulkheads (concurrency caps) and circuit breakers.
+
+    With ``slots_dir`` the bulkheads are shared by every worker on the
+    host: at most ``limit`` calls to a model are in flight in total, held
+    as record locks on a per-model file in that directory. Without it they
+    are per worker. Breakers are per worker and learn from their own calls;
+    the breaker-open gauge aggregates across workers in /metrics.
+    """
+
+    def __init__(self, default_limit: int = 8, bulkhead_retry_after: float = 5,
+                 overrides: Optional[Dict[str, dict]] = None, slots_dir: Optional[str] = None,
+                 **breaker_options):
+        self.default_limit = default_limit
+        self.bulkhead_retry_after = bulkhead_retry_after
+        self.overrides = overrides or {}
+        self.slots_dir = slots_dir if slots_dir and private_dir(slots_dir) else None
+        self.breaker_options = breaker_options
+        self._guards: Dict[str, _ModelGuard] = {}
+        self._lock = threading.Lock()
+
+    def _guard(self, model: str) -> _ModelGuard:
+        guard = self._guards.get(model)
+        if guard is None:
+            with self._lock:
+                guard = self._guards.get(model)
+                if guard is None:
+                    options = dict(self.breaker_options, **self.overrides.get(model, {}))
+                    limit = options.pop('limit', self.default_limit)
+                    guard = self._guards[model] = _ModelGuard(model, limit, CircuitBreaker(**options),
+                                                              self.slots_dir)
+        return guard
+
+    def _reject(self, guard: _ModelGuard, retry_after: float, reason: str):
+        with guard.lock:
+            guard.rejected += 1
+        UPSTREAM_REJECTIONS.inc(model=guard.model, reason=reason.replace(' ', '_'))
+        raise ModelUnavailable(guard.model, retry_after, reason)
+
+    def check(self, model: str):
+        """Fail fast if a call to model would be refused, without taking a slot"""
+        guard = self._guard(model)
+        if guard.breaker.state == CircuitBreaker.OPEN and guard.breaker.retry_after() > 0:
+            self._reject(guard, guard.breaker.retry_after(), 'circuit open')
+
+    def try_acquire(self, model: str) -> Optional[_Permit]:
+        """A permit, or None while the bulkhead is full; raises ModelUnavailable if the breaker refuses"""
+        guard = self._guard(model)
+        slot = guard.slots.acquire()
+        if slot is None:
+            return None
+        if not guard.breaker.allow():
+            guard.slots.release(slot)
+            guard.sync_gauge()
+            self._reject(guard, guard.breaker.retry_after() or self.bulkhead_retry_after, 'circuit open')
+        with guard.lock:
+            guard.in_flight += 1
+        return _Permit(guard, slot)
+
+    def acquire(self, model: str) -> _Permit:
+        """Admit one call to model or raise ModelUnavailable"""
+        permit = self.try_acquire(model)
+        if permit is None:
+            self._reject(self._guard(model), self.bulkhead_retry_after, 'too many concurrent requests')
+        return permit
+
+    def stats(self) -> dict:
+        with self._lock:
+            guards = list(self._guards.values())
+        return {
+            guard.model: dict(guard.breaker.stats(), in_flight=guard.in_flight, host_in_flight=guard.slots.in_use(),
+                              limit=guard.limit, rejected=guard.rejected)
+            for guard in guards
+        }
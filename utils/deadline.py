@@ -0,0 +1,37 @@
+import os
+import time
+import threading
+from contextlib import contextmanager
+from typing import Optional
+
+# Everything an HTTP request does upstream (scheduler queueing, model-loading
+# waits, retries and reads, across all of its calls) must finish within this
+# many seconds; keep below gunicorn's --timeout
+REQUEST_DEADLINE = float(os.environ.get('REQUEST_DEADLINE', '115'))
+# One upstream call, including outside a request (job workers, warm-up)
+HF_CALL_DEADLINE = float(os.environ.get('HF_CALL_DEADLINE', '110'))
+
+_local = threading.local()
+
+def current_deadline() -> Optional[float]:
+    """time.monotonic() value the calling thread's upstream work must finish by, if any"""
+    return getattr(_local, 'at', None)
+
+def remaining(default: Optional[float] = None) -> Optional[float]:
+    """Seconds left before the current deadline, or default when there is none"""
+    at = current_deadline()
+    return default if at is None else at - time.monotonic()
+
+@contextmanager
+def deadline(seconds: Optional[float] = None, at: Optional[float] = None):
+    """Bound upstream work in this block; an earlier enclosing deadline still wins"""
+    previous = current_deadline()
+    if at is None and seconds is not None:
+        at = time.monotonic() + seconds
+    if at is None or (previous is not None and previous < at):
+        at = previous
+    _local.at = at
+    try:
+        yield at
+    finally:
+        _local.at = previous
@@ -0,0 +1,200 @@
+import os
+import re
+import json
+import time
+import fcntl
+import hashlib
+import logging
+import threading
+import uuid
+from typing import Optional
+
+from utils.timing import timed
+
+logger = logging.getLogger(__name__)
+
+# Generated file storage settings
+TEMP_DIR = os.environ.get('TEMP_DIR', 'temp')
+TEMP_FILE_TTL = float(os.environ.get('TEMP_FILE_TTL', str(24 * 3600)))
+TEMP_MAX_BYTES = int(os.environ.get('TEMP_MAX_BYTES', str(2 * 1024 * 1024 * 1024)))
+TEMP_SWEEP_INTERVAL = float(os.environ.get('TEMP_SWEEP_INTERVAL', '300'))
+
+# Names like "<sha256>.png" are derived from the bytes and never change
+CONTENT_ADDRESSED_NAME = re.compile(r'^[0-9a-f]{64}\.[a-z0-9]+$')
+
+def content_hash(filename: str) -> Optional[str]:
+    """SHA-256 embedded in a content-addressed filename, if any"""
+    if CONTENT_ADDRESSED_NAME.match(filename):
+        return filename.split('.', 1)[0]
+    return None
+
+class FileStore:
+    """Generated files sharded by hash prefix, with TTL expiry and a size cap.
+
+    Public names stay flat (``<name>.png``); on disk a file lives under
+    ``<root>/ab/cd/<name>`` where ``abcd`` prefixes the SHA-1 of its name.
+    Writes go to a temp file that is renamed into place. Serving a file
+    bumps its atime, which the sweeper uses to evict the least recently
+    served files once the store exceeds ``max_bytes``. Content-addressed
+    files are left alone: they are served as immutable and the image
+    cache expires them itself, together with their index rows.
+    """
+
+    def __init__(self, root: str = TEMP_DIR, ttl: float = TEMP_FILE_TTL,
+                 max_bytes: int = TEMP_MAX_BYTES, sweep_interval: float = TEMP_SWEEP_INTERVAL):
+        self.root = root
+        self.ttl = ttl
+        self.max_bytes = max_bytes
+        self.sweep_interval = sweep_interval
+        self.stats_path = os.path.join(root, '.sweep.json')
+        self._sweeper_pid = None
+        self._lock = threading.Lock()
+
+    def shard_dir(self, filename: str) -> str:
+        digest = hashlib.sha1(filename.encode('utf-8')).hexdigest()
+        return os.path.join(self.root, digest[:2], digest[2:4])
+
+    @staticmethod
+    def valid_name(filename: str) -> bool:
+        return bool(filename) and '..' not in filename and '/' not in filename and '\\' not in filename \
+            and not filename.startswith('.')
+
+    @timed('disk')
+    def save(self, data: bytes, extension: str, filename: Optional[str] = None) -> str:
+        """Atomically write data and return its public filename"""
+        filename = filename or f"{uuid.uuid4()}{extension}"
+        directory = self.shard_dir(filename)
+        os.makedirs(directory, exist_ok=True)
+        filepath = os.path.join(directory, filename)
+        tmp_path = os.path.join(directory, f".{filename}.{os.getpid()}.{threading.get_ident()}.tmp")
+        with open(tmp_path, 'wb') as f:
+            f.write(data)
+        os.replace(tmp_path, filepath)
+        return filename
+
+    def path(self, filename: str) -> Optional[str]:
+        """Location of a stored file, or None if missing or the name is unsafe"""
+        if not self.valid_name(filename):
+            return None
+        filepath = os.path.join(self.shard_dir(filename), filename)
+        if os.path.isfile(filepath):
+            return filepath
+        # Files written before sharding live directly in the root
+        legacy = os.path.join(self.root, filename)
+        return legacy if os.path.isfile(legacy) else None
+
+    def exists(self, filename: str) -> bool:
+        return self.path(filename) is not None
+
+    def touch(self, filepath: str):
+        """Record that a file was served, keeping its creation mtime"""
+        try:
+            os.utime(filepath, (time.time(), os.stat(filepath).st_mtime))
+        except OSError:
+            pass
+
+    def delete(self, filename: str) -> bool:
+        filepath = self.path(filename)
+        if filepath is None:
+            return False
+        try:
+            os.remove(filepath)
+            return True
+        except FileNotFoundError:
+            return False
+
+    def _iter_files(self):
+        """Yield (path, stat) for every sharded file"""
+        for shard in os.scandir(self.root):
+            if not shard.is_dir() or len(shard.name) != 2:
+                continue
+            for sub in os.scandir(shard.path):
+                if not sub.is_dir():
+                    continue
+                for entry in os.scandir(sub.path):
+                    if entry.is_file() and not entry.name.startswith('.'):
+                        yield entry.path, entry.stat()
+
+    def sweep(self) -> dict:
+        """Delete expired files, then least recently served ones over the size cap.
+
+        Content-addressed files are neither expired nor counted.
+        """
+        if not os.path.isdir(self.root):
+            return self.stats()
+        summary = self._read_summary()
+        now = time.time()
+        live = []
+        total = 0
+        for filepath, st in self._iter_files():
+            if content_hash(os.path.basename(filepath)):
+                continue
+            if now - st.st_mtime > self.ttl:
+                self._remove(filepath)
+                summary["expirations"] += 1
+                continue
+            live.append((st.st_atime, st.st_size, filepath))
+            total += st.st_size
+
+        if total > self.max_bytes:
+            live.sort()
+            while live and total > self.max_bytes:
+                _, size, filepath = live.pop(0)
+                self._remove(filepath)
+                total -= size
+                summary["evictions"] += 1
+
+        summary.update({"files": len(live), "bytes": total, "last_sweep_at": now})
+        # Workers take turns sweeping, so the summary is shared on disk
+        tmp_path = f"{self.stats_path}.{os.getpid()}.tmp"
+        with open(tmp_path, 'w') as f:
+            json.dump(summary, f)
+        os.replace(tmp_path, self.stats_path)
+        return summary
+
+    def _read_summary(self) -> dict:
+        summary = {"files": 0, "bytes": 0, "last_sweep_at": None, "expirations": 0, "evictions": 0}
+        try:
+            with open(self.stats_path) as f:
+                summary.update(json.load(f))
+        except (OSError, ValueError):
+            pass
+        return summary
+
+    @staticmethod
+    def _remove(filepath: str):
+        try:
+            os.remove(filepath)
+        except FileNotFoundError:
+            pass
+
+    def start_sweeper(self):
+        """Run the sweeper in a daemon thread; one worker sweeps at a time"""
+        with self._lock:
+            if self._sweeper_pid == os.getpid():
+                return
+            self._sweeper_pid = os.getpid()
+        threading.Thread(target=self._sweep_loop, name='file-sweeper', daemon=True).start()
+
+    def _sweep_loop(self):
+        lock_path = os.path.join(self.root, '.sweep.lock')
+        while True:
+            try:
+                os.makedirs(self.root, exist_ok=True)
+                with open(lock_path, 'a') as lock_file:
+                    try:
+                        fcntl.flock(lock_file, fcntl.LOCK_EX | fcntl.LOCK_NB)
+                    except BlockingIOError:
+                        pass
+                    else:
+                        self.sweep()
+                        fcntl.flock(lock_file, fcntl.LOCK_UN)
+            except Exception as e:
+                logger.error(f"Temp file sweep failed: {e}")
+            time.sleep(self.sweep_interval)
+
+    def stats(self) -> dict:
+        """Totals from the most recent sweep by any worker"""
+        return dict(self._read_summary(), max_bytes=self.max_bytes, ttl_seconds=self.ttl)
+
+file_store = FileStore()
@@ -1,143 +1,649 @@
 import os
 import requests
 import logging
-from typing import Dict, Any, Optional
-import uuid
+import json
+import time
+import struct
+import tempfile
+import threading
+from typing import Dict, Any, BinaryIO, Iterator, List, Optional, Sequence, Tuple, Union
+from requests.adapters import HTTPAdapter
+from urllib3.exceptions import (ConnectTimeoutError, MaxRetryError, NewConnectionError, ReadTimeoutError,
+                                ResponseError)
+from urllib3.util.retry import Retry
+from utils.cache import LRUCache, SQLiteCache, TieredCache
+from utils.image_cache import ImageCache
+from utils.file_store import file_store
+from utils.singleflight import SingleFlight
+from utils.sse import chunk_text
+from utils.metrics import UpstreamTimer
+from utils.circuit_breaker import ModelGuards, ModelUnavailable
+from utils.latency import LatencyTracker, Hedger
+from utils.warmup import ModelWarmer, loading_estimate
+from utils.capture import request_capture
+from utils.timing import phase
+from utils.scheduler import FairScheduler, HEAVY, INTERACTIVE, current_client
+from utils.usage import usage_meter
+from utils.deadline import HF_CALL_DEADLINE, deadline, remaining
 
 logger = logging.getLogger(__name__)
 
+# Upstream connection settings (shared by every HFClient in the process)
+HF_API_BASE_URL = os.environ.get('HF_API_BASE_URL', 'https://api-inference.huggingface.co/models')
+# Free endpoint reporting whether a model is loaded; the warmer only pings models it says are cold
+HF_STATUS_URL = os.environ.get('HF_STATUS_URL', HF_API_BASE_URL.rsplit('/models', 1)[0] + '/status')
+HF_POOL_SIZE = int(os.environ.get('HF_POOL_SIZE', '20'))
+HF_MAX_RETRIES = int(os.environ.get('HF_MAX_RETRIES', '2'))
+HF_BACKOFF_FACTOR = float(os.environ.get('HF_BACKOFF_FACTOR', '0.5'))
+# Read timeout for a render; reads, queueing and retries are further cut to
+# the request's deadline (utils/deadline.py), which ends before gunicorn's
+HF_IMAGE_TIMEOUT = float(os.environ.get('HF_IMAGE_TIMEOUT', '100'))
+# Read timeouts adapt to each model's p99 latency, between these bounds;
+# HF_TIMEOUT / HF_IMAGE_TIMEOUT apply until a model has enough samples
+HF_TIMEOUT = float(os.environ.get('HF_TIMEOUT', '60'))
+HF_MIN_TIMEOUT = float(os.environ.get('HF_MIN_TIMEOUT', '5'))
+HF_TIMEOUT_MULTIPLIER = float(os.environ.get('HF_TIMEOUT_MULTIPLIER', '3'))
+HF_CONNECT_TIMEOUT = float(os.environ.get('HF_CONNECT_TIMEOUT', '5'))
+
+# How long a request waits for a loading model before giving up with a 503
+HF_MODEL_WAIT = float(os.environ.get('HF_MODEL_WAIT', '45'))
+# A warm-up ping only has to start the load, so it gets a short deadline of its own
+HF_WARMUP_TIMEOUT = float(os.environ.get('HF_WARMUP_TIMEOUT', '15'))
+
+# Chat and translation calls past their p95 get a backup attempt
+HF_HEDGE_REQUESTS = os.environ.get('HF_HEDGE_REQUESTS', '1').lower() in ('1', 'true')
+HF_HEDGE_BUDGET = float(os.environ.get('HF_HEDGE_BUDGET', '0.1'))
+
+# Audio uploads are streamed upstream in chunks and capped while streaming
+MAX_AUDIO_BYTES = int(os.environ.get('MAX_AUDIO_BYTES', str(25 * 1024 * 1024)))
+UPLOAD_CHUNK_SIZE = 64 * 1024
+
+# 503 is deliberately not retried here: HF uses it for "model loading"
+RETRY_STATUSES = (429, 500, 502, 504)
+
+# Translation result cache; set TRANSLATION_CACHE_PATH to share results between workers
+TRANSLATION_CACHE_ENTRIES = int(os.environ.get('TRANSLATION_CACHE_ENTRIES', '10000'))
+TRANSLATION_CACHE_BYTES = int(os.environ.get('TRANSLATION_CACHE_BYTES', str(16 * 1024 * 1024)))
+TRANSLATION_CACHE_TTL = float(os.environ.get('TRANSLATION_CACHE_TTL', '86400'))
+TRANSLATION_CACHE_PATH = os.environ.get('TRANSLATION_CACHE_PATH')
+TRANSLATION_CACHE_ROWS = int(os.environ.get('TRANSLATION_CACHE_ROWS', '100000'))
+
+# Content-addressed image store, bounded in bytes
+IMAGE_CACHE_MAX_BYTES = int(os.environ.get('IMAGE_CACHE_MAX_BYTES', str(1024 * 1024 * 1024)))
+
+# Identical in-flight calls share one upstream request; empty disables the cross-worker tier
+SINGLEFLIGHT_DIR = os.environ.get('SINGLEFLIGHT_DIR', os.path.join(tempfile.gettempdir(), 'ethio-gpt-singleflight'))
+
+# Per-model bulkheads (calls in flight per host, across all workers) and circuit breakers;
+# empty HF_BULKHEAD_DIR makes the bulkheads per worker
+HF_MODEL_CONCURRENCY = int(os.environ.get('HF_MODEL_CONCURRENCY', '8'))
+HF_IMAGE_CONCURRENCY = int(os.environ.get('HF_IMAGE_CONCURRENCY', '2'))
+HF_BULKHEAD_DIR = os.environ.get('HF_BULKHEAD_DIR', os.path.join(tempfile.gettempdir(), 'ethio-gpt-bulkheads'))
+HF_BREAKER_FAILURE_RATE = float(os.environ.get('HF_BREAKER_FAILURE_RATE', '0.5'))
+HF_BREAKER_MIN_CALLS = int(os.environ.get('HF_BREAKER_MIN_CALLS', '10'))
+HF_BREAKER_WINDOW = float(os.environ.get('HF_BREAKER_WINDOW', '60'))
+HF_BREAKER_OPEN_SECONDS = float(os.environ.get('HF_BREAKER_OPEN_SECONDS', '30'))
+HF_SLOW_CALL_SECONDS = float(os.environ.get('HF_SLOW_CALL_SECONDS', '20'))
+
+# Models used by the tools
+CHAT_MODEL = "microsoft/DialoGPT-medium"
+CHAT_PARAMETERS = {"max_length": 500, "temperature": 0.7, "do_sample": True}
+IMAGE_MODELS = {
+    "ghibli": "22h/vintage-illustration",
+    "cartoon": "ogkalu/Comic-Diffusion",
+    "anime": "cagliostrolab/animagine-xl-3.1",
+    "realistic": "stabilityai/stable-diffusion-xl-base-1.0"
+}
+DEFAULT_IMAGE_MODEL = IMAGE_MODELS["realistic"]
+TTS_MODEL = "facebook/mms-tts-eng"
+STT_MODEL = "facebook/wav2vec2-base-960h"
+
+CHAT_EMPTY_REPLY = "I apologize, but I couldn't generate a response at this time."
+CHAT_ERROR_REPLY = "Sorry, I'm experiencing technical difficulties. Please try again later."
+
+translation_cache = TieredCache(
+    LRUCache(TRANSLATION_CACHE_ENTRIES, TRANSLATION_CACHE_BYTES, TRANSLATION_CACHE_TTL),
+    SQLiteCache(TRANSLATION_CACHE_PATH, TRANSLATION_CACHE_TTL, TRANSLATION_CACHE_ROWS)
+    if TRANSLATION_CACHE_PATH else None
+)
+image_cache = ImageCache(file_store, max_bytes=IMAGE_CACHE_MAX_BYTES)
+singleflight = SingleFlight(SINGLEFLIGHT_DIR or None)
+model_warmer = ModelWarmer([CHAT_MODEL, *IMAGE_MODELS.values(), TTS_MODEL, STT_MODEL])
+latency_tracker = LatencyTracker()
+hedger = Hedger(latency_tracker, budget=HF_HEDGE_BUDGET)
+model_guards = ModelGuards(
+    default_limit=HF_MODEL_CONCURRENCY,
+    # Image renders are slow by nature; cap them harder and judge them by their own timeout
+    overrides={model: {"limit": HF_IMAGE_CONCURRENCY, "slow_call_seconds": HF_IMAGE_TIMEOUT * 0.8}
+               for model in IMAGE_MODELS.values()},
+    slots_dir=HF_BULKHEAD_DIR or None,
+    window=HF_BREAKER_WINDOW,
+    min_calls=HF_BREAKER_MIN_CALLS,
+    failure_rate=HF_BREAKER_FAILURE_RATE,
+    slow_call_seconds=HF_SLOW_CALL_SECONDS,
+    open_seconds=HF_BREAKER_OPEN_SECONDS
+)
+
+# Fair sharing of upstream capacity across clients, interactive calls first
+upstream_scheduler = FairScheduler(model_slots=model_guards)
+
+_sessions = {}
+_sessions_pid = None
+_session_lock = threading.Lock()
+_client = None
+
+class DeadlineRetry(Retry):
+    """Retry policy that stops once the next attempt would start past the call's deadline"""
+
+    def increment(self, method=None, url=None, response=None, error=None, _pool=None, _stacktrace=None):
+        retry = super().increment(method, url, response, error, _pool, _stacktrace)
+        left = remaining()
+        if left is not None:
+            wait = retry.get_backoff_time()
+            if response is not None and self.respect_retry_after_header:
+                wait = max(wait, retry.get_retry_after(response) or 0)
+            if wait >= left:
+                raise MaxRetryError(_pool, url, error or ResponseError('call deadline exceeded'))
+        return retry
+
+def build_session(pool_size: int = HF_POOL_SIZE, max_retries: int = HF_MAX_RETRIES,
+                  backoff_factor: float = HF_BACKOFF_FACTOR) -> requests.Session:
+    """Create a keep-alive session with a bounded connection pool and retry policy.
+
+    Only connection failures (nothing was sent) and 429/5xx answers are
+    retried. A read timeout or dropped response is never retried, since
+    image and chat renders are not idempotent.
+    """
+    retry = DeadlineRetry(
+        total=max_retries,
+        connect=max_retries,
+        read=False,
+        other=0,
+        status=max_retries,
+        backoff_factor=backoff_factor,
+        status_forcelist=RETRY_STATUSES,
+        allowed_methods=frozenset(['POST']),
+        respect_retry_after_header=True,
+        raise_on_status=False
+    )
+    adapter = HTTPAdapter(pool_connections=4, pool_maxsize=pool_size, max_retries=retry)
+    session = requests.Session()
+    session.mount('https://', adapter)
+    session.mount('http://', adapter)
+    return session
+
+def is_timeout(error: Exception) -> bool:
+    """True for a timeout, including one requests reports as a ConnectionError
+    because urllib3 wrapped it in MaxRetryError"""
+    if isinstance(error, requests.exceptions.Timeout):
+        return True
+    reason = getattr(error.args[0], 'reason', None) if error.args else None
+    # urllib3 subclasses NewConnectionError (e.g. refused) from ConnectTimeoutError
+    return isinstance(reason, (ReadTimeoutError, ConnectTimeoutError)) and not isinstance(reason, NewConnectionError)
+
+def get_session(retries: bool = True) -> requests.Session:
+    """Return the pooled session for this process (rebuilt after a fork).
+
+    Streamed request bodies cannot be replayed, so they go through a
+    separate pool with retries disabled.
+    """
+    global _sessions, _sessions_pid
+    key = 'default' if retries else 'streaming'
+    pid = os.getpid()
+    session = _sessions.get(key) if _sessions_pid == pid else None
+    if session is None:
+        with _session_lock:
+            if _sessions_pid != pid:
+                # Never share sockets inherited from the gunicorn master
+                _sessions = {}
+                _sessions_pid = pid
+            session = _sessions.get(key)
+            if session is None:
+                session = _sessions[key] = build_session(max_retries=HF_MAX_RETRIES if retries else 0)
+    return session
+
+class UploadTooLarge(ValueError):
+    """Raised when a streamed upload passes its size limit"""
+
+def iter_upload(stream: BinaryIO, max_bytes: int = MAX_AUDIO_BYTES,
+                chunk_size: int = UPLOAD_CHUNK_SIZE) -> Iterator[bytes]:
+    """Read a file-like object in chunks, enforcing max_bytes as it goes"""
+    total = 0
+    while True:
+        chunk = stream.read(chunk_size)
+        if not chunk:
+            return
+        total += len(chunk)
+        if total > max_bytes:
+            raise UploadTooLarge(f"Upload exceeds {max_bytes} bytes")
+        yield chunk
+
+def enhance_prompt(prompt: str, preset: str) -> str:
+    """Enhance prompt based on preset"""
+    enhancements = {
+        "ghibli": f"Studio Ghibli style, anime, beautiful, cinematic, {prompt}",
+        "cartoon": f"cartoon style, vibrant colors, comic book, {prompt}",
+        "anime": f"anime style, Japanese animation, detailed, {prompt}",
+        "realistic": f"photorealistic, high quality, detailed, 4k, {prompt}"
+    }
+    return enhancements.get(preset, prompt)
+
+def model_class(model: str) -> str:
+    """Scheduler class: chat and translation are interactive, media models are heavy"""
+    if model == CHAT_MODEL or model.startswith('Helsinki-NLP/'):
+        return INTERACTIVE
+    return HEAVY
+
+def model_tool(model: str) -> str:
+    """Usage-cost kind of a model's calls"""
+    if model == CHAT_MODEL:
+        return 'chat'
+    if model.startswith('Helsinki-NLP/'):
+        return 'translate'
+    if model == TTS_MODEL:
+        return 'tts'
+    if model == STT_MODEL:
+        return 'stt'
+    return 'image'
+
+def charge_usage(model: str, units: int = 1):
+    """Charge a signed-in client for a successful upstream call to model covering units inputs"""
+    client = current_client()
+    if units and client.startswith('user:'):
+        usage_meter.charge(client[5:], model_tool(model), units)
+
+def image_model(preset: str) -> str:
+    """Map an image preset to its model"""
+    return IMAGE_MODELS.get(preset, DEFAULT_IMAGE_MODEL)
+
+def translation_model(source_lang: str, target_lang: str) -> str:
+    """Name of the opus-mt model for a language pair"""
+    return f"Helsinki-NLP/opus-mt-{source_lang}-{target_lang}"
+
+def translation_cache_key(model: str, text: str) -> str:
+    """Cache key for a translation; whitespace runs are collapsed"""
+    return f"{model}\n{' '.join(text.split())}"
+
+def placeholder_translation(text: str, target_lang: str) -> Optional[str]:
+    """Placeholder text for Ethiopian languages, which have no opus-mt model"""
+    ethio_translations = {
+        "am": f"Amharic Translation: {text}",
+        "ti": f"Tigrinya Translation: {text}"
+    }
+    return ethio_translations.get(target_lang)
+
+def build_chat_prompt(message: str, history: Sequence[Tuple[str, str]] = ()) -> str:
+    """Prompt sent to the chat model, with earlier (message, reply) turns first"""
+    turns = ''.join(f"User: {past}\nBot: {reply}\n" for past, reply in history)
+    return f"{turns}User: {message}\nBot:"
+
+def parse_chat_result(result: Any) -> str:
+    """Extract the bot's reply from a text-generation response"""
+    if isinstance(result, list) and len(result) > 0:
+        generated_text = result[0].get('generated_text', '')
+        # Extract only the bot's response, not any turn it invents after it
+        if "Bot:" in generated_text:
+            return generated_text.split("Bot:")[-1].split("\nUser:")[0].strip()
+        return generated_text
+    return CHAT_EMPTY_REPLY
+
+def parse_translation_result(result: Any, text: str) -> str:
+    """Extract the translated text, falling back to the input"""
+    if isinstance(result, list) and len(result) > 0:
+        return result[0].get('translation_text', text)
+    return text
+
+def silent_wav(seconds: float = 0.1, rate: int = 16000) -> bytes:
+    """A short mono 16-bit PCM WAV of silence"""
+    data_size = int(seconds * rate) * 2
+    header = struct.pack('<4sI4s4sIHHIIHH4sI', b'RIFF', 36 + data_size, b'WAVE', b'fmt ', 16,
+                         1, 1, rate, rate * 2, 2, 16, b'data', data_size)
+    return header + bytes(data_size)
+
+def warmup_request(model: str) -> Dict[str, Any]:
+    """Cheapest request that makes a model load: keyword arguments for HFClient._post"""
+    if model == STT_MODEL:
+        return {"data": silent_wav()}
+    if model in IMAGE_MODELS.values():
+        return {"json": {"inputs": "warm-up", "parameters": {"num_inference_steps": 1}}}
+    return {"json": {"inputs": "Hello"}}
+
+def save_temp_file(file_data: bytes, extension: str) -> str:
+    """Save file to the managed temp store and return filename"""
+    return file_store.save(file_data, extension)
+
+def get_hf_client() -> 'HFClient':
+    """Return the process-wide HFClient used by the blueprints"""
+    global _client
+    if _client is None:
+        with _session_lock:
+            if _client is None:
+                _client = HFClient()
+    return _client
+
+def start_model_warmer():
+    """Start this process's model warmer; called by server hooks, not on import"""
+    client = get_hf_client()
+    model_warmer.start(client.warm_model, client.model_status)
+
 class HFClient:
-    def __init__(self):
+    def __init__(self, session: Optional[requests.Session] = None):
         self.api_key = os.environ.get('HF_API_KEY')
-        self.base_url = "https://api-inference.huggingface.co/models"
+        self.base_url = HF_API_BASE_URL
+        self._session = session
+
+    @property
+    def session(self) -> requests.Session:
+        """Pooled HTTP session used for every upstream call"""
+        return self._session or get_session()
         
-    def _make_request(self, model: str, inputs: Any, parameters: Optional[Dict] = None):
-        """Make request to Hugging Face API"""
+    def _post(self, model: str, session: Optional[requests.Session] = None,
+              wait: float = HF_MODEL_WAIT, record_latency: bool = True, charge: int = 1,
+              **kwargs) -> requests.Response:
+        """POST to a model, waiting out HF's "model loading" 503s.
+
+        A call to a model known to be loading sleeps until its estimated
+        ready time first. A loading 503 is retried after its
+        ``estimated_time`` if the body can be replayed. Either way, once
+        ``wait`` seconds would be exceeded it raises ModelUnavailable.
+        The whole call, retries included, is bounded by HF_CALL_DEADLINE.
+        A successful response is charged to the client's usage as
+        ``charge`` inputs; 0 makes the call free.
+        """
         if not self.api_key:
             raise ValueError("Hugging Face API key not configured")
-            
-        headers = {
-            "Authorization": f"Bearer {self.api_key}",
-            "Content-Type": "application/json"
-        }
+
+        request_capture.note_model(model)
+        headers = {"Authorization": f"Bearer {self.api_key}"}
+        if 'json' in kwargs:
+            # Serialize once so the payload size is known
+            kwargs['data'] = json.dumps(kwargs.pop('json')).encode('utf-8')
+            headers["Content-Type"] = "application/json"
+        body = kwargs.get('data')
+        replayable = body is None or isinstance(body, (bytes, bytearray))
         
-        url = f"{self.base_url}/{model}"
+        with deadline(HF_CALL_DEADLINE) as call_deadline:
+            wait_until = min(time.monotonic() + wait, call_deadline)
+            model_warmer.wait_until_ready(model, wait_until)
+            while True:
+                response = self._send(model, session, headers, kwargs, record_latency)
+                estimated = loading_estimate(response)
+                if estimated is None:
+                    if response.status_code < 400:
+                        model_warmer.mark_warm(model)
+                        charge_usage(model, charge)
+                    return response
+                
+                model_warmer.mark_loading(model, estimated)
+                response.close()
+                if not replayable or estimated > wait_until - time.monotonic():
+                    raise ModelUnavailable(model, estimated, 'model loading')
+                logger.info(f"{model} is loading; retrying in {estimated:.0f}s")
+                with phase('model_wait', model):
+                    time.sleep(estimated)
+    
+    def _send(self, model: str, session: Optional[requests.Session], headers: Dict[str, str],
+              kwargs: Dict[str, Any], record_latency: bool = True) -> requests.Response:
+        """One POST attempt, recording latency, status and payload sizes.
+
+        Raises ModelUnavailable without calling upstream when the model's
+        breaker is open or the call could not get a scheduler slot and
+        bulkhead permit in time. Timeouts, connection
+        errors, 429 and 5xx other than "model loading" count as failures
+        for the breaker.
+        """
+        body = kwargs.get('data')
+        left = remaining()
+        if left is not None:
+            # No read may outlive the call's deadline
+            if left <= 0:
+                raise requests.exceptions.Timeout(f"{model}: call deadline exceeded")
+            connect, read = kwargs.get('timeout') or (HF_CONNECT_TIMEOUT, HF_TIMEOUT)
+            kwargs = dict(kwargs, timeout=(min(connect, left), min(read, left)))
+        # Fail fast on an open breaker, then wait for a fair share of capacity
+        model_guards.check(model)
+        with phase('queue', model):
+            slot = upstream_scheduler.acquire(model_class(model), model)
+        try:
+            permit = slot.permit
+            timer = UpstreamTimer(model, len(body) if isinstance(body, (bytes, bytearray)) else None)
+            try:
+                with phase('upstream', model):
+                    response = (session or self.session).post(f"{self.base_url}/{model}", headers=headers, **kwargs)
+            except requests.exceptions.RequestException as e:
+                timer.finish('timeout' if is_timeout(e) else 'error')
+                permit.release(failed=True)
+                raise
+            except BaseException:
+                # e.g. UploadTooLarge from the request body; not the model's fault
+                permit.release(failed=False)
+                raise
+            timer.finish(response.status_code, None if kwargs.get('stream') else len(response.content))
+            failed = response.status_code == 429 or response.status_code >= 500
+            permit.release(failed=failed and loading_estimate(response) is None)
+            if record_latency and response.status_code < 400:
+                latency_tracker.record(model, response.elapsed.total_seconds())
+            return response
+        finally:
+            slot.release()
+    
+    def model_status(self, model: str) -> Optional[bool]:
+        """Whether a model is loaded upstream, from the free status endpoint; None if unknown"""
+        response = self.session.get(f"{HF_STATUS_URL}/{model}",
+                                    headers={"Authorization": f"Bearer {self.api_key}"},
+                                    timeout=(HF_CONNECT_TIMEOUT, HF_WARMUP_TIMEOUT))
+        if response.status_code != 200:
+            return None
+        data = response.json()
+        return data.get('loaded') if isinstance(data, dict) else None
+
+    def warm_model(self, model: str):
+        """Send a minimal request so a cold model starts loading upstream"""
+        # Pings are cheaper than real calls, so they stay out of the latency window
+        with deadline(HF_WARMUP_TIMEOUT):
+            response = self._post(model, wait=0, record_latency=False, charge=0,
+                                  timeout=(HF_CONNECT_TIMEOUT, HF_WARMUP_TIMEOUT), **warmup_request(model))
+        response.close()
+        if response.status_code >= 400:
+            raise ValueError(f"HTTP {response.status_code}")
+    
+    def _timeout(self, model: str, default: float = HF_TIMEOUT) -> tuple:
+        """(connect, read) timeout for a model, derived from its recent latency"""
+        return HF_CONNECT_TIMEOUT, latency_tracker.timeout(model, default, HF_MIN_TIMEOUT, HF_TIMEOUT_MULTIPLIER)
+    
+    def _make_request(self, model: str, inputs: Any, parameters: Optional[Dict] = None, hedge: bool = False):
+        """Make request to Hugging Face API, coalescing identical in-flight calls.
+
+        ``hedge`` is for cheap idempotent calls: a slow first attempt gets a
+        backup after the model's p95 latency and the first answer wins.
+        """
+        request_capture.note_model(model)
+        key = json.dumps([model, inputs, parameters], sort_keys=True)
+        # A batch pays for each of its inputs
+        units = len(inputs) if isinstance(inputs, list) else 1
+        # Includes waiting on a coalesced or hedged call made by another thread
+        with phase('upstream', model):
+            if hedge and HF_HEDGE_REQUESTS:
+                return singleflight.do(key, lambda: self._hedged_fetch(model, inputs, parameters, units))
+            return singleflight.do(key, lambda: self._fetch_json(model, inputs, parameters, units))
+
+    def _hedged_fetch(self, model: str, inputs: Any, parameters: Optional[Dict] = None, units: int = 1):
+        """_fetch_json with a backup attempt; the client pays for one call however many were sent"""
+        result = hedger.call(model, lambda: self._fetch_json(model, inputs, parameters, charge=0))
+        charge_usage(model, units)
+        return result
+    
+    def _fetch_json(self, model: str, inputs: Any, parameters: Optional[Dict] = None, charge: int = 1):
+        """POST a JSON payload to a model and decode the response"""
         payload = {"inputs": inputs}
         if parameters:
             payload["parameters"] = parameters
             
         try:
-            response = requests.post(url, headers=headers, json=payload, timeout=60)
+            response = self._post(model, json=payload, charge=charge, timeout=self._timeout(model))
             response.raise_for_status()
             return response.json()
         except requests.exceptions.RequestException as e:
             logger.error(f"HF API request failed: {e}")
             raise
     
-    def chat_completion(self, message: str) -> str:
+    def chat_completion(self, message: str, history: Sequence[Tuple[str, str]] = ()) -> str:
         """Generate chat completion using a conversational model"""
         try:
-            # Using Microsoft's DialoGPT-medium for chat
-            result = self._make_request(
-                "microsoft/DialoGPT-medium",
-                f"User: {message}\nBot:",
-                {"max_length": 500, "temperature": 0.7, "do_sample": True}
-            )
-            
-            if isinstance(result, list) and len(result) > 0:
-                generated_text = result[0].get('generated_text', '')
-                # Extract only the bot's response
-                if "Bot:" in generated_text:
-                    return generated_text.split("Bot:")[-1].strip()
-                return generated_text
-            return "I apologize, but I couldn't generate a response at this time."
+            result = self._make_request(CHAT_MODEL, build_chat_prompt(message, history), CHAT_PARAMETERS, hedge=True)
+            return parse_chat_result(result)
             
+        except ModelUnavailable:
+            raise
         except Exception as e:
             logger.error(f"Chat completion failed: {e}")
-            return "Sorry, I'm experiencing technical difficulties. Please try again later."
+            return CHAT_ERROR_REPLY
+    
+    def stream_chat_completion(self, message: str, history: Sequence[Tuple[str, str]] = ()) -> Iterator[str]:
+        """Yield reply text as the model produces it.
+
+        Uses the inference API's ``stream`` mode when the model serves
+        text/event-stream; otherwise the finished reply is split into
+        chunks. The upstream response is closed when the generator is.
+        """
+        response = self._post(
+            CHAT_MODEL,
+            json={"inputs": build_chat_prompt(message, history), "parameters": CHAT_PARAMETERS, "stream": True},
+            stream=True,
+            timeout=self._timeout(CHAT_MODEL)
+        )
+        try:
+            response.raise_for_status()
+            if 'text/event-stream' not in response.headers.get('Content-Type', ''):
+                yield from chunk_text(parse_chat_result(response.json()))
+                return
+            
+            for line in response.iter_lines(decode_unicode=True):
+                if not line or not line.startswith('data:'):
+                    continue
+                event = json.loads(line[5:])
+                token = event.get('token') or {}
+                if token.get('text') and not token.get('special'):
+                    yield token['text']
+        finally:
+            response.close()
     
     def generate_image(self, prompt: str, preset: str = "realistic") -> str:
         """Generate image using Stable Diffusion"""
         try:
-            # Map presets to different models
-            model_map = {
-                "ghibli": "22h/vintage-illustration",
-                "cartoon": "ogkalu/Comic-Diffusion",
-                "anime": "cagliostrolab/animagine-xl-3.1",
-                "realistic": "stabilityai/stable-diffusion-xl-base-1.0"
-            }
-            
-            model = model_map.get(preset, "stabilityai/stable-diffusion-xl-base-1.0")
+            model = image_model(preset)
             enhanced_prompt = self._enhance_prompt(prompt, preset)
+            request_capture.note_model(model)
             
-            response = requests.post(
-                f"{self.base_url}/{model}",
-                headers={"Authorization": f"Bearer {self.api_key}"},
-                json={"inputs": enhanced_prompt}
-            )
-            
-            if response.status_code == 200:
-                return self._save_temp_file(response.content, '.png')
-            raise ValueError("Image generation failed")
+            key = json.dumps(["image", model, enhanced_prompt])
+            return singleflight.do(key, lambda: self._render_image(model, enhanced_prompt))
                 
         except Exception as e:
             logger.error(f"Image generation failed: {e}")
             raise
     
+    def _render_image(self, model: str, enhanced_prompt: str) -> str:
+        """Return a cached render or fetch a new one from the model"""
+        cached = image_cache.get(model, enhanced_prompt)
+        if cached:
+            return cached
+        
+        response = self._post(
+            model,
+            json={"inputs": enhanced_prompt},
+            timeout=self._timeout(model, HF_IMAGE_TIMEOUT)
+        )
+        
+        if response.status_code == 200:
+            return image_cache.put(model, enhanced_prompt, response.content, '.png')
+        raise ValueError("Image generation failed")
+    
     def _enhance_prompt(self, prompt: str, preset: str) -> str:
         """Enhance prompt based on preset"""
-        enhancements = {
-            "ghibli": f"Studio Ghibli style, anime, beautiful, cinematic, {prompt}",
-            "cartoon": f"cartoon style, vibrant colors, comic book, {prompt}",
-            "anime": f"anime style, Japanese animation, detailed, {prompt}",
-            "realistic": f"photorealistic, high quality, detailed, 4k, {prompt}"
-        }
-        return enhancements.get(preset, prompt)
+        return enhance_prompt(prompt, preset)
     
     def _save_temp_file(self, file_data: bytes, extension: str) -> str:
         """Save file to temp directory and return filename"""
-        filename = f"{uuid.uuid4()}{extension}"
-        filepath = os.path.join('temp', filename)
-        
-        # Ensure temp directory exists
-        os.makedirs('temp', exist_ok=True)
-        
-        with open(filepath, 'wb') as f:
-            f.write(file_data)
-            
-        return filename
+        return save_temp_file(file_data, extension)
     
     def translate_text(self, text: str, target_lang: str, source_lang: str = "en") -> str:
         """Translate text using HF models"""
         try:
-            # Simple translation implementation
-            if target_lang in ["am", "ti"]:
-                # For Ethiopian languages, return placeholder text
-                ethio_translations = {
-                    "am": f"Amharic Translation: {text}",
-                    "ti": f"Tigrinya Translation: {text}"
-                }
-                return ethio_translations.get(target_lang, text)
-            else:
-                model = f"Helsinki-NLP/opus-mt-{source_lang}-{target_lang}"
-                result = self._make_request(model, text)
-                
-                if isinstance(result, list) and len(result) > 0:
-                    return result[0].get('translation_text', text)
-                return text
+            # For Ethiopian languages, return placeholder text
+            placeholder = placeholder_translation(text, target_lang)
+            if placeholder is not None:
+                return placeholder
+            
+            model = translation_model(source_lang, target_lang)
+            cache_key = translation_cache_key(model, text)
+            cached = translation_cache.get(cache_key)
+            if cached is not None:
+                return cached
+            
+            result = self._make_request(model, text, hedge=True)
+            translated = parse_translation_result(result, text)
+            if isinstance(result, list) and result:
+                translation_cache.set(cache_key, translated)
+            return translated
                 
+        except ModelUnavailable:
+            raise
         except Exception as e:
             logger.error(f"Translation failed: {e}")
             return text
     
+    def translate_batch(self, items: List[Dict[str, str]]) -> List[Dict[str, str]]:
+        """Translate many texts with one upstream call per opus-mt model.
+
+        Each item has ``text``, ``target_lang`` and ``source_lang``. Results
+        come back in input order as ``{"translated_text": ...}`` or
+        ``{"error": ...}`` for items whose model call failed.
+        """
+        results: List[Optional[Dict[str, str]]] = [None] * len(items)
+        groups: Dict[str, Dict[str, List[int]]] = {}
+        
+        for index, item in enumerate(items):
+            text = item['text']
+            placeholder = placeholder_translation(text, item['target_lang'])
+            if placeholder is not None:
+                results[index] = {"translated_text": placeholder}
+                continue
+            
+            model = translation_model(item['source_lang'], item['target_lang'])
+            cached = translation_cache.get(translation_cache_key(model, text))
+            if cached is not None:
+                results[index] = {"translated_text": cached}
+                continue
+            
+            # Identical texts in a group are only sent once
+            groups.setdefault(model, {}).setdefault(text, []).append(index)
+        
+        for model, texts in groups.items():
+            inputs = list(texts)
+            try:
+                result = self._make_request(model, inputs)
+                if not isinstance(result, list) or len(result) != len(inputs):
+                    raise ValueError("Unexpected batch translation response")
+                
+                for text, entry in zip(inputs, result):
+                    translated = entry.get('translation_text', text)
+                    translation_cache.set(translation_cache_key(model, text), translated)
+                    for index in texts[text]:
+                        results[index] = {"translated_text": translated}
+                    
+            except Exception as e:
+                logger.error(f"Batch translation failed for {model}: {e}")
+                error = str(e) if isinstance(e, ModelUnavailable) else "Translation failed"
+                for indexes in texts.values():
+                    for index in indexes:
+                        results[index] = {"error": error}
+        
+        return results
+    
     def text_to_speech(self, text: str) -> str:
         """Convert text to speech"""
         try:
-            response = requests.post(
-                f"{self.base_url}/facebook/mms-tts-eng",
-                headers={"Authorization": f"Bearer {self.api_key}"},
-                json={"inputs": text}
-            )
+            response = self._post(TTS_MODEL, json={"inputs": text}, timeout=self._timeout(TTS_MODEL))
             
             if response.status_code == 200:
                 return self._save_temp_file(response.content, '.wav')
@@ -147,14 +653,21 @@ class HFClient:
             logger.error(f"TTS failed: {e}")
             raise
     
-    def speech_to_text(self, audio_data: bytes) -> str:
-        """Convert speech to text"""
+    def speech_to_text(self, audio_data: Union[bytes, BinaryIO]) -> str:
+        """Convert speech to text.
+
+        ``audio_data`` may be bytes or a file-like object; the latter is sent
+        upstream as a chunked body without being read into memory.
+        """
         try:
-            response = requests.post(
-                f"{self.base_url}/facebook/wav2vec2-base-960h",
-                headers={"Authorization": f"Bearer {self.api_key}"},
-                data=audio_data
-            )
+            if isinstance(audio_data, (bytes, bytearray)):
+                if len(audio_data) > MAX_AUDIO_BYTES:
+                    raise UploadTooLarge(f"Upload exceeds {MAX_AUDIO_BYTES} bytes")
+                session, body = self.session, audio_data
+            else:
+                session, body = self._session or get_session(retries=False), iter_upload(audio_data)
+            
+            response = self._post(STT_MODEL, session=session, data=body, timeout=self._timeout(STT_MODEL))
             
             if response.status_code == 200:
                 result = response.json()
@@ -0,0 +1,251 @@
+import os
+import json
+import asyncio
+import logging
+from typing import Dict, Any, AsyncIterator, Optional, Sequence, Tuple, Union
+
+import aiohttp
+
+from utils.hf_client import (
+    HF_API_BASE_URL, HF_MAX_RETRIES, HF_BACKOFF_FACTOR, RETRY_STATUSES,
+    CHAT_MODEL, CHAT_PARAMETERS, CHAT_ERROR_REPLY, TTS_MODEL, STT_MODEL,
+    build_chat_prompt, parse_chat_result, parse_translation_result,
+    placeholder_translation, translation_model, image_model, enhance_prompt,
+    save_temp_file, translation_cache, translation_cache_key, image_cache,
+    MAX_AUDIO_BYTES, UploadTooLarge, model_guards
+)
+from utils.circuit_breaker import ModelUnavailable
+
+from utils.metrics import UpstreamTimer
+from utils.deadline import HF_CALL_DEADLINE
+
+logger = logging.getLogger(__name__)
+
+# The async client multiplexes many in-flight calls over one connector
+HF_ASYNC_POOL_SIZE = int(os.environ.get('HF_ASYNC_POOL_SIZE', '200'))
+HF_ASYNC_TIMEOUT = float(os.environ.get('HF_ASYNC_TIMEOUT', '120'))
+
+def model_loading(status: int, body: bytes) -> bool:
+    """Whether an answer is HF's "model loading" 503, which is not a model failure"""
+    if status != 503:
+        return False
+    try:
+        data = json.loads(body)
+    except ValueError:
+        return False
+    return isinstance(data, dict) and 'estimated_time' in data
+
+class _Upload:
+    """Streamed request body that enforces max_bytes as it is sent.
+
+    aiohttp wraps errors raised while it writes a body, so an overflow is
+    remembered here for the caller to re-raise as UploadTooLarge.
+    """
+
+    def __init__(self, chunks: AsyncIterator[bytes], max_bytes: int = MAX_AUDIO_BYTES):
+        self.chunks = chunks
+        self.max_bytes = max_bytes
+        self.too_large = False
+
+    async def body(self) -> AsyncIterator[bytes]:
+        total = 0
+        async for chunk in self.chunks:
+            total += len(chunk)
+            if total > self.max_bytes:
+                self.too_large = True
+                raise UploadTooLarge(f"Upload exceeds {self.max_bytes} bytes")
+            yield chunk
+
+class AsyncHFClient:
+    """Non-blocking counterpart of HFClient with the same method surface"""
+
+    def __init__(self, pool_size: int = HF_ASYNC_POOL_SIZE):
+        self.api_key = os.environ.get('HF_API_KEY')
+        self.base_url = HF_API_BASE_URL
+        self.pool_size = pool_size
+        self._session: Optional[aiohttp.ClientSession] = None
+
+    async def _get_session(self) -> aiohttp.ClientSession:
+        """Create the pooled session lazily, on the running event loop"""
+        if self._session is None or self._session.closed:
+            connector = aiohttp.TCPConnector(limit=self.pool_size, keepalive_timeout=60)
+            self._session = aiohttp.ClientSession(
+                connector=connector,
+                timeout=aiohttp.ClientTimeout(total=HF_ASYNC_TIMEOUT)
+            )
+        return self._session
+
+    async def close(self):
+        """Release pooled connections"""
+        if self._session is not None and not self._session.closed:
+            await self._session.close()
+
+    async def _post(self, model: str, retries: bool = True, **kwargs) -> aiohttp.ClientResponse:
+        """POST to a model, retrying with the same policy as the sync session.
+
+        Only failed connects and 429/5xx answers are retried; a timeout or
+        dropped connection may mean the render ran, so it is not. Every
+        attempt and backoff fits in one HF_CALL_DEADLINE. Streamed bodies
+        can only be sent once, so pass ``retries=False`` for them.
+
+        Each attempt holds a permit from the sync client's model breakers
+        and host-wide bulkheads. There is no FairScheduler queue here:
+        waiting for a slot would block the event loop, so a full bulkhead
+        or open breaker raises ModelUnavailable at once.
+        """
+        if not self.api_key:
+            raise ValueError("Hugging Face API key not configured")
+
+        session = await self._get_session()
+        url = f"{self.base_url}/{model}"
+        headers = {"Authorization": f"Bearer {self.api_key}"}
+        timer = UpstreamTimer(model)
+        loop = asyncio.get_running_loop()
+        deadline = loop.time() + min(HF_CALL_DEADLINE, HF_ASYNC_TIMEOUT)
+        for attempt in range(HF_MAX_RETRIES + 1):
+            backoff = HF_BACKOFF_FACTOR * (2 ** attempt)
+            last = not retries or attempt == HF_MAX_RETRIES or loop.time() + backoff >= deadline
+            permit = model_guards.acquire(model)
+            failed = False
+            try:
+                timeout = aiohttp.ClientTimeout(total=max(deadline - loop.time(), 0.001))
+                response = await session.post(url, headers=headers, timeout=timeout, **kwargs)
+                failed = response.status == 429 or response.status >= 500
+                if response.status not in RETRY_STATUSES or last:
+                    body = await response.read()
+                    failed = failed and not model_loading(response.status, body)
+                    timer.finish(response.status, len(body))
+                    return response
+                response.release()
+            except aiohttp.ClientConnectorError as e:
+                failed = True
+                if last:
+                    logger.error(f"HF API request failed: {e}")
+                    timer.finish('error')
+                    raise
+            except (aiohttp.ClientConnectionError, asyncio.TimeoutError) as e:
+                failed = True
+                logger.error(f"HF API request failed: {e}")
+                timer.finish('timeout' if isinstance(e, asyncio.TimeoutError) else 'error')
+                raise
+            finally:
+                permit.release(failed=failed)
+            await asyncio.sleep(backoff)
+
+    async def _make_request(self, model: str, inputs: Any, parameters: Optional[Dict] = None):
+        """Make request to Hugging Face API"""
+        payload = {"inputs": inputs}
+        if parameters:
+            payload["parameters"] = parameters
+
+        response = await self._post(model, json=payload)
+        try:
+            response.raise_for_status()
+        except aiohttp.ClientResponseError as e:
+            logger.error(f"HF API request failed: {e}")
+            raise
+        return await response.json(content_type=None)
+
+    async def chat_completion(self, message: str, history: Sequence[Tuple[str, str]] = ()) -> str:
+        """Generate chat completion using a conversational model"""
+        try:
+            result = await self._make_request(CHAT_MODEL, build_chat_prompt(message, history), CHAT_PARAMETERS)
+            return parse_chat_result(result)
+
+        except ModelUnavailable:
+            raise
+        except Exception as e:
+            logger.error(f"Chat completion failed: {e}")
+            return CHAT_ERROR_REPLY
+
+    async def generate_image(self, prompt: str, preset: str = "realistic") -> str:
+        """Generate image using Stable Diffusion"""
+        try:
+            model = image_model(preset)
+            enhanced_prompt = enhance_prompt(prompt, preset)
+
+            cached = await asyncio.to_thread(image_cache.get, model, enhanced_prompt)
+            if cached:
+                return cached
+
+            response = await self._post(model, json={"inputs": enhanced_prompt})
+
+            if response.status == 200:
+                data = await response.read()
+                return await asyncio.to_thread(image_cache.put, model, enhanced_prompt, data, '.png')
+            raise ValueError("Image generation failed")
+
+        except Exception as e:
+            logger.error(f"Image generation failed: {e}")
+            raise
+
+    async def _save_temp_file(self, file_data: bytes, extension: str) -> str:
+        """Write the file off the event loop"""
+        return await asyncio.to_thread(save_temp_file, file_data, extension)
+
+    async def translate_text(self, text: str, target_lang: str, source_lang: str = "en") -> str:
+        """Translate text using HF models"""
+        try:
+            placeholder = placeholder_translation(text, target_lang)
+            if placeholder is not None:
+                return placeholder
+
+            model = translation_model(source_lang, target_lang)
+            cache_key = translation_cache_key(model, text)
+            cached = await asyncio.to_thread(translation_cache.get, cache_key)
+            if cached is not None:
+                return cached
+
+            result = await self._make_request(model, text)
+            translated = parse_translation_result(result, text)
+            if isinstance(result, list) and result:
+                await asyncio.to_thread(translation_cache.set, cache_key, translated)
+            return translated
+
+        except ModelUnavailable:
+            raise
+        except Exception as e:
+            logger.error(f"Translation failed: {e}")
+            return text
+
+    async def text_to_speech(self, text: str) -> str:
+        """Convert text to speech"""
+        try:
+            response = await self._post(TTS_MODEL, json={"inputs": text})
+
+            if response.status == 200:
+                return await self._save_temp_file(await response.read(), '.wav')
+            raise ValueError("TTS failed")
+
+        except Exception as e:
+            logger.error(f"TTS failed: {e}")
+            raise
+
+    async def speech_to_text(self, audio_data: Union[bytes, AsyncIterator[bytes]]) -> str:
+        """Convert speech to text.
+
+        ``audio_data`` may be bytes or an async iterator of chunks; the
+        latter is sent upstream as a chunked body without being buffered.
+        """
+        try:
+            if isinstance(audio_data, (bytes, bytearray)):
+                if len(audio_data) > MAX_AUDIO_BYTES:
+                    raise UploadTooLarge(f"Upload exceeds {MAX_AUDIO_BYTES} bytes")
+                response = await self._post(STT_MODEL, data=audio_data)
+            else:
+                upload = _Upload(audio_data)
+                try:
+                    response = await self._post(STT_MODEL, retries=False, data=upload.body())
+                except Exception:
+                    if upload.too_large:
+                        raise UploadTooLarge(f"Upload exceeds {MAX_AUDIO_BYTES} bytes") from None
+                    raise
+
+            if response.status == 200:
+                result = await response.json(content_type=None)
+                return result.get('text', '')
+            raise ValueError("STT failed")
+
+        except Exception as e:
+            logger.error(f"STT failed: {e}")
+            raise
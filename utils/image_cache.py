@@ -0,0 +1,128 @@
+import os
+import json
+import time
+import sqlite3
+import hashlib
+import logging
+import threading
+from typing import Any, Dict, Optional
+from utils.file_store import FileStore
+from utils.timing import timed
+
+logger = logging.getLogger(__name__)
+
+class ImageCache:
+    """Content-addressed store for generated images.
+
+    A request key (model, enhanced prompt, parameters) maps to a file named
+    after the SHA-256 of its bytes, so identical renders share one file.
+    The SQLite index is shared by every worker; once the files exceed
+    ``max_bytes`` the least recently used ones are deleted.
+    """
+
+    def __init__(self, store: FileStore, index_path: Optional[str] = None,
+                 max_bytes: int = 1024 * 1024 * 1024):
+        self.store = store
+        self.index_path = index_path or os.path.join(store.root, 'image_cache.sqlite')
+        self.max_bytes = max_bytes
+        self._local = threading.local()
+        self.hits = 0
+        self.misses = 0
+        self.dedups = 0
+        self.evictions = 0
+
+    def _connect(self) -> sqlite3.Connection:
+        """One connection per thread and process, created on first use"""
+        conn = getattr(self._local, 'conn', None)
+        if conn is None or getattr(self._local, 'pid', None) != os.getpid():
+            os.makedirs(os.path.dirname(self.index_path) or '.', exist_ok=True)
+            conn = sqlite3.connect(self.index_path, timeout=5)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS requests (request_key TEXT PRIMARY KEY, filename TEXT NOT NULL)"
+            )
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS files (filename TEXT PRIMARY KEY, size INTEGER NOT NULL, last_used REAL NOT NULL)"
+            )
+            conn.execute("CREATE INDEX IF NOT EXISTS files_last_used ON files (last_used)")
+            conn.commit()
+            self._local.conn = conn
+            self._local.pid = os.getpid()
+        return conn
+
+    @staticmethod
+    def request_key(model: str, prompt: str, parameters: Optional[Dict[str, Any]] = None) -> str:
+        payload = json.dumps({"model": model, "prompt": prompt, "parameters": parameters or {}}, sort_keys=True)
+        return hashlib.sha256(payload.encode('utf-8')).hexdigest()
+
+    def get(self, model: str, prompt: str, parameters: Optional[Dict[str, Any]] = None) -> Optional[str]:
+        """Filename of a previous render of this request, if it is still on disk"""
+        key = self.request_key(model, prompt, parameters)
+        try:
+            conn = self._connect()
+            row = conn.execute("SELECT filename FROM requests WHERE request_key = ?", (key,)).fetchone()
+            if row and self.store.exists(row[0]):
+                conn.execute("UPDATE files SET last_used = ? WHERE filename = ?", (time.time(), row[0]))
+                conn.commit()
+                self.hits += 1
+                return row[0]
+        except sqlite3.Error as e:
+            logger.warning(f"Image cache lookup failed: {e}")
+        self.misses += 1
+        return None
+
+    @timed('disk')
+    def put(self, model: str, prompt: str, data: bytes, extension: str,
+            parameters: Optional[Dict[str, Any]] = None) -> str:
+        """Store rendered bytes and return their content-addressed filename"""
+        filename = f"{hashlib.sha256(data).hexdigest()}{extension}"
+        if self.store.exists(filename):
+            self.dedups += 1
+        else:
+            self.store.save(data, extension, filename)
+
+        try:
+            conn = self._connect()
+            conn.execute(
+                "INSERT OR REPLACE INTO requests (request_key, filename) VALUES (?, ?)",
+                (self.request_key(model, prompt, parameters), filename)
+            )
+            conn.execute(
+                "INSERT OR REPLACE INTO files (filename, size, last_used) VALUES (?, ?, ?)",
+                (filename, len(data), time.time())
+            )
+            conn.commit()
+            self._evict(conn, keep=filename)
+        except sqlite3.Error as e:
+            logger.warning(f"Image cache index update failed: {e}")
+        return filename
+
+    def _evict(self, conn: sqlite3.Connection, keep: str):
+        """Delete least recently used files until the cache fits in max_bytes"""
+        total = conn.execute("SELECT COALESCE(SUM(size), 0) FROM files").fetchone()[0]
+        if total <= self.max_bytes:
+            return
+        rows = conn.execute("SELECT filename, size FROM files ORDER BY last_used").fetchall()
+        for filename, size in rows:
+            if total <= self.max_bytes:
+                break
+            if filename == keep:
+                continue
+            self.store.delete(filename)
+            conn.execute("DELETE FROM files WHERE filename = ?", (filename,))
+            conn.execute("DELETE FROM requests WHERE filename = ?", (filename,))
+            total -= size
+            self.evictions += 1
+        conn.commit()
+
+    def stats(self) -> dict:
+        stats = {"hits": self.hits, "misses": self.misses, "dedups": self.dedups, "evictions": self.evictions}
+        try:
+            files, size = self._connect().execute(
+                "SELECT COUNT(*), COALESCE(SUM(size), 0) FROM files"
+            ).fetchone()
+            stats.update({"files": files, "bytes": size, "max_bytes": self.max_bytes})
+        except sqlite3.Error as e:
+            logger.warning(f"Image cache stats failed: {e}")
+        return stats
@@ -0,0 +1,272 @@
+import os
+import json
+import time
+import uuid
+import sqlite3
+import logging
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable, Dict, Optional
+from urllib.parse import urlparse
+
+logger = logging.getLogger(__name__)
+
+# Background job settings
+JOBS_DB_PATH = os.environ.get('JOBS_DB_PATH', os.path.join('temp', 'jobs.sqlite'))
+JOB_WORKERS = int(os.environ.get('JOB_WORKERS', '2'))
+JOB_MAX_QUEUE = int(os.environ.get('JOB_MAX_QUEUE', '20'))
+# Workers refresh updated_at on the jobs they hold this often; a queued or
+# running job not refreshed for JOB_STALE_AFTER seconds is taken over, even
+# if its owner_pid now belongs to some other live process
+JOB_HEARTBEAT_INTERVAL = float(os.environ.get('JOB_HEARTBEAT_INTERVAL', '10'))
+JOB_STALE_AFTER = float(os.environ.get('JOB_STALE_AFTER', '60'))
+JOB_WEBHOOK_ALLOWED_HOSTS = [
+    host.strip() for host in os.environ.get('JOB_WEBHOOK_ALLOWED_HOSTS', '').split(',') if host.strip()
+]
+
+class QueueFull(Exception):
+    """Raised when the job queue is at its maximum depth"""
+
+class JobQueue:
+    """Bounded background job runner with state persisted in SQLite.
+
+    Jobs are claimed atomically, so several gunicorn workers can share one
+    database. Each worker heartbeats the jobs it holds and runs ``recover``
+    on the same timer, which picks up jobs whose owner has died or stopped
+    heartbeating. A pid alone is not trusted: after a restart it may belong
+    to an unrelated process.
+    """
+
+    def __init__(self, db_path: str = JOBS_DB_PATH, workers: int = JOB_WORKERS, max_depth: int = JOB_MAX_QUEUE):
+        self.db_path = db_path
+        self.workers = workers
+        self.max_depth = max_depth
+        self.handlers: Dict[str, Callable[[Dict[str, Any]], Dict[str, Any]]] = {}
+        self._local = threading.local()
+        self._executor = None
+        self._executor_pid = None
+        self._owned = set()  # ids queued on or running in this process's pool
+        self._lock = threading.Lock()
+
+    def _connect(self) -> sqlite3.Connection:
+        """One connection per thread and process, created on first use"""
+        conn = getattr(self._local, 'conn', None)
+        if conn is None or getattr(self._local, 'pid', None) != os.getpid():
+            os.makedirs(os.path.dirname(self.db_path) or '.', exist_ok=True)
+            conn = sqlite3.connect(self.db_path, timeout=5)
+            conn.row_factory = sqlite3.Row
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS jobs ("
+                "id TEXT PRIMARY KEY, kind TEXT NOT NULL, payload TEXT NOT NULL, "
+                "status TEXT NOT NULL, result TEXT, error TEXT, webhook_url TEXT, "
+                "owner_pid INTEGER, created_at REAL NOT NULL, updated_at REAL NOT NULL)"
+            )
+            conn.execute("CREATE INDEX IF NOT EXISTS jobs_status ON jobs (status)")
+            conn.commit()
+            self._local.conn = conn
+            self._local.pid = os.getpid()
+        return conn
+
+    def _get_executor(self) -> ThreadPoolExecutor:
+        """Worker threads do not survive a fork, so build the pool and heartbeat per process"""
+        pid = os.getpid()
+        if self._executor is None or self._executor_pid != pid:
+            with self._lock:
+                if self._executor is None or self._executor_pid != pid:
+                    self._executor = ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix='job')
+                    self._executor_pid = pid
+                    self._owned = set()
+                    threading.Thread(target=self._heartbeat_loop, name='job-heartbeat', daemon=True).start()
+        return self._executor
+
+    def _heartbeat_loop(self):
+        while True:
+            time.sleep(JOB_HEARTBEAT_INTERVAL)
+            try:
+                self.heartbeat()
+                self.recover()
+            except Exception as e:
+                logger.error(f"Job heartbeat failed: {e}")
+
+    def heartbeat(self):
+        """Mark the jobs this process holds as still owned"""
+        with self._lock:
+            owned = list(self._owned)
+        if not owned:
+            return
+        conn = self._connect()
+        conn.execute(
+            f"UPDATE jobs SET updated_at = ? WHERE status IN ('queued', 'running') "
+            f"AND id IN ({', '.join('?' * len(owned))})",
+            (time.time(), *owned)
+        )
+        conn.commit()
+
+    def register(self, kind: str, handler: Callable[[Dict[str, Any]], Dict[str, Any]]):
+        """Register the function that runs jobs of a kind"""
+        self.handlers[kind] = handler
+
+    def depth(self) -> int:
+        return self._connect().execute(
+            "SELECT COUNT(*) FROM jobs WHERE status IN ('queued', 'running')"
+        ).fetchone()[0]
+
+    def submit(self, kind: str, payload: Dict[str, Any], webhook_url: Optional[str] = None) -> str:
+        """Queue a job and return its id, or raise QueueFull"""
+        if kind not in self.handlers:
+            raise ValueError(f"Unknown job kind: {kind}")
+
+        job_id = str(uuid.uuid4())
+        now = time.time()
+        executor = self._get_executor()
+        conn = self._connect()
+        # Held before the row exists, so this process's own recover never claims it
+        self._own(job_id)
+        # Count and insert under one write lock, so concurrent submits from
+        # other threads or workers cannot all pass the depth check
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            if self.depth() >= self.max_depth:
+                raise QueueFull("Job queue is full")
+            conn.execute(
+                "INSERT INTO jobs (id, kind, payload, status, webhook_url, owner_pid, created_at, updated_at) "
+                "VALUES (?, ?, ?, 'queued', ?, ?, ?, ?)",
+                (job_id, kind, json.dumps(payload), webhook_url, os.getpid(), now, now)
+            )
+            conn.commit()
+        except BaseException:
+            conn.rollback()
+            self._disown(job_id)
+            raise
+        executor.submit(self._run, job_id)
+        return job_id
+
+    def _own(self, job_id: str):
+        with self._lock:
+            self._owned.add(job_id)
+
+    def _disown(self, job_id: str):
+        with self._lock:
+            self._owned.discard(job_id)
+
+    def get(self, job_id: str) -> Optional[Dict[str, Any]]:
+        row = self._connect().execute("SELECT * FROM jobs WHERE id = ?", (job_id,)).fetchone()
+        if row is None:
+            return None
+        job = {
+            "id": row['id'],
+            "kind": row['kind'],
+            "status": row['status'],
+            "created_at": row['created_at'],
+            "updated_at": row['updated_at']
+        }
+        if row['result']:
+            job["result"] = json.loads(row['result'])
+        if row['error']:
+            job["error"] = row['error']
+        return job
+
+    def recover(self) -> int:
+        """Resubmit jobs whose owner died or stopped heartbeating"""
+        executor = self._get_executor()
+        conn = self._connect()
+        rows = conn.execute(
+            "SELECT id, status, owner_pid, updated_at FROM jobs WHERE status IN ('queued', 'running')"
+        ).fetchall()
+        with self._lock:
+            owned = set(self._owned)
+        now = time.time()
+        recovered = 0
+        for row in rows:
+            if row['id'] in owned:
+                continue
+            fresh = now - row['updated_at'] < JOB_STALE_AFTER
+            # A job under this pid but not in _owned is from before a restart
+            if fresh and row['owner_pid'] != os.getpid() and _pid_alive(row['owner_pid']):
+                continue
+            # Only one worker wins the claim, and a heartbeat since the read voids it
+            self._own(row['id'])
+            cursor = conn.execute(
+                "UPDATE jobs SET status = 'queued', owner_pid = ?, updated_at = ? "
+                "WHERE id = ? AND status = ? AND owner_pid IS ? AND updated_at = ?",
+                (os.getpid(), time.time(), row['id'], row['status'], row['owner_pid'], row['updated_at'])
+            )
+            conn.commit()
+            if cursor.rowcount == 1:
+                executor.submit(self._run, row['id'])
+                recovered += 1
+            else:
+                self._disown(row['id'])
+        if recovered:
+            logger.info(f"Recovered {recovered} background jobs")
+        return recovered
+
+    def _run(self, job_id: str):
+        try:
+            self._execute(job_id)
+        finally:
+            self._disown(job_id)
+
+    def _execute(self, job_id: str):
+        conn = self._connect()
+        cursor = conn.execute(
+            "UPDATE jobs SET status = 'running', owner_pid = ?, updated_at = ? WHERE id = ? AND status = 'queued'",
+            (os.getpid(), time.time(), job_id)
+        )
+        conn.commit()
+        if cursor.rowcount != 1:
+            return
+
+        row = conn.execute("SELECT kind, payload FROM jobs WHERE id = ?", (job_id,)).fetchone()
+        try:
+            result = self.handlers[row['kind']](json.loads(row['payload']))
+            conn.execute(
+                "UPDATE jobs SET status = 'succeeded', result = ?, updated_at = ? WHERE id = ?",
+                (json.dumps(result), time.time(), job_id)
+            )
+        except Exception as e:
+            logger.error(f"Job {job_id} failed: {e}")
+            conn.execute(
+                "UPDATE jobs SET status = 'failed', error = ?, updated_at = ? WHERE id = ?",
+                (str(e), time.time(), job_id)
+            )
+        conn.commit()
+        self._notify(job_id)
+
+    def _notify(self, job_id: str):
+        """POST the finished job to its webhook, if one was given"""
+        row = self._connect().execute("SELECT webhook_url FROM jobs WHERE id = ?", (job_id,)).fetchone()
+        if not row or not row['webhook_url']:
+            return
+        from utils.hf_client import get_session
+        try:
+            get_session().post(row['webhook_url'], json=self.get(job_id), timeout=10)
+        except Exception as e:
+            logger.warning(f"Webhook for job {job_id} failed: {e}")
+
+    def stats(self) -> dict:
+        rows = self._connect().execute("SELECT status, COUNT(*) FROM jobs GROUP BY status").fetchall()
+        return {
+            "by_status": {status: count for status, count in rows},
+            "max_depth": self.max_depth,
+            "workers": self.workers
+        }
+
+def webhook_allowed(url: str) -> bool:
+    """Only http(s) webhooks to explicitly allowed hosts are called"""
+    parsed = urlparse(url)
+    return parsed.scheme in ('http', 'https') and parsed.hostname in JOB_WEBHOOK_ALLOWED_HOSTS
+
+def _pid_alive(pid: Optional[int]) -> bool:
+    if not pid:
+        return False
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        return True
+    return True
+
+job_queue = JobQueue()
@@ -0,0 +1,154 @@
+import os
+import threading
+from collections import deque
+from concurrent.futures import Future, ThreadPoolExecutor, FIRST_COMPLETED, wait
+from typing import Any, Callable, Dict, Optional
+
+from utils.metrics import registry
+from utils.scheduler import bind
+from utils.deadline import HF_CALL_DEADLINE, deadline, remaining
+
+HEDGED_REQUESTS = registry.counter('ethio_upstream_hedged_total', 'Hedged upstream calls by which attempt won',
+                                   ['model', 'winner'])
+
+class LatencyTracker:
+    """Rolling latency percentiles per model, from the last ``window`` successful calls"""
+
+    def __init__(self, window: int = 200, min_samples: int = 20):
+        self.window = window
+        self.min_samples = min_samples
+        self._samples: Dict[str, deque] = {}
+        self._lock = threading.Lock()
+
+    def record(self, model: str, seconds: float):
+        with self._lock:
+            samples = self._samples.get(model)
+            if samples is None:
+                samples = self._samples[model] = deque(maxlen=self.window)
+            samples.append(seconds)
+
+    def percentile(self, model: str, q: float) -> Optional[float]:
+        """The q-th percentile (0-100), or None until min_samples calls are seen"""
+        with self._lock:
+            samples = self._samples.get(model)
+            if samples is None or len(samples) < self.min_samples:
+                return None
+            ordered = sorted(samples)
+        return ordered[min(len(ordered) - 1, int(len(ordered) * q / 100))]
+
+    def timeout(self, model: str, default: float, floor: float, multiplier: float = 3) -> float:
+        """A read timeout of multiplier x p99, kept between floor and default"""
+        p99 = self.percentile(model, 99)
+        if p99 is None:
+            return default
+        return min(default, max(floor, p99 * multiplier))
+
+    def stats(self) -> dict:
+        with self._lock:
+            models = list(self._samples)
+        stats = {}
+        for model in models:
+            p50, p95, p99 = (self.percentile(model, q) for q in (50, 95, 99))
+            stats[model] = {
+                "samples": len(self._samples[model]),
+                "p50": round(p50, 3) if p50 is not None else None,
+                "p95": round(p95, 3) if p95 is not None else None,
+                "p99": round(p99, 3) if p99 is not None else None
+            }
+        return stats
+
+class Hedger:
+    """Send a backup attempt when the first one runs past the model's p95.
+
+    Whichever attempt answers first wins; the loser finishes in the
+    background and its result is dropped. At most ``budget`` of calls are
+    hedged, so a slow model cannot double its own load. Both attempts
+    share one HF_CALL_DEADLINE, and when every pool thread is busy the
+    call runs inline without a backup rather than queueing.
+    """
+
+    def __init__(self, tracker: LatencyTracker, max_workers: int = 32, budget: float = 0.1):
+        self.tracker = tracker
+        self.max_workers = max_workers
+        self.budget = budget
+        self.calls = 0
+        self.hedges = 0
+        self.running = 0
+        self._executor = None
+        self._pid = None
+        self._lock = threading.Lock()
+
+    def _pool(self) -> ThreadPoolExecutor:
+        """One pool per process, rebuilt after a fork"""
+        if self._pid != os.getpid():
+            with self._lock:
+                if self._pid != os.getpid():
+                    self._executor = ThreadPoolExecutor(self.max_workers, thread_name_prefix='hf-hedge')
+                    self.running = 0
+                    self._pid = os.getpid()
+        return self._executor
+
+    def _submit(self, fn: Callable[[], Any]) -> Optional[Future]:
+        """Start fn on a free pool thread; None when all are busy"""
+        pool = self._pool()
+        with self._lock:
+            if self.running >= self.max_workers:
+                return None
+            self.running += 1
+        future = pool.submit(fn)
+        future.add_done_callback(self._finished)
+        return future
+
+    def _finished(self, future: Future):
+        with self._lock:
+            self.running -= 1
+
+    def _may_hedge(self) -> bool:
+        with self._lock:
+            if self.hedges >= self.budget * self.calls:
+                return False
+            self.hedges += 1
+            return True
+
+    def call(self, model: str, fn: Callable[[], Any]) -> Any:
+        delay = self.tracker.percentile(model, 95)
+        with self._lock:
+            self.calls += 1
+        if delay is None:
+            return fn()
+
+        with deadline(HF_CALL_DEADLINE):
+            # Both attempts are scheduled as the caller's client, under this deadline
+            fn = bind(fn)
+            primary = self._submit(fn)
+            if primary is None:
+                return fn()
+            done, _ = wait([primary], timeout=min(delay, max(remaining(), 0)))
+            backup = None
+            if not done and self._may_hedge():
+                backup = self._submit(fn)
+                if backup is None:
+                    with self._lock:
+                        self.hedges -= 1
+            if backup is None:
+                done, _ = wait([primary], timeout=max(remaining(), 0))
+                if not done:
+                    raise TimeoutError(f"{model}: call deadline exceeded")
+                return primary.result()
+
+            pending = {primary, backup}
+            error = None
+            while pending:
+                done, pending = wait(pending, timeout=max(remaining(), 0), return_when=FIRST_COMPLETED)
+                if not done:
+                    raise TimeoutError(f"{model}: call deadline exceeded")
+                for future in done:
+                    if future.exception() is None:
+                        HEDGED_REQUESTS.inc(model=model, winner='primary' if future is primary else 'backup')
+                        return future.result()
+                    error = future.exception()
+            raise error
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {"calls": self.calls, "hedges": self.hedges, "budget": self.budget}
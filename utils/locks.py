@@ -0,0 +1,110 @@
+import os
+import stat
+import fcntl
+import logging
+import threading
+from typing import Optional
+
+logger = logging.getLogger(__name__)
+
+def private_dir(path: str) -> bool:
+    """Create path 0700, or check an existing one is ours and closed to others.
+
+    Lock and result files in a directory another local user controls could
+    be planted or held, so callers fall back to per-process state when
+    this returns False.
+    """
+    try:
+        os.makedirs(path, mode=0o700, exist_ok=True)
+        info = os.lstat(path)
+        if not stat.S_ISDIR(info.st_mode) or info.st_uid != os.geteuid():
+            logger.warning(f"{path} is not a directory owned by this user; not sharing state between workers")
+            return False
+        if info.st_mode & 0o077:
+            os.chmod(path, 0o700)
+        return True
+    except OSError as e:
+        logger.warning(f"{path} unusable ({e}); not sharing state between workers")
+        return False
+
+class LocalSemaphore:
+    """Non-blocking counting semaphore for one process"""
+
+    def __init__(self, limit: int):
+        self.limit = limit
+        self._free = list(range(limit))
+        self._lock = threading.Lock()
+
+    def acquire(self) -> Optional[int]:
+        """A slot number, or None if all are taken"""
+        with self._lock:
+            return self._free.pop() if self._free else None
+
+    def release(self, slot: int):
+        with self._lock:
+            self._free.append(slot)
+
+    def in_use(self) -> int:
+        with self._lock:
+            return self.limit - len(self._free)
+
+class HostSemaphore:
+    """Non-blocking counting semaphore shared by every process on the host.
+
+    Slot ``i`` is byte ``i`` of a lock file, held with a POSIX record lock.
+    The kernel drops a process's locks when it exits, so a crashed worker
+    cannot leak slots. Record locks do not exclude threads of the same
+    process, so the slots this process holds are tracked here too.
+    """
+
+    def __init__(self, path: str, limit: int):
+        self.path = path
+        self.limit = limit
+        self._held = set()
+        self._fd = None
+        self._pid = None
+        self._lock = threading.Lock()
+
+    def _file(self) -> int:
+        """One descriptor per process: closing any descriptor of the file drops its locks"""
+        if self._pid != os.getpid():
+            self._fd = os.open(self.path, os.O_RDWR | os.O_CREAT, 0o600)
+            self._pid = os.getpid()
+            self._held = set()
+        return self._fd
+
+    def acquire(self) -> Optional[int]:
+        with self._lock:
+            fd = self._file()
+            for slot in range(self.limit):
+                if slot in self._held:
+                    continue
+                try:
+                    fcntl.lockf(fd, fcntl.LOCK_EX | fcntl.LOCK_NB, 1, slot)
+                except OSError:
+                    continue
+                self._held.add(slot)
+                return slot
+            return None
+
+    def release(self, slot: int):
+        with self._lock:
+            if self._pid == os.getpid() and slot in self._held:
+                fcntl.lockf(self._fd, fcntl.LOCK_UN, 1, slot)
+                self._held.discard(slot)
+
+    def in_use(self) -> int:
+        """Slots held by any process on the host"""
+        with self._lock:
+            fd = self._file()
+            used = len(self._held)
+            for slot in range(self.limit):
+                if slot in self._held:
+                    continue
+                try:
+                    fcntl.lockf(fd, fcntl.LOCK_EX | fcntl.LOCK_NB, 1, slot)
+                except OSError:
+                    used += 1
+                    continue
+                fcntl.lockf(fd, fcntl.LOCK_UN, 1, slot)
+            return used
@@ -0,0 +1,129 @@
+import os
+import re
+import logging
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable, Dict, Iterable, Iterator, List, Optional
+
+from utils.cache import LRUCache
+from utils.scheduler import bind
+
+logger = logging.getLogger(__name__)
+
+# Sections are generated concurrently on one bounded pool per worker; keep
+# it within the chat model's bulkhead (HF_MODEL_CONCURRENCY)
+WRITER_SECTION_WORKERS = int(os.environ.get('WRITER_SECTION_WORKERS', '4'))
+WRITER_SECTIONS = int(os.environ.get('WRITER_SECTIONS', '4'))
+WRITER_CACHE_ENTRIES = int(os.environ.get('WRITER_CACHE_ENTRIES', '2000'))
+WRITER_CACHE_BYTES = int(os.environ.get('WRITER_CACHE_BYTES', str(8 * 1024 * 1024)))
+WRITER_CACHE_TTL = float(os.environ.get('WRITER_CACHE_TTL', '3600'))
+
+# Used when the model's outline is unusable, which for DialoGPT is often
+DEFAULT_OUTLINES = {
+    'blog': ["Introduction", "Why it matters", "Key ideas", "Practical tips", "Common mistakes", "Conclusion"],
+    'cover_letter': ["Opening", "Relevant experience", "Why this role", "Closing"],
+    'resume': ["Professional summary", "Core strengths", "Achievements", "Career goals"],
+    'social': ["Hook", "Main message", "Call to action"]
+}
+GENERIC_OUTLINE = ["Introduction", "Background", "Main points", "Examples", "Conclusion"]
+
+def build_outline_prompt(content_type: str, topic: str, tone: str, count: int) -> str:
+    return f"List {count} section headings for a {tone} {content_type.replace('_', ' ')} about: {topic}. One per line."
+
+def build_section_prompt(content_type: str, topic: str, tone: str, title: str) -> str:
+    return (f"Write the \"{title}\" section of a {tone} {content_type.replace('_', ' ')} "
+            f"about: {topic}. Write a few paragraphs of prose.")
+
+def parse_outline(text: str, count: int) -> List[str]:
+    """Headings from a numbered or bulleted list; [] if it does not look like one"""
+    headings = []
+    for line in text.splitlines():
+        heading = re.sub(r'^\s*(?:[-*•]|\d+[.)])\s*', '', line).strip().strip('#').strip()
+        if 2 < len(heading) <= 80 and heading.lower() not in (h.lower() for h in headings):
+            headings.append(heading)
+    return headings[:count] if len(headings) >= 2 else []
+
+class LongFormWriter:
+    """Outline-then-sections generation for long content.
+
+    Sections run concurrently on a bounded per-process pool and are
+    yielded in outline order as soon as each one (and all before it) is
+    done, so wall time tracks the slowest section rather than the sum.
+    Outlines and sections are cached by prompt; ``regenerate`` bypasses
+    the cache for chosen sections only.
+    """
+
+    def __init__(self, complete: Callable[[str], str], is_failure: Callable[[str], bool],
+                 cache: LRUCache, max_workers: int = WRITER_SECTION_WORKERS):
+        self.complete = complete
+        self.is_failure = is_failure
+        self.cache = cache
+        self.max_workers = max_workers
+        self._executor = None
+        self._pid = None
+        self._lock = threading.Lock()
+
+    def _pool(self) -> ThreadPoolExecutor:
+        """One pool per process, rebuilt after a fork"""
+        if self._pid != os.getpid():
+            with self._lock:
+                if self._pid != os.getpid():
+                    self._executor = ThreadPoolExecutor(self.max_workers, thread_name_prefix='writer-section')
+                    self._pid = os.getpid()
+        return self._executor
+
+    def outline(self, content_type: str, topic: str, tone: str, count: int = WRITER_SECTIONS) -> List[str]:
+        prompt = build_outline_prompt(content_type, topic, tone, count)
+        cached = self.cache.get(prompt)
+        if cached is not None:
+            return cached.split('\n')
+
+        headings = parse_outline(self.complete(prompt), count)
+        if not headings:
+            headings = DEFAULT_OUTLINES.get(content_type, GENERIC_OUTLINE)[:count]
+        self.cache.set(prompt, '\n'.join(headings))
+        return headings
+
+    def _section(self, prompt: str, refresh: bool) -> Dict[str, Any]:
+        if not refresh:
+            cached = self.cache.get(prompt)
+            if cached is not None:
+                return {"content": cached, "cached": True}
+        content = self.complete(prompt)
+        if self.is_failure(content):
+            return {"content": content, "cached": False, "error": True}
+        self.cache.set(prompt, content)
+        return {"content": content, "cached": False}
+
+    def sections(self, content_type: str, topic: str, tone: str, outline: List[str],
+                 regenerate: Iterable[int] = ()) -> Iterator[Dict[str, Any]]:
+        """Yield {index, title, content, cached} per section, in outline order"""
+        regenerate = set(regenerate)
+        pool = self._pool()
+        section = bind(self._section)
+        futures = [
+            pool.submit(section, build_section_prompt(content_type, topic, tone, title), index in regenerate)
+            for index, title in enumerate(outline)
+        ]
+        try:
+            for index, (title, future) in enumerate(zip(outline, futures)):
+                yield dict(future.result(), index=index, title=title)
+        finally:
+            # The client went away or a section failed; drop work not yet started
+            for future in futures:
+                future.cancel()
+
+    def stats(self) -> dict:
+        return dict(self.cache.stats(), workers=self.max_workers)
+
+def assemble(sections: List[Dict[str, Any]]) -> str:
+    """Join sections into one document under their headings"""
+    return "\n\n".join(f"{section['title']}\n\n{section['content']}" for section in sections)
+
+def parse_regenerate(value: Any, count: int) -> Optional[List[int]]:
+    """Section indexes to regenerate, or None if the value is malformed"""
+    if value is None:
+        return []
+    if not isinstance(value, list) or not all(isinstance(i, int) and 0 <= i < count for i in value):
+        return None
+    return value
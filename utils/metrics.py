@@ -0,0 +1,266 @@
+import os
+import json
+import time
+import logging
+import tempfile
+import threading
+from typing import Dict, Iterable, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+# Each worker writes its samples here; /api/admin/metrics merges them.
+# gunicorn.conf.py wipes it when the master starts, as with
+# prometheus_client's multiprocess mode.
+METRICS_DIR = os.environ.get('METRICS_DIR', os.path.join(tempfile.gettempdir(), 'ethio-gpt-metrics'))
+METRICS_FLUSH_INTERVAL = float(os.environ.get('METRICS_FLUSH_INTERVAL', '2'))
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 20, 30, 60, 120)
+SIZE_BUCKETS = (256, 1024, 4096, 16384, 65536, 262144, 1048576, 4194304, 16777216)
+
+class Metric:
+    """A named family of samples; label values are passed as keyword arguments"""
+
+    def __init__(self, registry: 'MetricsRegistry', name: str, help: str, kind: str,
+                 labelnames: Iterable[str], buckets: Optional[Tuple[float, ...]] = None):
+        self.registry = registry
+        self.name = name
+        self.help = help
+        self.kind = kind
+        self.labelnames = tuple(labelnames)
+        self.buckets = buckets
+
+    def _key(self, labels: Dict[str, str]) -> Tuple[str, ...]:
+        return tuple(str(labels.get(name, '')) for name in self.labelnames)
+
+    def inc(self, amount: float = 1, **labels):
+        self.registry._add(self, self._key(labels), amount)
+
+    def dec(self, amount: float = 1, **labels):
+        self.registry._add(self, self._key(labels), -amount)
+
+    def observe(self, value: float, **labels):
+        self.registry._observe(self, self._key(labels), value)
+
+class MetricsRegistry:
+    """Counters, gauges and histograms aggregated across worker processes"""
+
+    def __init__(self, directory: Optional[str] = METRICS_DIR, flush_interval: float = METRICS_FLUSH_INTERVAL):
+        self.directory = directory
+        self.flush_interval = flush_interval
+        self.metrics: Dict[str, Metric] = {}
+        self._values: Dict[str, Dict[Tuple[str, ...], object]] = {}
+        self._lock = threading.Lock()
+        self._flusher_pid = None
+
+    def _register(self, name, help, kind, labelnames, buckets=None) -> Metric:
+        metric = Metric(self, name, help, kind, labelnames, buckets)
+        self.metrics[name] = metric
+        self._values[name] = {}
+        return metric
+
+    def counter(self, name: str, help: str, labelnames: Iterable[str] = ()) -> Metric:
+        return self._register(name, help, 'counter', labelnames)
+
+    def gauge(self, name: str, help: str, labelnames: Iterable[str] = ()) -> Metric:
+        return self._register(name, help, 'gauge', labelnames)
+
+    def histogram(self, name: str, help: str, labelnames: Iterable[str] = (),
+                  buckets: Tuple[float, ...] = LATENCY_BUCKETS) -> Metric:
+        return self._register(name, help, 'histogram', labelnames, buckets)
+
+    def _add(self, metric: Metric, key: Tuple[str, ...], amount: float):
+        self._ensure_flusher()
+        with self._lock:
+            values = self._values[metric.name]
+            values[key] = values.get(key, 0) + amount
+
+    def _observe(self, metric: Metric, key: Tuple[str, ...], value: float):
+        self._ensure_flusher()
+        with self._lock:
+            values = self._values[metric.name]
+            sample = values.get(key)
+            if sample is None:
+                sample = values[key] = {"buckets": [0] * len(metric.buckets), "sum": 0.0, "count": 0}
+            for i, bound in enumerate(metric.buckets):
+                if value <= bound:
+                    sample["buckets"][i] += 1
+            sample["sum"] += value
+            sample["count"] += 1
+
+    def snapshot(self) -> dict:
+        """This process's samples in a JSON-friendly form"""
+        with self._lock:
+            return {
+                name: [[list(key), dict(value, buckets=list(value["buckets"])) if isinstance(value, dict) else value]
+                       for key, value in values.items()]
+                for name, values in self._values.items()
+            }
+
+    def _ensure_flusher(self):
+        """Start one flush thread per process, after any fork"""
+        if not self.directory or self._flusher_pid == os.getpid():
+            return
+        with self._lock:
+            if self._flusher_pid == os.getpid():
+                return
+            self._flusher_pid = os.getpid()
+        threading.Thread(target=self._flush_loop, name='metrics-flush', daemon=True).start()
+
+    def _flush_loop(self):
+        while True:
+            time.sleep(self.flush_interval)
+            try:
+                self.flush()
+            except Exception as e:
+                logger.warning(f"Metrics flush failed: {e}")
+
+    def flush(self):
+        if not self.directory:
+            return
+        os.makedirs(self.directory, exist_ok=True)
+        path = os.path.join(self.directory, f"{os.getpid()}.json")
+        # The flusher thread and a render in a request thread can both flush
+        tmp_path = f"{path}.{threading.get_ident()}.tmp"
+        with open(tmp_path, 'w') as f:
+            json.dump(self.snapshot(), f)
+        os.replace(tmp_path, path)
+
+    def _load_snapshots(self) -> Iterable[Tuple[int, dict]]:
+        if not self.directory:
+            yield os.getpid(), self.snapshot()
+            return
+        self.flush()
+        for entry in os.scandir(self.directory):
+            if not entry.name.endswith('.json'):
+                continue
+            try:
+                with open(entry.path) as f:
+                    yield int(entry.name[:-5]), json.load(f)
+            except (OSError, ValueError):
+                continue
+
+    def clear(self):
+        """Remove every worker's snapshot; call before any worker starts"""
+        if not self.directory or not os.path.isdir(self.directory):
+            return
+        for entry in os.scandir(self.directory):
+            if entry.name.endswith(('.json', '.tmp')):
+                try:
+                    os.remove(entry.path)
+                except OSError:
+                    pass
+
+    def collect(self) -> Dict[str, Dict[Tuple[str, ...], object]]:
+        """Merge live workers' samples.
+
+        A dead worker's snapshot is deleted rather than merged: its file
+        would otherwise be counted forever, and a new worker reusing its
+        pid would overwrite it. Counters therefore reset when a worker is
+        replaced, which Prometheus' rate() handles.
+        """
+        merged = {name: {} for name in self.metrics}
+        for pid, snapshot in self._load_snapshots():
+            if not _pid_alive(pid):
+                try:
+                    os.remove(os.path.join(self.directory, f"{pid}.json"))
+                except OSError:
+                    pass
+                continue
+            for name, samples in snapshot.items():
+                metric = self.metrics.get(name)
+                if metric is None:
+                    continue
+                values = merged[name]
+                for key, value in samples:
+                    key = tuple(key)
+                    if metric.kind == 'histogram':
+                        current = values.setdefault(key, {"buckets": [0] * len(metric.buckets), "sum": 0.0, "count": 0})
+                        current["buckets"] = [a + b for a, b in zip(current["buckets"], value["buckets"])]
+                        current["sum"] += value["sum"]
+                        current["count"] += value["count"]
+                    else:
+                        values[key] = values.get(key, 0) + value
+        return merged
+
+    def render(self) -> str:
+        """Prometheus text exposition format"""
+        lines = []
+        for name, values in self.collect().items():
+            metric = self.metrics[name]
+            lines.append(f"# HELP {name} {metric.help}")
+            lines.append(f"# TYPE {name} {metric.kind}")
+            for key, value in sorted(values.items()):
+                labels = list(zip(metric.labelnames, key))
+                if metric.kind != 'histogram':
+                    lines.append(f"{name}{_format_labels(labels)} {_format_value(value)}")
+                    continue
+                for bound, count in zip(metric.buckets, value["buckets"]):
+                    lines.append(f"{name}_bucket{_format_labels(labels + [('le', _format_value(bound))])} {count}")
+                lines.append(f"{name}_bucket{_format_labels(labels + [('le', '+Inf')])} {value['count']}")
+                lines.append(f"{name}_sum{_format_labels(labels)} {_format_value(value['sum'])}")
+                lines.append(f"{name}_count{_format_labels(labels)} {value['count']}")
+        return "\n".join(lines) + "\n"
+
+def _format_labels(labels) -> str:
+    if not labels:
+        return ""
+    return "{" + ",".join(f'{name}="{_escape(value)}"' for name, value in labels) + "}"
+
+def _escape(value) -> str:
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+def _format_value(value: float) -> str:
+    return repr(float(value)) if isinstance(value, float) and not value.is_integer() else str(int(value))
+
+def _pid_alive(pid: int) -> bool:
+    if pid == os.getpid():
+        return True
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        return True
+    return True
+
+registry = MetricsRegistry()
+
+# Request path
+HTTP_REQUESTS = registry.counter('ethio_http_requests_total', 'HTTP requests handled', ['route', 'method', 'status'])
+HTTP_LATENCY = registry.histogram('ethio_http_request_duration_seconds', 'HTTP request latency', ['route', 'method'])
+HTTP_IN_FLIGHT = registry.gauge('ethio_http_requests_in_flight', 'HTTP requests being handled', ['route'])
+
+# Hugging Face upstream
+UPSTREAM_REQUESTS = registry.counter('ethio_upstream_requests_total', 'Upstream inference calls', ['model', 'status'])
+UPSTREAM_LATENCY = registry.histogram('ethio_upstream_request_duration_seconds', 'Upstream call latency', ['model'])
+UPSTREAM_IN_FLIGHT = registry.gauge('ethio_upstream_in_flight', 'Upstream calls in progress', ['model'])
+UPSTREAM_ERRORS = registry.counter('ethio_upstream_errors_total', 'Failed upstream calls', ['model', 'kind'])
+UPSTREAM_TIMEOUTS = registry.counter('ethio_upstream_timeouts_total', 'Upstream calls that timed out', ['model'])
+UPSTREAM_REQUEST_BYTES = registry.histogram('ethio_upstream_request_bytes', 'Upstream request payload size',
+                                            ['model'], SIZE_BUCKETS)
+UPSTREAM_RESPONSE_BYTES = registry.histogram('ethio_upstream_response_bytes', 'Upstream response payload size',
+                                             ['model'], SIZE_BUCKETS)
+
+class UpstreamTimer:
+    """Records one upstream call; call ``finish`` exactly once"""
+
+    def __init__(self, model: str, request_bytes: Optional[int] = None):
+        self.model = model
+        self.start = time.perf_counter()
+        UPSTREAM_IN_FLIGHT.inc(model=model)
+        if request_bytes is not None:
+            UPSTREAM_REQUEST_BYTES.observe(request_bytes, model=model)
+
+    def finish(self, status, response_bytes: Optional[int] = None):
+        UPSTREAM_IN_FLIGHT.dec(model=self.model)
+        UPSTREAM_LATENCY.observe(time.perf_counter() - self.start, model=self.model)
+        UPSTREAM_REQUESTS.inc(model=self.model, status=status)
+        if status == 'timeout':
+            UPSTREAM_TIMEOUTS.inc(model=self.model)
+            UPSTREAM_ERRORS.inc(model=self.model, kind='timeout')
+        elif status == 'error':
+            UPSTREAM_ERRORS.inc(model=self.model, kind='connection')
+        elif isinstance(status, int) and status >= 400:
+            UPSTREAM_ERRORS.inc(model=self.model, kind=f"http_{status // 100}xx")
+        if response_bytes is not None:
+            UPSTREAM_RESPONSE_BYTES.observe(response_bytes, model=self.model)
@@ -0,0 +1,102 @@
+import os
+import sys
+import threading
+from collections import Counter
+from typing import Optional
+
+from flask import Response
+
+from utils.timing import add_timing_header
+
+# Seconds between stack samples of a profiled request
+PROFILE_INTERVAL = float(os.environ.get('PROFILE_INTERVAL', '0.005'))
+# A profile stops sampling after this long, even if the request has not finished
+PROFILE_MAX_SECONDS = float(os.environ.get('PROFILE_MAX_SECONDS', '120'))
+
+# One profiled request per worker at a time; sampling slows the worker down
+_profile_lock = threading.Lock()
+
+def _label(code) -> str:
+    parts = code.co_filename.replace('\\', '/').rsplit('/', 2)
+    filename = '/'.join(parts[-2:])
+    return f"{code.co_name} ({filename}:{code.co_firstlineno})".replace(';', ':')
+
+class SamplingProfiler:
+    """Samples one thread's Python stack on a timer.
+
+    ``collapsed()`` returns one ``frame;frame;frame count`` line per
+    distinct stack, root first, which flamegraph.pl, speedscope and
+    inferno read directly. Under gevent or eventlet the sampled thread
+    is the hub, so use a sync or gthread worker to profile.
+    """
+
+    def __init__(self, thread_id: Optional[int] = None, interval: float = PROFILE_INTERVAL,
+                 max_seconds: float = PROFILE_MAX_SECONDS):
+        self.thread_id = thread_id if thread_id is not None else threading.get_ident()
+        self.interval = interval
+        self.max_samples = max(1, int(max_seconds / interval))
+        self.samples = 0
+        self.stacks = Counter()
+        self._stop = threading.Event()
+        self._thread = None
+
+    def start(self) -> 'SamplingProfiler':
+        self._thread = threading.Thread(target=self._run, name='request-profiler', daemon=True)
+        self._thread.start()
+        return self
+
+    def _run(self):
+        while not self._stop.wait(self.interval) and self.samples < self.max_samples:
+            frame = sys._current_frames().get(self.thread_id)
+            if frame is None:
+                return
+            stack = []
+            while frame is not None:
+                stack.append(_label(frame.f_code))
+                frame = frame.f_back
+            self.stacks[';'.join(reversed(stack))] += 1
+            self.samples += 1
+
+    def stop(self):
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
+
+    def collapsed(self) -> str:
+        return ''.join(f"{stack} {count}\n" for stack, count in self.stacks.most_common())
+
+def try_start_profile() -> Optional[SamplingProfiler]:
+    """Profile the calling thread, unless another request in this worker is being profiled"""
+    if not _profile_lock.acquire(blocking=False):
+        return None
+    try:
+        return SamplingProfiler().start()
+    except Exception:
+        _profile_lock.release()
+        raise
+
+def finish_profile(profiler: SamplingProfiler) -> str:
+    try:
+        profiler.stop()
+    finally:
+        _profile_lock.release()
+    return profiler.collapsed()
+
+def profile_response(profiler: SamplingProfiler, response):
+    """Swap a profiled response for its collapsed stacks.
+
+    A streamed body is drained first so its generation is profiled too;
+    the original status is kept in ``X-Profiled-Status``.
+    """
+    status = response.status_code
+    try:
+        for _ in response.iter_encoded():
+            pass
+    finally:
+        response.close()
+        stacks = finish_profile(profiler)
+    profile = Response(stacks, mimetype='text/plain')
+    profile.headers['X-Profiled-Status'] = str(status)
+    profile.headers['X-Profile-Samples'] = str(profiler.samples)
+    profile.headers['X-Profile-Interval'] = str(profiler.interval)
+    return add_timing_header(profile)
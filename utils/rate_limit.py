@@ -0,0 +1,202 @@
+import os
+import mmap
+import time
+import fcntl
+import struct
+import hashlib
+import tempfile
+import threading
+from typing import Optional
+from urllib.parse import urlparse
+
+from flask import current_app, g, jsonify
+from flask_jwt_extended import get_jwt_identity, verify_jwt_in_request
+from flask_limiter.util import get_remote_address
+from limits import parse
+from limits.storage import Storage, storage_from_string
+from limits.strategies import FixedWindowRateLimiter
+
+from utils.usage import quota_reset_at, usage_meter
+
+# /dev/shm keeps the counter table in RAM on Linux hosts
+_SHM_DIR = '/dev/shm' if os.path.isdir('/dev/shm') else tempfile.gettempdir()
+RATE_LIMIT_STORAGE_URI = os.environ.get(
+    'RATE_LIMIT_STORAGE_URI', f"sharedmem://{os.path.join(_SHM_DIR, 'ethio-gpt-ratelimit')}"
+)
+RATE_LIMIT_SLOTS = int(os.environ.get('RATE_LIMIT_SLOTS', '65536'))
+# Off only for local load tests
+RATE_LIMIT_ENABLED = os.environ.get('RATE_LIMIT_ENABLED', '1').lower() not in ('0', 'false')
+
+# Per-route buckets, charged on every call to the route
+ROUTE_LIMITS = {
+    'chat': os.environ.get('RATE_LIMIT_CHAT', '30 per minute'),
+    'image': os.environ.get('RATE_LIMIT_IMAGE', '10 per minute'),
+    'tts': os.environ.get('RATE_LIMIT_TTS', '20 per minute'),
+    'stt': os.environ.get('RATE_LIMIT_STT', '20 per minute'),
+    'translate': os.environ.get('RATE_LIMIT_TRANSLATE', '60 per minute'),
+    'write': os.environ.get('RATE_LIMIT_WRITE', '20 per minute'),
+    'generate_resume': os.environ.get('RATE_LIMIT_GENERATE_RESUME', '20 per minute'),
+    'generate_resume_batch': os.environ.get('RATE_LIMIT_GENERATE_RESUME_BATCH', '5 per minute')
+}
+_route_items = {name: parse(limit) for name, limit in ROUTE_LIMITS.items()}
+
+class SharedMemoryStorage(Storage):
+    """Fixed-window counters in an mmap'd table shared by every worker on the host.
+
+    Registered with ``limits`` as ``sharedmem://<path>``, so Flask-Limiter
+    uses it directly. Keys hash to a slot of (key hash, count, expiry);
+    a short linear probe resolves collisions and expired slots are reused.
+    Each update holds an fcntl lock on just the probed byte range plus a
+    process-local lock, since fcntl locks do not exclude threads.
+    """
+
+    STORAGE_SCHEME = ["sharedmem"]
+    SLOT = struct.Struct('<QQd')
+    PROBE = 8
+
+    def __init__(self, uri: str = None, wrap_exceptions: bool = False, **options):
+        super().__init__(uri, wrap_exceptions=wrap_exceptions, **options)
+        self.path = urlparse(uri).path if uri else os.path.join(_SHM_DIR, 'ethio-gpt-ratelimit')
+        self.slots = int(options.get('slots', RATE_LIMIT_SLOTS))
+        self.size = (self.slots + self.PROBE) * self.SLOT.size
+        self._pid = None
+        self._lock = threading.Lock()
+
+    @property
+    def base_exceptions(self):
+        return OSError
+
+    def _open(self):
+        """Map the table once per process"""
+        if self._pid != os.getpid():
+            os.makedirs(os.path.dirname(self.path) or '.', exist_ok=True)
+            fd = os.open(self.path, os.O_RDWR | os.O_CREAT, 0o600)
+            if os.fstat(fd).st_size < self.size:
+                os.ftruncate(fd, self.size)
+            self._fd = fd
+            self._map = mmap.mmap(fd, self.size)
+            self._pid = os.getpid()
+        return self._map
+
+    def _hash(self, key: str) -> int:
+        # 0 marks an empty slot
+        return int.from_bytes(hashlib.blake2b(key.encode('utf-8'), digest_size=8).digest(), 'little') or 1
+
+    def _locked(self, key: str, update):
+        table = self._open()
+        key_hash = self._hash(key)
+        base = key_hash % self.slots
+        start = base * self.SLOT.size
+        length = self.PROBE * self.SLOT.size
+        with self._lock:
+            fcntl.lockf(self._fd, fcntl.LOCK_EX, length, start)
+            try:
+                now = time.time()
+                free = None
+                for index in range(base, base + self.PROBE):
+                    slot_hash, count, expiry = self.SLOT.unpack_from(table, index * self.SLOT.size)
+                    if slot_hash == key_hash:
+                        return update(table, index, count if expiry > now else 0, expiry, key_hash, now)
+                    if free is None and (slot_hash == 0 or expiry <= now):
+                        free = index
+                # A full probe window steals its first slot
+                return update(table, base if free is None else free, 0, 0, key_hash, now)
+            finally:
+                fcntl.lockf(self._fd, fcntl.LOCK_UN, length, start)
+
+    def incr(self, key: str, expiry: int, elastic_expiry: bool = False, amount: int = 1) -> int:
+        def update(table, index, count, current_expiry, key_hash, now):
+            if count == 0 or elastic_expiry:
+                current_expiry = now + expiry
+            count += amount
+            self.SLOT.pack_into(table, index * self.SLOT.size, key_hash, count, current_expiry)
+            return count
+        return self._locked(key, update)
+
+    def get(self, key: str) -> int:
+        return self._locked(key, lambda table, index, count, expiry, key_hash, now: count)
+
+    def get_expiry(self, key: str) -> float:
+        return self._locked(
+            key, lambda table, index, count, expiry, key_hash, now: expiry if count else now
+        )
+
+    def clear(self, key: str):
+        def update(table, index, count, expiry, key_hash, now):
+            if count:
+                self.SLOT.pack_into(table, index * self.SLOT.size, 0, 0, 0.0)
+        self._locked(key, update)
+
+    def reset(self):
+        table = self._open()
+        with self._lock:
+            fcntl.lockf(self._fd, fcntl.LOCK_EX)
+            try:
+                table[:] = bytes(self.size)
+            finally:
+                fcntl.lockf(self._fd, fcntl.LOCK_UN)
+        return None
+
+    def check(self) -> bool:
+        try:
+            self._open()
+            return True
+        except OSError:
+            return False
+
+def hit_route_limit(route: str) -> bool:
+    """Charge the current client's bucket for a route; False once it is exhausted"""
+    limiter = current_app.limiter
+    return not getattr(limiter, 'enabled', True) or limiter.limiter.hit(_route_items[route], route, get_remote_address())
+
+_shared_limiter = None
+
+def hit_client_route_limit(route: str, client: str) -> bool:
+    """hit_route_limit for servers without Flask-Limiter (aio_app), charging the same shared buckets"""
+    global _shared_limiter
+    if not RATE_LIMIT_ENABLED:
+        return True
+    if _shared_limiter is None:
+        _shared_limiter = FixedWindowRateLimiter(storage_from_string(RATE_LIMIT_STORAGE_URI))
+    return _shared_limiter.hit(_route_items[route], route, client)
+
+def route_limit_error(route: str, quota: bool = True):
+    """A 429 response if the client is over the route's rate limit or its daily quota, else None.
+
+    The quota is only checked here; users are charged per successful
+    upstream call (see hf_client.charge_usage). Routes that make no
+    upstream calls pass ``quota=False``.
+    """
+    if not hit_route_limit(route):
+        return jsonify({"error": "Rate limit exceeded"}), 429
+    user_id = client_user_id() if quota else None
+    used = usage_meter.check(user_id, route) if user_id else None
+    if used is None:
+        return None
+    resets_at = quota_reset_at()
+    response = jsonify({
+        "error": "Daily quota exceeded",
+        "quota": usage_meter.quota,
+        "used": used,
+        "resets_at": resets_at
+    })
+    response.headers['Retry-After'] = str(max(1, int(resets_at - time.time())))
+    return response, 429
+
+def client_identity() -> str:
+    """``user:<id>`` for a valid JWT, else ``ip:<address>``; cached for the request"""
+    identity = g.get('client_identity')
+    if identity is None:
+        try:
+            verify_jwt_in_request(optional=True)
+            user_id = get_jwt_identity()
+        except Exception:
+            # A bad or expired token is treated as anonymous here; @jwt_required routes still reject it
+            user_id = None
+        identity = g.client_identity = f"user:{user_id}" if user_id else f"ip:{get_remote_address()}"
+    return identity
+
+def client_user_id() -> Optional[str]:
+    """The signed-in user's id, or None for an anonymous client"""
+    identity = client_identity()
+    return identity[5:] if identity.startswith('user:') else None
@@ -0,0 +1,193 @@
+import re
+import json
+import zipfile
+from typing import Any, Dict, Iterable, Iterator, Optional
+
+from jinja2 import Environment
+from markupsafe import Markup, escape
+
+RESUME_CSS = """
+body {
+    font-family: Arial, sans-serif;
+    margin: 40px;
+    line-height: 1.6;
+    color: #333;
+}
+.header {
+    text-align: center;
+    border-bottom: 2px solid #078C03;
+    padding-bottom: 20px;
+    margin-bottom: 30px;
+}
+.name {
+    font-size: 28px;
+    font-weight: bold;
+    color: #1a202c;
+    margin-bottom: 10px;
+}
+.contact {
+    color: #666;
+    margin-bottom: 5px;
+}
+.section {
+    margin-top: 25px;
+}
+.section-title {
+    font-size: 18px;
+    font-weight: bold;
+    color: #078C03;
+    border-bottom: 1px solid #ccc;
+    padding-bottom: 5px;
+    margin-bottom: 10px;
+}
+.skills {
+    margin-top: 5px;
+}
+.skill {
+    display: inline-block;
+    background: #078C03;
+    color: white;
+    padding: 4px 12px;
+    border-radius: 20px;
+    font-size: 13px;
+    margin-right: 8px;
+    margin-bottom: 8px;
+}
+@media print {
+    body {
+        margin: 20px;
+    }
+}
+"""
+
+RESUME_TEMPLATE = """<!DOCTYPE html>
+<html>
+<head>
+    <meta charset="UTF-8">
+    <title>Resume - {{ name }}</title>
+    <style>{{ css }}</style>
+</head>
+<body>
+    <div class="header">
+        <div class="name">{{ name }}</div>
+        <div class="contact">{{ email }}</div>
+        <div class="contact">{{ phone }}</div>
+        <div class="contact">{{ location }}</div>
+    </div>
+{% if summary %}
+    <div class="section"><div class="section-title">Professional Summary</div><div>{{ summary }}</div></div>
+{% endif %}
+{% if experience %}
+    <div class="section"><div class="section-title">Work Experience</div><div>{{ experience|linebreaks }}</div></div>
+{% endif %}
+{% if education %}
+    <div class="section"><div class="section-title">Education</div><div>{{ education|linebreaks }}</div></div>
+{% endif %}
+{% if skills %}
+    <div class="section"><div class="section-title">Skills</div><div class="skills">
+{%- for skill in skills %}<span class="skill">{{ skill }}</span>{% endfor -%}
+    </div></div>
+{% endif %}
+    <div style="margin-top: 40px; text-align: center; color: #666; font-size: 12px;">
+        Generated with Ethio GPT Tools
+    </div>
+</body>
+</html>
+"""
+
+def _linebreaks(value: str) -> Markup:
+    """Escape text and turn newlines into <br>"""
+    return Markup('<br>').join(escape(line) for line in str(value).split('\n'))
+
+_environment = Environment(autoescape=True, trim_blocks=True, lstrip_blocks=True)
+_environment.filters['linebreaks'] = _linebreaks
+# Compiled once at import; the CSS is a trusted constant, so it is not escaped
+_template = _environment.from_string(RESUME_TEMPLATE, globals={"css": Markup(RESUME_CSS)})
+
+def render_resume(data: Dict[str, Any]) -> str:
+    """Render a resume to standalone HTML; every user field is escaped"""
+    skills = data.get('skills') or ''
+    if isinstance(skills, str):
+        skills = skills.split(',')
+    return _template.render(
+        name=data.get('name') or 'Your Name',
+        email=data.get('email', ''),
+        phone=data.get('phone', ''),
+        location=data.get('location', ''),
+        summary=data.get('summary', ''),
+        experience=data.get('experience', ''),
+        education=data.get('education', ''),
+        skills=[str(skill).strip() for skill in skills if str(skill).strip()]
+    )
+
+def resume_filename(data: Dict[str, Any]) -> str:
+    """Download name for a resume; keeps non-ASCII letters, drops path characters"""
+    name = re.sub(r'[^\w.-]+', '_', str(data.get('name') or 'unknown')).strip('._') or 'unknown'
+    return f"resume_{name[:80]}.html"
+
+def validate_resume(data: Any) -> str:
+    """Error message for an unusable resume entry, or '' if it is fine"""
+    if not isinstance(data, dict):
+        return "Each resume must be an object"
+    if not data.get('name') or not data.get('email'):
+        return "Name and email are required fields"
+    return ''
+
+class _ZipSink:
+    """Write-only, unseekable buffer that zipfile streams members into"""
+
+    def __init__(self):
+        self._chunks = []
+        self._written = 0
+
+    def write(self, data: bytes) -> int:
+        self._chunks.append(bytes(data))
+        self._written += len(data)
+        return len(data)
+
+    def tell(self) -> int:
+        # zipfile only needs offsets, which a byte count provides
+        return self._written
+
+    def flush(self):
+        pass
+
+    def drain(self) -> bytes:
+        data = b''.join(self._chunks)
+        self._chunks = []
+        return data
+
+def stream_resume_zip(resumes: Iterable[Any], max_items: Optional[int] = None) -> Iterator[bytes]:
+    """Render resumes into a ZIP and yield it as it is built.
+
+    Only one rendered resume is held at a time. Invalid entries, and any
+    past ``max_items``, are skipped and listed by position in an
+    ``errors.json`` member.
+    """
+    sink = _ZipSink()
+    errors = []
+    with zipfile.ZipFile(sink, 'w', compression=zipfile.ZIP_DEFLATED) as archive:
+        for index, data in enumerate(resumes):
+            if max_items is not None and index >= max_items:
+                errors.append({"index": index, "error": f"Batch is limited to {max_items} resumes"})
+                break
+            error = validate_resume(data)
+            if error:
+                errors.append({"index": index, "error": error})
+                continue
+            archive.writestr(f"{index + 1:04d}_{resume_filename(data)}", render_resume(data))
+            yield sink.drain()
+        if errors:
+            archive.writestr('errors.json', json.dumps(errors, indent=2))
+    yield sink.drain()
+
+def iter_ndjson(lines: Iterable[bytes]) -> Iterator[Any]:
+    """Decode one JSON value per line; undecodable lines become None"""
+    for line in lines:
+        line = line.strip()
+        if not line:
+            continue
+        try:
+            yield json.loads(line)
+        except ValueError:
+            yield None
@@ -0,0 +1,277 @@
+import os
+import time
+import threading
+from collections import deque
+from contextlib import contextmanager
+from typing import Any, Callable, Dict, Optional
+
+from flask import has_request_context
+
+from utils.circuit_breaker import ModelUnavailable, UPSTREAM_REJECTIONS
+from utils.deadline import current_deadline, deadline, remaining
+from utils.metrics import registry
+from utils.rate_limit import client_identity
+
+# Upstream calls in flight per worker, in total and per tool class
+SCHED_CONCURRENCY = int(os.environ.get('SCHED_CONCURRENCY', '16'))
+SCHED_INTERACTIVE_CONCURRENCY = int(os.environ.get('SCHED_INTERACTIVE_CONCURRENCY', '12'))
+SCHED_HEAVY_CONCURRENCY = int(os.environ.get('SCHED_HEAVY_CONCURRENCY', '6'))
+# Share of contended slots each class gets; interactive calls are served 4:1
+SCHED_INTERACTIVE_WEIGHT = float(os.environ.get('SCHED_INTERACTIVE_WEIGHT', '4'))
+SCHED_HEAVY_WEIGHT = float(os.environ.get('SCHED_HEAVY_WEIGHT', '1'))
+# A call queued longer than this (or behind this many others) gets a 503
+SCHED_MAX_WAIT = float(os.environ.get('SCHED_MAX_WAIT', '30'))
+SCHED_MAX_QUEUE = int(os.environ.get('SCHED_MAX_QUEUE', '256'))
+# Queued calls look this often for model slots freed by other workers
+SCHED_POLL_INTERVAL = float(os.environ.get('SCHED_POLL_INTERVAL', '0.05'))
+
+INTERACTIVE = 'interactive'
+HEAVY = 'heavy'
+
+QUEUE_WAIT = registry.histogram('ethio_scheduler_queue_wait_seconds', 'Time upstream calls waited for a slot',
+                                ['tool_class'])
+QUEUED = registry.gauge('ethio_scheduler_queued', 'Upstream calls waiting for a slot', ['tool_class'])
+
+_local = threading.local()
+
+def current_client() -> str:
+    """Who an upstream call is made for: the bound client, else the request's, else 'background'"""
+    client = getattr(_local, 'client', None)
+    if client:
+        return client
+    if has_request_context():
+        return client_identity()
+    return 'background'
+
+@contextmanager
+def acting_as(client: Optional[str]):
+    """Charge upstream calls in this block to client (e.g. in a job worker)"""
+    previous = getattr(_local, 'client', None)
+    _local.client = client or previous
+    try:
+        yield
+    finally:
+        _local.client = previous
+
+def bind(fn: Callable) -> Callable:
+    """Wrap fn so it runs as the calling client, under its deadline, when handed to a pool thread"""
+    client = current_client()
+    at = current_deadline()
+    def run(*args, **kwargs):
+        with acting_as(client), deadline(at=at):
+            return fn(*args, **kwargs)
+    return run
+
+class _Waiter:
+    __slots__ = ('client', 'model', 'event', 'granted', 'permit', 'error')
+
+    def __init__(self, client: str, model: str):
+        self.client = client
+        self.model = model
+        self.event = threading.Event()
+        self.granted = False
+        self.permit = None
+        self.error = None
+
+class _Slot:
+    """One admitted call; release exactly once, after releasing ``permit``"""
+    __slots__ = ('scheduler', 'tool_class', 'permit', 'released')
+
+    def __init__(self, scheduler: 'FairScheduler', tool_class: str, permit: Any = None):
+        self.scheduler = scheduler
+        self.tool_class = tool_class
+        self.permit = permit
+        self.released = False
+
+    def release(self):
+        if not self.released:
+            self.released = True
+            self.scheduler._release(self.tool_class)
+
+class _Class:
+    def __init__(self, name: str, limit: int, weight: float):
+        self.name = name
+        self.limit = limit
+        self.stride = 1.0 / weight
+        self.pass_ = 0.0
+        self.in_flight = 0
+        self.queues: Dict[str, deque] = {}  # client -> waiters, FIFO
+        self.client_pass: Dict[str, float] = {}
+        self.queued = 0
+        self.admitted = 0
+        self.rejected = 0
+
+class FairScheduler:
+    """Weighted fair sharing of upstream capacity across tool classes and clients.
+
+    A call takes a slot when fewer than ``limit`` calls are in flight in
+    the worker and fewer than its class's limit, and ``model_slots`` (the
+    model bulkheads, see ModelGuards.try_acquire) gives it a permit.
+    Otherwise it queues rather than being turned away by the bulkhead.
+    Bulkheads are shared by all workers, so queued calls also poll every
+    ``poll_interval`` for permits freed elsewhere.
+    Freed slots go to the class, then the client, with the lowest
+    stride-scheduling pass value. A class advances by 1/weight per
+    admitted call, and a client by 1 within its class. So interactive
+    calls win by their weight, and one client's backlog cannot hold back
+    another client in the same class. Newly active queues start at the
+    current minimum pass, so idle time banks no credit. Queues and passes
+    are per worker; the model caps they wait on are per host.
+    """
+
+    def __init__(self, limit: int = SCHED_CONCURRENCY, classes: Optional[Dict[str, dict]] = None,
+                 model_slots: Any = None, max_wait: float = SCHED_MAX_WAIT, max_queue: int = SCHED_MAX_QUEUE,
+                 poll_interval: float = SCHED_POLL_INTERVAL):
+        classes = classes or {
+            INTERACTIVE: {"limit": SCHED_INTERACTIVE_CONCURRENCY, "weight": SCHED_INTERACTIVE_WEIGHT},
+            HEAVY: {"limit": SCHED_HEAVY_CONCURRENCY, "weight": SCHED_HEAVY_WEIGHT}
+        }
+        self.limit = limit
+        self.model_slots = model_slots
+        self.max_wait = max_wait
+        self.max_queue = max_queue
+        self.poll_interval = poll_interval
+        self.in_flight = 0
+        self._classes = {name: _Class(name, spec["limit"], spec["weight"]) for name, spec in classes.items()}
+        self._lock = threading.Lock()
+
+    def acquire(self, tool_class: str, model: str, client: Optional[str] = None) -> _Slot:
+        """Wait for a slot; raises ModelUnavailable if the queue is full or the wait too long"""
+        cls = self._classes[tool_class]
+        client = client or current_client()
+        start = time.perf_counter()
+        with self._lock:
+            if not cls.queued and self._has_room(cls):
+                # A breaker refusal propagates from here
+                permit = self._try_model(model)
+                if permit is not None or self.model_slots is None:
+                    self._admit(cls)
+                    QUEUE_WAIT.observe(0.0, tool_class=tool_class)
+                    return _Slot(self, tool_class, permit)
+            if cls.queued >= self.max_queue:
+                cls.rejected += 1
+                waiter = None
+            else:
+                waiter = self._enqueue(cls, client, model)
+        if waiter is None:
+            UPSTREAM_REJECTIONS.inc(model=model, reason='queue_full')
+            raise ModelUnavailable(model, self.max_wait, 'too many queued requests')
+
+        # Never queue past the caller's deadline
+        give_up = time.monotonic() + min(self.max_wait, remaining(self.max_wait))
+        while not waiter.event.is_set():
+            left = give_up - time.monotonic()
+            if left <= 0:
+                break
+            if not waiter.event.wait(min(self.poll_interval, left)) and self.model_slots is not None:
+                with self._lock:
+                    self._dispatch()
+        with self._lock:
+            if not waiter.granted and waiter.error is None:
+                self._dequeue(cls, waiter)
+                cls.rejected += 1
+        QUEUE_WAIT.observe(time.perf_counter() - start, tool_class=tool_class)
+        if waiter.error is not None:
+            raise waiter.error
+        if not waiter.granted:
+            UPSTREAM_REJECTIONS.inc(model=model, reason='queue_timeout')
+            raise ModelUnavailable(model, self.max_wait, 'queue wait too long')
+        return _Slot(self, tool_class, waiter.permit)
+
+    def _try_model(self, model: str) -> Any:
+        return self.model_slots.try_acquire(model) if self.model_slots is not None else None
+
+    def _has_room(self, cls: _Class) -> bool:
+        return self.in_flight < self.limit and cls.in_flight < cls.limit
+
+    def _admit(self, cls: _Class):
+        self.in_flight += 1
+        cls.in_flight += 1
+        cls.admitted += 1
+        cls.pass_ += cls.stride
+
+    def _enqueue(self, cls: _Class, client: str, model: str) -> _Waiter:
+        if not cls.queued:
+            # Start level with the classes already waiting: no banked credit
+            # from idle time, no penalty for uncontended calls
+            waiting = [c.pass_ for c in self._classes.values() if c.queued]
+            if waiting:
+                cls.pass_ = min(waiting)
+        queue = cls.queues.get(client)
+        if queue is None:
+            queue = cls.queues[client] = deque()
+            cls.client_pass[client] = min(cls.client_pass.values(), default=0.0)
+        waiter = _Waiter(client, model)
+        queue.append(waiter)
+        cls.queued += 1
+        QUEUED.inc(tool_class=cls.name)
+        return waiter
+
+    def _dequeue(self, cls: _Class, waiter: _Waiter):
+        queue = cls.queues.get(waiter.client)
+        if queue is None:
+            return
+        try:
+            queue.remove(waiter)
+        except ValueError:
+            return
+        cls.queued -= 1
+        QUEUED.dec(tool_class=cls.name)
+        if not queue:
+            # Only clients with queued calls are tracked
+            del cls.queues[waiter.client]
+            del cls.client_pass[waiter.client]
+
+    def _release(self, tool_class: str):
+        with self._lock:
+            self.in_flight -= 1
+            self._classes[tool_class].in_flight -= 1
+            self._dispatch()
+
+    def _grant(self, cls: _Class, full: set) -> bool:
+        """Admit the head call of the lowest-pass client whose model has a free permit"""
+        for client in sorted(cls.queues, key=cls.client_pass.__getitem__):
+            waiter = cls.queues[client][0]
+            if waiter.model in full:
+                continue
+            try:
+                permit = self._try_model(waiter.model)
+            except ModelUnavailable as e:
+                # Breaker opened while it waited: fail it and look again
+                waiter.error = e
+                self._dequeue(cls, waiter)
+                waiter.event.set()
+                return True
+            if permit is None and self.model_slots is not None:
+                full.add(waiter.model)
+                continue
+            cls.client_pass[client] += 1.0
+            self._dequeue(cls, waiter)
+            self._admit(cls)
+            waiter.permit = permit
+            waiter.granted = True
+            waiter.event.set()
+            return True
+        return False
+
+    def _dispatch(self):
+        """Hand free slots to the waiting classes and clients with the lowest pass"""
+        full = set()
+        while self.in_flight < self.limit:
+            ready = sorted((c for c in self._classes.values() if c.queued and c.in_flight < c.limit),
+                           key=lambda c: c.pass_)
+            if not any(self._grant(cls, full) for cls in ready):
+                return
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                "limit": self.limit,
+                "in_flight": self.in_flight,
+                "classes": {
+                    name: {"limit": c.limit, "weight": round(1 / c.stride, 2), "in_flight": c.in_flight,
+                           "queued": c.queued, "waiting_clients": len(c.queues),
+                           "admitted": c.admitted, "rejected": c.rejected}
+                    for name, c in self._classes.items()
+                }
+            }
@@ -0,0 +1,207 @@
+import os
+import json
+import time
+import fcntl
+import hashlib
+import logging
+import threading
+from typing import Any, Callable, Optional
+
+from utils.circuit_breaker import ModelUnavailable
+from utils.locks import private_dir
+from utils.deadline import HF_CALL_DEADLINE, remaining
+
+logger = logging.getLogger(__name__)
+
+# How often a waiting worker re-tries the leader's lock
+LOCK_POLL_INTERVAL = 0.05
+
+class LeaderFailed(RuntimeError):
+    """Raised in a worker that waited on another worker's call when that call failed"""
+
+class _Call:
+    def __init__(self):
+        self.done = threading.Event()
+        self.result = None
+        self.error = None
+
+class SingleFlight:
+    """Coalesce identical in-flight calls so only one reaches the upstream.
+
+    Threads in a process wait on the leader's event and share its result or
+    exception. When ``lock_dir`` is set, workers on the same host also
+    coordinate: the leader holds an exclusive ``flock`` on a per-key lock
+    file and leaves its result (or error) next to it as JSON; a worker that
+    waited on that lock reuses it if it was written after it started
+    waiting. A worker only waits until its deadline runs out, then makes
+    the call itself. ``lock_dir`` must be private to this user: it is
+    created 0700 and the cross-worker tier is turned off if someone else
+    owns it.
+    """
+
+    def __init__(self, lock_dir: Optional[str] = None, sweep_age: float = 60):
+        self.lock_dir = lock_dir
+        self.sweep_age = sweep_age
+        self._calls = {}
+        self._lock = threading.Lock()
+        self.calls = 0
+        self.leaders = 0
+        self.coalesced_threads = 0
+        self.coalesced_processes = 0
+        if lock_dir and not private_dir(lock_dir):
+            self.lock_dir = None
+
+    def do(self, key: str, fn: Callable[[], Any]) -> Any:
+        with self._lock:
+            self.calls += 1
+            call = self._calls.get(key)
+            leader = call is None
+            if leader:
+                call = self._calls[key] = _Call()
+            else:
+                self.coalesced_threads += 1
+        if not leader:
+            call.done.wait()
+            if call.error is not None:
+                raise call.error
+            return call.result
+
+        try:
+            call.result = self._run(key, fn)
+            return call.result
+        except Exception as e:
+            call.error = e
+            raise
+        finally:
+            with self._lock:
+                self._calls.pop(key, None)
+            call.done.set()
+
+    def _run(self, key: str, fn: Callable[[], Any]) -> Any:
+        if not self.lock_dir:
+            self.leaders += 1
+            return fn()
+
+        digest = hashlib.sha256(key.encode('utf-8')).hexdigest()
+        lock_path = os.path.join(self.lock_dir, f"{digest}.lock")
+        result_path = os.path.join(self.lock_dir, f"{digest}.result")
+        started = time.time()
+        with open(lock_path, 'a+b') as lock_file:
+            try:
+                fcntl.flock(lock_file, fcntl.LOCK_EX | fcntl.LOCK_NB)
+            except BlockingIOError:
+                # Another worker is fetching the same thing; wait for it
+                if not self._wait_lock(lock_file):
+                    logger.warning("Single-flight leader outlived this call's deadline; calling upstream directly")
+                    self.leaders += 1
+                    return fn()
+                shared = self._read_result(result_path, started)
+                if shared is not None:
+                    self.coalesced_processes += 1
+                    if 'error' in shared:
+                        raise self._error_from(shared['error'])
+                    return shared['result']
+            try:
+                self.leaders += 1
+                try:
+                    result = fn()
+                except Exception as e:
+                    # Waiting workers fail too, instead of each retrying in turn under the lock
+                    self._write_result(result_path, {"error": self._error_to(e)})
+                    raise
+                self._write_result(result_path, {"result": result})
+                return result
+            finally:
+                fcntl.flock(lock_file, fcntl.LOCK_UN)
+                if self.leaders % 100 == 0:
+                    self._sweep()
+
+    @staticmethod
+    def _wait_lock(lock_file) -> bool:
+        """Take the lock, polling until the caller's deadline; False if it ran out"""
+        give_up = time.monotonic() + remaining(HF_CALL_DEADLINE)
+        while True:
+            try:
+                fcntl.flock(lock_file, fcntl.LOCK_EX | fcntl.LOCK_NB)
+                return True
+            except BlockingIOError:
+                left = give_up - time.monotonic()
+                if left <= 0:
+                    return False
+                time.sleep(min(LOCK_POLL_INTERVAL, left))
+
+    @staticmethod
+    def _error_to(error: Exception) -> dict:
+        if isinstance(error, ModelUnavailable):
+            return {"type": "ModelUnavailable", "model": error.model, "retry_after": error.retry_after,
+                    "reason": error.reason}
+        return {"type": type(error).__name__, "message": str(error)}
+
+    @staticmethod
+    def _error_from(error: dict) -> Exception:
+        if error.get('type') == 'ModelUnavailable':
+            return ModelUnavailable(error['model'], error['retry_after'], error['reason'])
+        return LeaderFailed(f"{error.get('type')}: {error.get('message')}")
+
+    @staticmethod
+    def _read_result(path: str, not_before: float) -> Optional[dict]:
+        """{"result": ...} or {"error": ...} if the leader published one after not_before"""
+        try:
+            if os.path.getmtime(path) < not_before:
+                return None
+            with open(path, 'r', encoding='utf-8') as f:
+                shared = json.load(f)
+        except (OSError, ValueError):
+            return None
+        return shared if isinstance(shared, dict) and ('result' in shared or 'error' in shared) else None
+
+    @staticmethod
+    def _write_result(path: str, shared: dict):
+        tmp_path = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+        try:
+            with open(tmp_path, 'w', encoding='utf-8') as f:
+                json.dump(shared, f)
+            os.replace(tmp_path, path)
+        except (OSError, TypeError, ValueError) as e:
+            # Not JSON-serializable: waiting workers make their own call
+            logger.warning(f"Single-flight result handoff failed: {e}")
+            try:
+                os.remove(tmp_path)
+            except OSError:
+                pass
+
+    def _sweep(self):
+        """Remove lock and result files nobody has touched recently.
+
+        A lock file is only removed while this worker holds its lock, so a
+        call that is still running (an image render can take 100s) keeps it.
+        """
+        cutoff = time.time() - self.sweep_age
+        try:
+            for entry in os.scandir(self.lock_dir):
+                if entry.stat().st_mtime >= cutoff:
+                    continue
+                try:
+                    if entry.name.endswith('.lock'):
+                        with open(entry.path, 'a+b') as lock_file:
+                            try:
+                                fcntl.flock(lock_file, fcntl.LOCK_EX | fcntl.LOCK_NB)
+                            except BlockingIOError:
+                                continue
+                            os.remove(entry.path)
+                    else:
+                        os.remove(entry.path)
+                except OSError:
+                    pass
+        except OSError as e:
+            logger.warning(f"Single-flight sweep failed: {e}")
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                "calls": self.calls,
+                "leaders": self.leaders,
+                "coalesced_threads": self.coalesced_threads,
+                "coalesced_processes": self.coalesced_processes,
+                "in_flight": len(self._calls)
+            }
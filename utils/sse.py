@@ -0,0 +1,58 @@
+import re
+import json
+import logging
+from typing import Any, Dict, Iterator, Optional
+
+logger = logging.getLogger(__name__)
+
+def format_event(data: Any, event: Optional[str] = None) -> str:
+    """Serialize one Server-Sent Event"""
+    message = f"event: {event}\n" if event else ""
+    return message + f"data: {json.dumps(data)}\n\n"
+
+def chunk_text(text: str) -> Iterator[str]:
+    """Split a finished reply into word-sized chunks for fallback streaming"""
+    for match in re.finditer(r'\S+\s*', text):
+        yield match.group(0)
+
+def sse_stream(chunks: Iterator[str], meta: Dict[str, Any], error_message: str) -> Iterator[str]:
+    """Relay text chunks as SSE ``token`` events framed by ``meta`` and ``done``.
+
+    Closing this generator (the client went away) closes ``chunks`` too, so
+    the upstream connection is released instead of left draining.
+    """
+    try:
+        yield format_event(meta, 'meta')
+        parts = []
+        for chunk in chunks:
+            parts.append(chunk)
+            yield format_event({"token": chunk}, 'token')
+        yield format_event({"content": "".join(parts)}, 'done')
+    except GeneratorExit:
+        raise
+    except Exception as e:
+        logger.error(f"Streaming failed: {e}")
+        yield format_event({"error": error_message}, 'error')
+    finally:
+        close = getattr(chunks, 'close', None)
+        if close is not None:
+            close()
+
+def sse_sections(sections: Iterator[Dict[str, Any]], meta: Dict[str, Any], error_message: str) -> Iterator[str]:
+    """Relay long-form sections as SSE ``section`` events framed by ``meta`` and ``done``"""
+    try:
+        yield format_event(meta, 'meta')
+        done = []
+        for section in sections:
+            done.append(section)
+            yield format_event(section, 'section')
+        yield format_event({"sections": len(done)}, 'done')
+    except GeneratorExit:
+        raise
+    except Exception as e:
+        logger.error(f"Streaming failed: {e}")
+        yield format_event({"error": error_message}, 'error')
+    finally:
+        close = getattr(sections, 'close', None)
+        if close is not None:
+            close()
@@ -0,0 +1,113 @@
+import os
+import time
+import functools
+from contextlib import nullcontext
+from typing import Callable, Dict, Optional
+
+from flask import g, has_request_context
+from flask.json.provider import DefaultJSONProvider
+from flask.wrappers import Request
+
+# Add a Server-Timing header to every response; profiled requests always get one
+SERVER_TIMING = os.environ.get('SERVER_TIMING', '').lower() in ('1', 'true')
+
+_NULL = nullcontext()
+
+class RequestTimings:
+    """Time spent per phase while handling one request.
+
+    A phase nested in a phase of the same name is not counted twice, so
+    HFClient methods that call each other can all be instrumented.
+    """
+
+    def __init__(self):
+        self.start = time.perf_counter()
+        self.phases: Dict[str, list] = {}  # name -> [seconds, calls, descriptions]
+        self.active = set()
+
+    def add(self, name: str, seconds: float, desc: Optional[str] = None):
+        entry = self.phases.get(name)
+        if entry is None:
+            entry = self.phases[name] = [0.0, 0, []]
+        entry[0] += seconds
+        entry[1] += 1
+        if desc and desc not in entry[2]:
+            entry[2].append(desc)
+
+    def header(self) -> str:
+        """Server-Timing value; ``app`` is the time not covered by any phase"""
+        total = time.perf_counter() - self.start
+        metrics = []
+        for name, (seconds, calls, descs) in self.phases.items():
+            desc = ', '.join(descs) if descs else (f"{calls} calls" if calls > 1 else '')
+            desc = desc.replace('"', "'")
+            metrics.append(f'{name};dur={seconds * 1000:.1f}' + (f';desc="{desc}"' if desc else ''))
+        covered = sum(seconds for seconds, _, _ in self.phases.values())
+        metrics.append(f'app;dur={max(0.0, total - covered) * 1000:.1f}')
+        metrics.append(f'total;dur={total * 1000:.1f}')
+        return ', '.join(metrics)
+
+class _Phase:
+    __slots__ = ('timings', 'name', 'desc', 'start')
+
+    def __init__(self, timings: RequestTimings, name: str, desc: Optional[str]):
+        self.timings = timings
+        self.name = name
+        self.desc = desc
+        self.start = None
+
+    def __enter__(self):
+        if self.name not in self.timings.active:
+            self.timings.active.add(self.name)
+            self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        if self.start is not None:
+            self.timings.active.discard(self.name)
+            self.timings.add(self.name, time.perf_counter() - self.start, self.desc)
+        return False
+
+def phase(name: str, desc: Optional[str] = None):
+    """Time a block as part of the current request; a no-op when timing is off
+    or outside a request (e.g. in pool threads)"""
+    if not has_request_context():
+        return _NULL
+    timings = g.get('server_timing')
+    if timings is None:
+        return _NULL
+    return _Phase(timings, name, desc)
+
+def timed(name: str) -> Callable:
+    """Decorator form of ``phase``"""
+    def decorator(func):
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            with phase(name):
+                return func(*args, **kwargs)
+        return wrapper
+    return decorator
+
+def start_timing(force: bool = False):
+    if SERVER_TIMING or force:
+        g.server_timing = RequestTimings()
+
+def add_timing_header(response):
+    timings = g.get('server_timing')
+    if timings is not None:
+        response.headers['Server-Timing'] = timings.header()
+    return response
+
+class TimedRequest(Request):
+    """Counts request body JSON decoding as the ``parse`` phase"""
+
+    def get_json(self, *args, **kwargs):
+        with phase('parse'):
+            return super().get_json(*args, **kwargs)
+
+class TimedJSONProvider(DefaultJSONProvider):
+    """Counts ``jsonify`` as the ``serialize`` phase"""
+
+    def response(self, *args, **kwargs):
+        with phase('serialize'):
+            return super().response(*args, **kwargs)
@@ -0,0 +1,179 @@
+import os
+import time
+import atexit
+import logging
+import threading
+from typing import Dict, Optional, Tuple
+
+from utils.metrics import registry
+from utils.user_store import UserStore, user_store
+
+logger = logging.getLogger(__name__)
+
+# Cost units a signed-in user may spend per UTC day; 0 turns quotas off
+USAGE_DAILY_QUOTA = int(os.environ.get('USAGE_DAILY_QUOTA', '500'))
+# Charges are batched in memory and written to the user store this often
+USAGE_FLUSH_INTERVAL = float(os.environ.get('USAGE_FLUSH_INTERVAL', '2'))
+
+# Cost of each input of a successful upstream call, by kind, roughly its
+# compute. Cache hits and coalesced calls are free; a batch pays per input
+# and a long-form text for every section it generates.
+TOOL_COSTS = {
+    'chat': int(os.environ.get('USAGE_COST_CHAT', '1')),  # chat and writer text generation
+    'image': int(os.environ.get('USAGE_COST_IMAGE', '20')),
+    'tts': int(os.environ.get('USAGE_COST_TTS', '3')),
+    'stt': int(os.environ.get('USAGE_COST_STT', '3')),
+    'translate': int(os.environ.get('USAGE_COST_TRANSLATE', '1'))
+}
+
+USAGE_COST = registry.counter('ethio_usage_cost_total', 'Cost units charged to signed-in users', ['tool'])
+QUOTA_REJECTIONS = registry.counter('ethio_quota_rejections_total', 'Requests refused for exceeding the daily quota',
+                                    ['route'])
+
+def usage_day(now: Optional[float] = None) -> str:
+    return time.strftime('%Y-%m-%d', time.gmtime(now))
+
+def quota_reset_at(now: Optional[float] = None) -> int:
+    """Unix time of the next UTC midnight, when daily usage starts over"""
+    now = time.time() if now is None else now
+    return (int(now) // 86400 + 1) * 86400
+
+class UsageMeter:
+    """Per-user call and cost counters with write-behind persistence.
+
+    ``check`` runs before a request does any upstream work and refuses
+    users who have used up the day's quota; a request that starts under
+    the quota may finish above it. ``charge`` runs after each successful
+    upstream call and only touches memory. A flush thread (one per process,
+    started after any fork) writes the pending counters to the user store
+    in one transaction every ``flush_interval`` seconds. Quota checks add
+    this worker's unflushed charges to the user's stored total for the
+    day; that total is re-read after each flush, so other workers' charges
+    are seen within about one interval.
+    """
+
+    def __init__(self, store: UserStore, quota: int = USAGE_DAILY_QUOTA,
+                 flush_interval: float = USAGE_FLUSH_INTERVAL):
+        self.store = store
+        self.quota = quota
+        self.flush_interval = flush_interval
+        self._pending: Dict[Tuple[str, str], list] = {}  # (user_id, day) -> [requests, cost]
+        self._flushing: Dict[Tuple[str, str], list] = {}
+        self._stored: Dict[Tuple[str, str], Tuple[int, float]] = {}  # (user_id, day) -> (cost, read at)
+        self.flushes = 0
+        self.rejected = 0
+        self._pid = None
+        self._lock = threading.Lock()
+        self._flush_lock = threading.Lock()
+
+    def _ensure_flusher(self):
+        """Start one flush thread per process; charges inherited over a fork belong to the parent"""
+        if self._pid == os.getpid():
+            return
+        with self._lock:
+            if self._pid == os.getpid():
+                return
+            self._pid = os.getpid()
+            self._pending = {}
+            self._flushing = {}
+        threading.Thread(target=self._flush_loop, name='usage-flush', daemon=True).start()
+
+    def _flush_loop(self):
+        while True:
+            time.sleep(self.flush_interval)
+            try:
+                self.flush()
+            except Exception as e:
+                logger.warning(f"Usage flush failed: {e}")
+
+    def _stored_cost(self, key: Tuple[str, str]) -> int:
+        entry = self._stored.get(key)
+        if entry is not None and time.monotonic() - entry[1] < self.flush_interval:
+            return entry[0]
+        cost = self.store.daily_usage(*key)
+        self._stored[key] = (cost, time.monotonic())
+        return cost
+
+    def used(self, user_id: str) -> int:
+        """Cost charged to user_id today, including this worker's unflushed charges"""
+        key = (user_id, usage_day())
+        stored = self._stored_cost(key)
+        with self._lock:
+            return stored + sum(counts.get(key, (0, 0))[1] for counts in (self._pending, self._flushing))
+
+    def check(self, user_id: str, route: str) -> Optional[int]:
+        """None if user_id may start a request to route, else the cost used today"""
+        if not self.quota:
+            return None
+        used = self.used(user_id)
+        if used < self.quota:
+            return None
+        with self._lock:
+            self.rejected += 1
+        QUOTA_REJECTIONS.inc(route=route)
+        return used
+
+    def charge(self, user_id: str, tool: str, units: int = 1):
+        """Count one successful upstream call of the given kind covering units inputs"""
+        self._ensure_flusher()
+        cost = TOOL_COSTS.get(tool, 1) * units
+        key = (user_id, usage_day())
+        with self._lock:
+            counts = self._pending.get(key)
+            if counts is None:
+                counts = self._pending[key] = [0, 0]
+            counts[0] += 1
+            counts[1] += cost
+        USAGE_COST.inc(cost, tool=tool)
+
+    def flush(self):
+        """Write pending counters to the store; kept for the next flush if the write fails"""
+        with self._flush_lock:
+            with self._lock:
+                if not self._pending:
+                    return
+                batch, self._pending = self._pending, {}
+                # Still counted against quotas while the write is in progress
+                self._flushing = batch
+            try:
+                self.store.add_usage({key: tuple(counts) for key, counts in batch.items()})
+            except Exception:
+                with self._lock:
+                    for key, counts in batch.items():
+                        pending = self._pending.setdefault(key, [0, 0])
+                        pending[0] += counts[0]
+                        pending[1] += counts[1]
+                    self._flushing = {}
+                raise
+            with self._lock:
+                self._flushing = {}
+                for key in batch:
+                    self._stored.pop(key, None)
+                # Forget other users' cached totals from earlier days
+                today = usage_day()
+                for key in [key for key in self._stored if key[1] != today]:
+                    del self._stored[key]
+                self.flushes += 1
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                "daily_quota": self.quota,
+                "tool_costs": dict(TOOL_COSTS),
+                "flush_interval": self.flush_interval,
+                "pending_users": len({user_id for user_id, _ in self._pending}),
+                "pending_cost": sum(cost for _, cost in self._pending.values()),
+                "flushes": self.flushes,
+                "rejected": self.rejected
+            }
+
+usage_meter = UsageMeter(user_store)
+
+# Don't lose the last interval's charges on a graceful worker exit
+@atexit.register
+def _flush_on_exit():
+    if usage_meter._pid == os.getpid():
+        try:
+            usage_meter.flush()
+        except Exception as e:
+            logger.warning(f"Usage flush failed: {e}")
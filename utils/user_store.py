@@ -0,0 +1,189 @@
+import os
+import time
+import uuid
+import sqlite3
+import threading
+from abc import ABC, abstractmethod
+from typing import Any, Dict, Optional, Tuple
+
+# Empty USER_STORE_PATH keeps users in process memory (one copy per worker)
+USER_STORE_PATH = os.environ.get('USER_STORE_PATH', os.path.join('temp', 'users.sqlite'))
+
+class UserStore(ABC):
+    """Interface for user storage with O(1) lookups and aggregate counters"""
+
+    @abstractmethod
+    def create(self, username: str, display_name: str) -> Optional[Dict[str, Any]]:
+        """Create a user, or return None if the username is taken"""
+
+    @abstractmethod
+    def get_by_id(self, user_id: str) -> Optional[Dict[str, Any]]:
+        """The user with this id, or None"""
+
+    @abstractmethod
+    def get_by_username(self, username: str) -> Optional[Dict[str, Any]]:
+        """The user with this username, or None"""
+
+    @abstractmethod
+    def add_usage(self, batch: Dict[Tuple[str, str], Tuple[int, int]]):
+        """Apply {(user_id, day): (requests, cost)} in one write"""
+
+    @abstractmethod
+    def daily_usage(self, user_id: str, day: str) -> int:
+        """Cost charged to a user on a day (YYYY-MM-DD, UTC)"""
+
+    @abstractmethod
+    def stats(self) -> Dict[str, int]:
+        """Totals maintained incrementally, not by scanning users"""
+
+    @staticmethod
+    def _new_user(username: str, display_name: str) -> Dict[str, Any]:
+        return {
+            'id': str(uuid.uuid4()),
+            'username': username,
+            'display_name': display_name or username,
+            'created_at': time.time(),
+            'usage_count': 0
+        }
+
+class MemoryUserStore(UserStore):
+    """Per-process store indexed by id and username"""
+
+    def __init__(self):
+        self._by_id = {}
+        self._by_username = {}
+        self._daily = {}
+        self._total_requests = 0
+        self._total_cost = 0
+        self._lock = threading.Lock()
+
+    def create(self, username, display_name):
+        user = self._new_user(username, display_name)
+        with self._lock:
+            if username in self._by_username:
+                return None
+            self._by_username[username] = user
+            self._by_id[user['id']] = user
+        return dict(user)
+
+    def get_by_id(self, user_id):
+        user = self._by_id.get(user_id)
+        return dict(user) if user else None
+
+    def get_by_username(self, username):
+        user = self._by_username.get(username)
+        return dict(user) if user else None
+
+    def add_usage(self, batch):
+        with self._lock:
+            for (user_id, day), (requests, cost) in batch.items():
+                user = self._by_id.get(user_id)
+                if user is None:
+                    continue
+                user['usage_count'] += requests
+                self._daily[user_id, day] = self._daily.get((user_id, day), 0) + cost
+                self._total_requests += requests
+                self._total_cost += cost
+
+    def daily_usage(self, user_id, day):
+        return self._daily.get((user_id, day), 0)
+
+    def stats(self):
+        return {"total_users": len(self._by_id), "total_requests": self._total_requests,
+                "total_cost": self._total_cost}
+
+class SQLiteUserStore(UserStore):
+    """SQLite (WAL) store shared by every worker on the host.
+
+    ``username`` has a unique index and ``id`` is the primary key, so both
+    lookups are index seeks. The SQL strings are constants, so sqlite3's
+    per-connection statement cache reuses the prepared statements. Totals
+    live in a counters table updated in the same transaction as each write,
+    and per-day cost in a ``usage_daily`` table keyed by (user, day).
+    """
+
+    def __init__(self, path: str = USER_STORE_PATH):
+        self.path = path
+        self._local = threading.local()
+        self._connect()
+
+    def _connect(self) -> sqlite3.Connection:
+        """One connection per thread and process, created on first use"""
+        conn = getattr(self._local, 'conn', None)
+        if conn is None or getattr(self._local, 'pid', None) != os.getpid():
+            os.makedirs(os.path.dirname(self.path) or '.', exist_ok=True)
+            conn = sqlite3.connect(self.path, timeout=5, cached_statements=64)
+            conn.row_factory = sqlite3.Row
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            conn.executescript(
+                "CREATE TABLE IF NOT EXISTS users ("
+                "id TEXT PRIMARY KEY, username TEXT NOT NULL UNIQUE, display_name TEXT NOT NULL, "
+                "created_at REAL NOT NULL, usage_count INTEGER NOT NULL DEFAULT 0);"
+                "CREATE TABLE IF NOT EXISTS usage_daily ("
+                "user_id TEXT NOT NULL, day TEXT NOT NULL, cost INTEGER NOT NULL, "
+                "PRIMARY KEY (user_id, day)) WITHOUT ROWID;"
+                "CREATE TABLE IF NOT EXISTS counters (name TEXT PRIMARY KEY, value INTEGER NOT NULL);"
+                "INSERT OR IGNORE INTO counters (name, value) VALUES "
+                "('total_users', 0), ('total_requests', 0), ('total_cost', 0);"
+            )
+            self._local.conn = conn
+            self._local.pid = os.getpid()
+        return conn
+
+    def create(self, username, display_name):
+        user = self._new_user(username, display_name)
+        conn = self._connect()
+        try:
+            with conn:
+                conn.execute(
+                    "INSERT INTO users (id, username, display_name, created_at, usage_count) VALUES (?, ?, ?, ?, 0)",
+                    (user['id'], user['username'], user['display_name'], user['created_at'])
+                )
+                conn.execute("UPDATE counters SET value = value + 1 WHERE name = 'total_users'")
+        except sqlite3.IntegrityError:
+            return None
+        return user
+
+    def get_by_id(self, user_id):
+        row = self._connect().execute("SELECT * FROM users WHERE id = ?", (user_id,)).fetchone()
+        return dict(row) if row else None
+
+    def get_by_username(self, username):
+        row = self._connect().execute("SELECT * FROM users WHERE username = ?", (username,)).fetchone()
+        return dict(row) if row else None
+
+    def add_usage(self, batch):
+        conn = self._connect()
+        requests = cost = 0
+        with conn:
+            for (user_id, day), (user_requests, user_cost) in batch.items():
+                cursor = conn.execute("UPDATE users SET usage_count = usage_count + ? WHERE id = ?",
+                                      (user_requests, user_id))
+                if not cursor.rowcount:
+                    continue
+                conn.execute(
+                    "INSERT INTO usage_daily (user_id, day, cost) VALUES (?, ?, ?) "
+                    "ON CONFLICT (user_id, day) DO UPDATE SET cost = cost + excluded.cost",
+                    (user_id, day, user_cost)
+                )
+                requests += user_requests
+                cost += user_cost
+            conn.executemany("UPDATE counters SET value = value + ? WHERE name = ?",
+                             ((requests, 'total_requests'), (cost, 'total_cost')))
+
+    def daily_usage(self, user_id, day):
+        row = self._connect().execute("SELECT cost FROM usage_daily WHERE user_id = ? AND day = ?",
+                                      (user_id, day)).fetchone()
+        return row['cost'] if row else 0
+
+    def stats(self):
+        rows = self._connect().execute("SELECT name, value FROM counters").fetchall()
+        return {row['name']: row['value'] for row in rows}
+
+def create_user_store() -> UserStore:
+    if USER_STORE_PATH:
+        return SQLiteUserStore(USER_STORE_PATH)
+    return MemoryUserStore()
+
+user_store = create_user_store()
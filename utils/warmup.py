@@ -0,0 +1,224 @@
+import os
+import json
+import time
+import fcntl
+import logging
+import tempfile
+import threading
+from typing import Callable, Dict, Iterable, Optional
+
+import requests
+
+from utils.timing import phase
+
+logger = logging.getLogger(__name__)
+
+# Shared by every worker on the host; the warm-up loop runs in one of them at a time
+WARMUP_STATE_PATH = os.environ.get('WARMUP_STATE_PATH',
+                                   os.path.join(tempfile.gettempdir(), 'ethio-gpt-models.json'))
+HF_WARMUP_INTERVAL = float(os.environ.get('HF_WARMUP_INTERVAL', '300'))
+# Translation pairs are warmed once they have served a request, up to this many
+HF_WARMUP_MAX_MODELS = int(os.environ.get('HF_WARMUP_MAX_MODELS', '50'))
+
+WARM = 'warm'
+COLD = 'cold'
+LOADING = 'loading'
+ERROR = 'error'
+
+def loading_estimate(response: requests.Response) -> Optional[float]:
+    """Seconds until the model is loaded, if this is HF's "model loading" 503"""
+    if response.status_code != 503:
+        return None
+    try:
+        data = response.json()
+    except ValueError:
+        return None
+    if not isinstance(data, dict) or 'estimated_time' not in data:
+        return None
+    try:
+        return max(0.0, float(data['estimated_time']))
+    except (TypeError, ValueError):
+        return None
+
+class ModelWarmer:
+    """Tracks which models are loaded upstream and keeps them that way.
+
+    Each model's state (warm, loading with a ``ready_at`` time, cold or
+    error) is kept in a small JSON file shared by the workers. Writers hold
+    an ``flock`` and only write when a state changes. Readers re-read the
+    file when its mtime moves. A daemon thread checks every known model at
+    start-up and every ``interval`` seconds, and again once a loading
+    model's estimated time has passed. A check asks the free ``status``
+    callback first and only sends a ``ping`` (a real, billed inference
+    call) to models that are not loaded. Only one worker, the one holding
+    the warmer lock, runs checks.
+    """
+
+    def __init__(self, models: Iterable[str] = (), path: str = WARMUP_STATE_PATH,
+                 interval: float = HF_WARMUP_INTERVAL, max_models: int = HF_WARMUP_MAX_MODELS):
+        self.static_models = list(dict.fromkeys(models))
+        self.path = path
+        self.interval = interval
+        self.max_models = max_models
+        self.pings = 0
+        self._states: Dict[str, dict] = {}
+        self._mtime = None
+        self._lock = threading.Lock()
+        self._warmer_pid = None
+
+    def _refresh(self):
+        """Pick up changes other workers made to the state file"""
+        try:
+            mtime = os.stat(self.path).st_mtime_ns
+        except OSError:
+            return
+        if mtime == self._mtime:
+            return
+        try:
+            with open(self.path) as f:
+                states = json.load(f)
+        except (OSError, ValueError):
+            return
+        with self._lock:
+            self._states = states
+            self._mtime = mtime
+
+    def _update(self, model: str, **fields):
+        """Merge fields into a model's shared state"""
+        os.makedirs(os.path.dirname(self.path) or '.', exist_ok=True)
+        with open(f"{self.path}.lock", 'a') as lock_file:
+            fcntl.flock(lock_file, fcntl.LOCK_EX)
+            try:
+                try:
+                    with open(self.path) as f:
+                        states = json.load(f)
+                except (OSError, ValueError):
+                    states = {}
+                state = states.setdefault(model, {"state": COLD})
+                state.update(fields, updated_at=time.time())
+                tmp_path = f"{self.path}.{os.getpid()}.tmp"
+                with open(tmp_path, 'w') as f:
+                    json.dump(states, f)
+                os.replace(tmp_path, self.path)
+            finally:
+                fcntl.flock(lock_file, fcntl.LOCK_UN)
+        with self._lock:
+            self._states = states
+            self._mtime = None
+
+    def state(self, model: str) -> dict:
+        self._refresh()
+        return dict(self._states.get(model) or {"state": COLD})
+
+    def mark_warm(self, model: str):
+        """Record a successful call; models outside the static list (translation
+        pairs) are kept warm from then on, up to max_models of them"""
+        state = self.state(model)
+        if state.get('state') == WARM:
+            return
+        if model not in self.static_models and 'updated_at' not in state and len(self._states) >= self.max_models:
+            return
+        self._update(model, state=WARM, ready_at=None, error=None)
+
+    def mark_loading(self, model: str, estimated_time: float):
+        self._update(model, state=LOADING, ready_at=time.time() + estimated_time, error=None)
+
+    def mark_error(self, model: str, error: str):
+        self._update(model, state=ERROR, error=error)
+
+    def wait_until_ready(self, model: str, deadline: float) -> float:
+        """Sleep until a loading model's estimated ready time, but not past deadline (monotonic)"""
+        state = self.state(model)
+        if state.get('state') != LOADING or not state.get('ready_at'):
+            return 0.0
+        delay = min(state['ready_at'] - time.time(), deadline - time.monotonic())
+        if delay <= 0:
+            return 0.0
+        with phase('model_wait', model):
+            time.sleep(delay)
+        return delay
+
+    def models(self):
+        self._refresh()
+        return list(dict.fromkeys(self.static_models + list(self._states)))
+
+    def start(self, ping: Callable[[str], None], status: Callable[[str], Optional[bool]] = None):
+        """Run the warm-up loop in a daemon thread; one worker checks models at a time.
+
+        ``status`` returns whether a model is loaded upstream, or None if
+        unknown; without it every model is pinged.
+        """
+        if self.interval <= 0:
+            return
+        with self._lock:
+            if self._warmer_pid == os.getpid():
+                return
+            self._warmer_pid = os.getpid()
+        threading.Thread(target=self._warm_loop, args=(ping, status), name='model-warmer', daemon=True).start()
+
+    def _warm_loop(self, ping: Callable[[str], None], status: Callable[[str], Optional[bool]] = None):
+        # The leader keeps the lock for life; the kernel drops it if the worker dies
+        lock_file = None
+        next_round = 0.0
+        while True:
+            try:
+                if lock_file is None:
+                    os.makedirs(os.path.dirname(self.path) or '.', exist_ok=True)
+                    candidate = open(f"{self.path}.warmer", 'a')
+                    try:
+                        fcntl.flock(candidate, fcntl.LOCK_EX | fcntl.LOCK_NB)
+                        lock_file = candidate
+                    except BlockingIOError:
+                        candidate.close()
+                if lock_file is not None:
+                    now = time.time()
+                    for model in self.models():
+                        state = self.state(model)
+                        due = now >= next_round or (state.get('state') == LOADING and
+                                                    (state.get('ready_at') or 0) <= now)
+                        if due:
+                            self._check(ping, status, model)
+                    if now >= next_round:
+                        next_round = now + self.interval
+            except Exception as e:
+                logger.error(f"Model warm-up failed: {e}")
+            time.sleep(min(self.interval, 10))
+
+    def _check(self, ping: Callable[[str], None], status: Callable[[str], Optional[bool]], model: str):
+        """Ping model only if it is not known to be loaded"""
+        if status is not None:
+            try:
+                loaded = status(model)
+            except Exception as e:
+                logger.warning(f"Warm-up status check for {model} failed: {e}")
+                loaded = None
+            if loaded:
+                self.mark_warm(model)
+                return
+        self._ping(ping, model)
+
+    def _ping(self, ping: Callable[[str], None], model: str):
+        self.pings += 1
+        try:
+            ping(model)
+        except Exception as e:
+            if self.state(model).get('state') == LOADING:
+                logger.info(f"Warm-up: {model} is loading")
+            else:
+                logger.warning(f"Warm-up ping to {model} failed: {e}")
+                self.mark_error(model, str(e))
+
+    def stats(self) -> dict:
+        now = time.time()
+        models = {}
+        for model in self.models():
+            state = self.state(model)
+            entry = {"state": state.get('state', COLD)}
+            if entry["state"] == LOADING and state.get('ready_at'):
+                entry["ready_in"] = round(max(0.0, state['ready_at'] - now), 1)
+            if state.get('error'):
+                entry["error"] = state['error']
+            if state.get('updated_at'):
+                entry["updated_at"] = state['updated_at']
+            models[model] = entry
+        return {"models": models, "interval": self.interval, "pings": self.pings}